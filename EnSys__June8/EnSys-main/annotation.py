@@ -0,0 +1,63 @@
+import re
+import sys
+import time
+
+# Punctuation that usually denotes the end of a statement
+STATEMENT_END = re.compile(r'[.!?]')
+
+
+def split_statements(message):
+    statements = STATEMENT_END.split(message)
+    return [statement.strip() for statement in statements if statement.strip()]
+
+
+class AnnotatedMessage:
+    '''
+    Everything the bot derives from one customer message, computed once and shared by routing,
+    emotion analysis, the completion cache and the feedback reports: normalized text, message sentiment,
+    statement splits with their sentiment, the predicted emotion, and when the message was received.
+    Statement sentiment is only computed when a report first asks for it; the emotion is set by
+    EnSysBot.analyze_feedback for feedback messages and is None otherwise.
+    '''
+    __slots__ = ('text', 'normalized', 'sentiment', 'statements', 'emotion', 'created', 'size',
+                 '_statement_sentiments', '_analyzer')
+
+    def __init__(self, text, normalized, sentiment, analyzer):
+        self.text = text
+        self.normalized = normalized
+        self.sentiment = sentiment
+        self.statements = split_statements(text)
+        self.emotion = None
+        self.created = time.time()
+        self._statement_sentiments = None
+        self._analyzer = analyzer
+        # Rough footprint, for the session store's byte budget
+        self.size = sys.getsizeof(text) * 3 + sys.getsizeof(normalized) + 200
+
+    @property
+    def statement_sentiments(self):
+        if self._statement_sentiments is None:
+            # A single statement that is the whole message already has its score
+            if len(self.statements) == 1 and self.statements[0] == self.text:
+                self._statement_sentiments = [self.sentiment]
+            else:
+                self._statement_sentiments = [self._analyzer.polarity_scores(statement) for statement in self.statements]
+        return self._statement_sentiments
+
+    def __str__(self):
+        return self.text
+
+
+class MessageAnnotator:
+    '''
+    Builds AnnotatedMessage records with the bot's TextPreprocessor (tokenizer, lemmas, VADER).
+    The normalized text goes through the preprocessor's whole-text LRU, so a repeated message is
+    not tokenized and lemmatized again.
+    '''
+    def __init__(self, preprocessor):
+        self.preprocessor = preprocessor
+
+    def annotate(self, text):
+        normalized = self.preprocessor.normalize(text)
+        sentiment = self.preprocessor.get_sentiment(text)
+        return AnnotatedMessage(text, normalized, sentiment, self.preprocessor.analyzer)
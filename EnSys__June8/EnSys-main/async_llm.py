@@ -0,0 +1,164 @@
+import asyncio
+import json
+import random
+import threading
+import time
+
+import aiohttp
+
+# Upstream statuses worth retrying: rate limiting and server-side failures
+TRANSIENT_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class CompletionError(Exception):
+    pass
+
+
+class TransientCompletionError(CompletionError):
+    pass
+
+
+class AsyncCompletionClient:
+    '''
+    asyncio client for the chat completion API.
+    One pooled keep-alive aiohttp session is shared by every call, a semaphore bounds the number of
+    calls in flight, each call has a deadline, and transient failures are retried with jittered
+    exponential backoff as long as the deadline allows. stream() applies the same limits to a streamed
+    completion; it only retries before the first chunk, since a chunk sent on cannot be taken back.
+    '''
+    def __init__(self, api_key, model, api_base='https://api.openai.com/v1', max_concurrency=32,
+                 timeout=30.0, max_retries=2, backoff=0.5, pool_size=64):
+        self.api_key = api_key
+        self.model = model
+        self.url = api_base.rstrip('/') + '/chat/completions'
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.session = None
+        self.semaphore = None
+        self.retries = 0
+        self.in_flight = 0
+
+    async def start(self):
+        # Created lazily so both belong to the event loop that runs the calls
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(connector=connector, headers={'Authorization': f'Bearer {self.api_key}'})
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def complete(self, messages, timeout=None):
+        await self.start()
+        deadline = time.monotonic() + (timeout or self.timeout)
+        async with self.semaphore:
+            self.in_flight += 1
+            try:
+                return await self._complete_with_retries(messages, deadline)
+            finally:
+                self.in_flight -= 1
+
+    async def _complete_with_retries(self, messages, deadline):
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise CompletionError("Deadline exceeded before the completion finished")
+            try:
+                return await asyncio.wait_for(self._post(messages), remaining)
+            except (TransientCompletionError, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                await asyncio.sleep(self._retry_delay(attempt, deadline, e))
+                attempt += 1
+
+    async def stream(self, messages, timeout=None):
+        # Async generator of the completion's content deltas, all within one deadline
+        await self.start()
+        deadline = time.monotonic() + (timeout or self.timeout)
+        async with self.semaphore:
+            self.in_flight += 1
+            try:
+                attempt = 0
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise CompletionError("Deadline exceeded before the completion finished")
+                    started = False
+                    try:
+                        async for delta in self._post_stream(messages, remaining):
+                            started = True
+                            yield delta
+                        return
+                    except (TransientCompletionError, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                        if started:
+                            raise CompletionError(f"Stream broke off: {e!r}") from e
+                        await asyncio.sleep(self._retry_delay(attempt, deadline, e))
+                        attempt += 1
+            finally:
+                self.in_flight -= 1
+
+    def _retry_delay(self, attempt, deadline, error):
+        # Seconds to wait before the next attempt, or CompletionError when there is none left
+        if attempt >= self.max_retries:
+            raise CompletionError(f"Completion failed after {attempt + 1} attempts: {error!r}") from error
+        # Full jitter, never sleeping past the deadline
+        delay = random.uniform(0, self.backoff * (2 ** attempt))
+        if time.monotonic() + delay >= deadline:
+            raise CompletionError(f"Deadline exceeded while retrying: {error!r}") from error
+        self.retries += 1
+        return delay
+
+    @staticmethod
+    async def _check_status(response):
+        if response.status in TRANSIENT_STATUSES:
+            raise TransientCompletionError(f"HTTP {response.status}")
+        if response.status != 200:
+            raise CompletionError(f"HTTP {response.status}: {await response.text()}")
+
+    async def _post(self, messages):
+        async with self.session.post(self.url, json={'model': self.model, 'messages': messages}) as response:
+            await self._check_status(response)
+            payload = await response.json()
+            return payload['choices'][0]['message']['content'].strip()
+
+    async def _post_stream(self, messages, timeout):
+        # Server-sent events of chat.completion.chunk objects, ended by "data: [DONE]"
+        async with self.session.post(self.url, json={'model': self.model, 'messages': messages, 'stream': True},
+                                     timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            await self._check_status(response)
+            async for line in response.content:
+                line = line.strip()
+                if not line.startswith(b'data:'):
+                    continue
+                data = line[5:].strip()
+                if data == b'[DONE]':
+                    return
+                delta = json.loads(data)['choices'][0]['delta'].get('content')
+                if delta:
+                    yield delta
+
+
+class EventLoopThread:
+    '''
+    Runs one asyncio event loop in a background thread, so synchronous callers (Flask views) can
+    hand coroutines to it and many slow upstream calls share that single thread.
+    '''
+    def __init__(self, name='llm-loop'):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, coroutine):
+        # Returns a concurrent.futures.Future for the coroutine's result
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine, timeout=None):
+        return self.submit(coroutine).result(timeout)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
@@ -0,0 +1,68 @@
+'''
+asyncio front end for the chat endpoint.
+POST /chat takes the same form fields and session cookie as the Flask route, but a request waiting on
+the completion API only holds a coroutine, not a worker thread, so many slow upstream calls share
+the event loop. The Flask app in main.py keeps serving the pages, reports and everything else.
+This is a separate process with its own bot, so sessions are per process: a chat held here must also
+be ended here (END CHAT), not through the Flask /rate or /end_chat routes. Its feedback reaches the
+shared feedback store once the chat ends or its session is evicted. It journals to its own file and
+runs no job workers, so the Flask process alone rotates chat_history.jsonl and runs training jobs.
+Usage: python async_server.py --port 5001
+'''
+import argparse
+import asyncio
+import uuid
+
+from aiohttp import web
+
+from routes import SESSION_COOKIE
+
+
+def create_app(chatbot):
+    async def chat(request):
+        form = await request.post()
+        prompt = form.get('prompt', '')
+        session_id = form.get('session_id') or request.cookies.get(SESSION_COOKIE)
+        new_session = not session_id
+        if new_session:
+            session_id = uuid.uuid4().hex
+
+        try:
+            if prompt.upper() == 'END CHAT':
+                # Feedback analysis is CPU bound, keep it off the event loop
+                await asyncio.get_running_loop().run_in_executor(None, chatbot.end_chat, session_id)
+                text = 'END CHAT'
+            elif prompt.upper() == 'MENU':
+                text = chatbot.get_menu_text()
+            else:
+                text = await chatbot.agenerate_response(prompt, session_id)
+            response = web.Response(text=text)
+        except Exception as e:
+            print(f"Error in chat: {e}")
+            response = web.json_response({"error": str(e)})
+
+        if new_session:
+            response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite='Lax')
+        return response
+
+    app = web.Application()
+    app.router.add_post('/chat', chat)
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='asyncio chat endpoint')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5001)
+    args = parser.parse_args()
+
+    import logging
+    import os
+    import nltk
+    for package in ('stopwords', 'punkt', 'vader_lexicon', 'wordnet'):
+        nltk.download(package, quiet=True)
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'WARNING'))
+
+    from bot import create_bot
+    bot = create_bot(journal_path='chat_history_async.jsonl', job_workers=0)
+    web.run_app(create_app(bot), host=args.host, port=args.port)
@@ -0,0 +1,80 @@
+'''
+Benchmark for the per-message analysis work of a chat: CPU time per customer turn of the previous
+flow against AnnotatedMessage records, over a run of chats that each end with end_chat's feedback
+analysis.
+Previous flow: preprocess + get_sentiment per turn; at the end of each chat the user messages were
+appended to the shared feedback a second time, and a new FeedbackAnalyzer re-split and re-scored all
+feedback collected so far. Annotated flow: one annotate per turn; the end-of-chat analysis reuses each
+message's statement scores, which are computed once.
+Needs the NLTK data main.py downloads.
+Usage: python bench_annotation.py [--chats 200] [--turns 8]
+'''
+import argparse
+import random
+import time
+
+import nltk
+
+from annotation import MessageAnnotator
+from feedback_analyzer import FeedbackAnalyzer
+from preprocess import TextPreprocessor
+
+CLAUSES = ('The pasta was cold and the service slow', 'I loved the baked lasagna', 'Can I see the menu',
+           'The waiter was very friendly', 'The seafood sotanghon tasted amazing', 'Portions were too small',
+           'Prices are a bit expensive for the area', 'The restroom could be cleaner', 'Thank you so much',
+           'You should add more vegetarian dishes', 'The atmosphere was cozy', 'We waited forty minutes')
+
+
+def make_chats(chats, turns, seed=0):
+    rng = random.Random(seed)
+    return [[' '.join(f"{clause}{rng.choice('.!?')}" for clause in rng.sample(CLAUSES, rng.randint(1, 3)))
+             for _ in range(turns)] for _ in range(chats)]
+
+
+def previous_flow(preprocessor, chats):
+    feedback = []
+    for chat in chats:
+        session_feedback = []
+        for prompt in chat:
+            session_feedback.append(prompt)
+            preprocessor.preprocess(prompt)
+            preprocessor.get_sentiment(prompt)
+        # save_conversation appended the user messages again before the session was flushed
+        feedback.extend(session_feedback + list(chat))
+        FeedbackAnalyzer(feedback).analyze_feedback()
+
+
+def annotated_flow(preprocessor, chats):
+    annotator = MessageAnnotator(preprocessor)
+    feedback = []
+    for chat in chats:
+        feedback.extend(annotator.annotate(prompt) for prompt in chat)
+        FeedbackAnalyzer(feedback).analyze_feedback()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--chats', type=int, default=200)
+    parser.add_argument('--turns', type=int, default=8)
+    args = parser.parse_args()
+    for package in ('stopwords', 'punkt', 'punkt_tab', 'wordnet', 'vader_lexicon'):
+        nltk.download(package, quiet=True)
+
+    chats = make_chats(args.chats, args.turns)
+    turns = args.chats * args.turns
+    print(f"{args.chats} chats x {args.turns} turns")
+    print(f"{'flow':<10} {'CPU ms/turn':>12} {'CPU s total':>12}")
+    results = {}
+    for name, flow in (('previous', previous_flow), ('annotated', annotated_flow)):
+        # A fresh preprocessor each, so neither flow starts with the other's lemma cache
+        preprocessor = TextPreprocessor()
+        preprocessor.lemmatize('warmup')
+        start = time.process_time()
+        flow(preprocessor, chats)
+        results[name] = time.process_time() - start
+        print(f"{name:<10} {results[name] / turns * 1000:>12.3f} {results[name]:>12.2f}")
+    print(f"reduction {1 - results['annotated'] / results['previous']:.0%}")
+
+
+if __name__ == '__main__':
+    main()
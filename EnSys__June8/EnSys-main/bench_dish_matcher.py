@@ -0,0 +1,86 @@
+'''
+Benchmark for the dish lookup in EnSysBot.generate_response.
+Compares the old loop (one substring test per dish) with the compiled DishMatcher on
+synthetic menus of 200, 2,000 and 20,000 dishes.
+Usage: python bench_dish_matcher.py [--prompts N]
+'''
+import argparse
+import random
+import time
+from types import MappingProxyType
+
+from menu_index import MenuIndex
+from dish_matcher import DishMatcher
+
+SYLLABLES = ['ba', 'ko', 'li', 'man', 'sa', 'pi', 'nak', 'to', 'lu', 'ga', 'ran', 'si', 'bo', 'ta', 'hen', 'yo']
+CATEGORIES = ['dessert', 'drinks', 'main course', 'pasta', 'salad', 'sides']
+FILLER = "i would like to order the {} please and maybe something to drink later".split()
+
+
+def make_menu(size, rng):
+    names = set()
+    while len(names) < size:
+        words = [''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(rng.randint(1, 3))]
+        names.add(' '.join(words).title())
+    categories = {category: [] for category in CATEGORIES}
+    dishes = []
+    for name in sorted(names):
+        category = rng.choice(CATEGORIES)
+        dish = MappingProxyType({'name': name, 'description': '', 'category': category})
+        categories[category].append(dish)
+        dishes.append(dish)
+    return MenuIndex(tuple(dishes), MappingProxyType({c: tuple(items) for c, items in categories.items()}))
+
+
+def make_prompts(menu_index, count, rng):
+    prompts = []
+    for i in range(count):
+        # Half of the prompts mention a dish, half mention nothing on the menu
+        dish = rng.choice(menu_index.dishes)['name'].lower() if i % 2 == 0 else 'chef special'
+        prompts.append(' '.join(FILLER).format(dish))
+    return prompts
+
+
+def legacy_lookup(menu_index, prompt):
+    for items in menu_index.categories.values():
+        for item in items:
+            if item['name'].lower() in prompt:
+                return item
+    return None
+
+
+def timed(fn, prompts):
+    start = time.perf_counter()
+    for prompt in prompts:
+        fn(prompt)
+    return (time.perf_counter() - start) / len(prompts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--prompts', type=int, default=500)
+    args = parser.parse_args()
+    rng = random.Random(42)
+
+    print(f"{'dishes':>8} {'build ms':>10} {'loop us/turn':>14} {'automaton us/turn':>18} {'speedup':>8}")
+    for size in (200, 2000, 20000):
+        menu_index = make_menu(size, rng)
+        prompts = make_prompts(menu_index, args.prompts, rng)
+
+        start = time.perf_counter()
+        matcher = DishMatcher(menu_index)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        # Both paths must agree on which dish was mentioned
+        for prompt in prompts:
+            expected = legacy_lookup(menu_index, prompt)
+            found = matcher.find(prompt)
+            assert (expected is None) == (found is None), prompt
+
+        loop = timed(lambda p: legacy_lookup(menu_index, p), prompts)
+        automaton = timed(matcher.find, prompts)
+        print(f"{size:>8} {build_ms:>10.1f} {loop * 1e6:>14.1f} {automaton * 1e6:>18.1f} {loop / automaton:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
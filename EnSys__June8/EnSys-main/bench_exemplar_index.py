@@ -0,0 +1,104 @@
+'''
+Benchmark for exemplar_index.py: recall@k and query latency of the exact and pruned modes, against the
+old dense cosine_similarity scan, on a synthetic corpus of topic-clustered short texts.
+Queries are corpus rows with some words dropped and a couple of random words added.
+Usage: python bench_exemplar_index.py [--sizes 10000 100000 1000000] [--queries 200] [--k 5]
+'''
+import argparse
+import statistics
+import time
+
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+from exemplar_index import ExemplarIndex
+
+
+def make_corpus(size, vocabulary=20000, topics=500, seed=0):
+    rng = np.random.default_rng(seed)
+    words = np.array([f"w{i}" for i in range(vocabulary)])
+    topic_words = rng.integers(0, vocabulary, size=(topics, 50))
+    # Zipf-like background words, as in natural text
+    background = 1.0 / np.arange(1, vocabulary + 1)
+    background /= background.sum()
+    texts = []
+    for _ in range(size):
+        length = rng.integers(8, 20)
+        from_topic = rng.random(length) < 0.7
+        topic = topic_words[rng.integers(topics)]
+        chosen = np.where(from_topic, topic[rng.integers(0, 50, length)], rng.choice(vocabulary, length, p=background))
+        texts.append(' '.join(words[chosen]))
+    return texts
+
+
+def make_queries(texts, count, seed=1):
+    rng = np.random.default_rng(seed)
+    queries = []
+    for row in rng.integers(0, len(texts), count):
+        words = texts[row].split()
+        kept = [word for word in words if rng.random() < 0.6] or words[:1]
+        queries.append(' '.join(kept + [f"w{i}" for i in rng.integers(0, 20000, 2)]))
+    return queries
+
+
+def time_queries(index, queries, k):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append([row for _, _, row in index.query(query, k)])
+        latencies.append(time.perf_counter() - start)
+    return latencies, results
+
+
+def recall(expected, found):
+    hits = sum(len(set(e) & set(f)) for e, f in zip(expected, found))
+    return hits / max(sum(len(e) for e in expected), 1)
+
+
+def report(label, size, latencies, recall_at_k, build_time):
+    p95 = sorted(latencies)[int(len(latencies) * 0.95) - 1]
+    print(f"{label:<11} {size:>9} {build_time:>9.2f} {statistics.median(latencies) * 1000:>9.3f} "
+          f"{p95 * 1000:>9.3f} {recall_at_k:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--postings-limits', type=int, nargs='+', default=[200, 1000, 5000])
+    parser.add_argument('--dense-limit', type=int, default=100000, help='skip the dense scan above this size')
+    args = parser.parse_args()
+
+    print(f"{'mode':<11} {'rows':>9} {'build s':>9} {'p50 ms':>9} {'p95 ms':>9} {'recall@' + str(args.k):>9}")
+    for size in args.sizes:
+        texts = make_corpus(size)
+        queries = make_queries(texts, args.queries)
+        responses = [str(row) for row in range(size)]
+
+        start = time.perf_counter()
+        exact = ExemplarIndex.build(texts, responses)
+        build_time = time.perf_counter() - start
+        latencies, expected = time_queries(exact, queries, args.k)
+        report('exact', size, latencies, 1.0, build_time)
+
+        if size <= args.dense_limit:
+            # The old retrieve_exemplar: dense similarity row against the whole corpus, then argmax
+            latencies, found = [], []
+            for query in queries:
+                start = time.perf_counter()
+                similarities = cosine_similarity(exact.vectorizer.transform([query]), exact.matrix)
+                found.append([int(similarities.argmax())])
+                latencies.append(time.perf_counter() - start)
+            report('dense@1', size, latencies, recall([e[:1] for e in expected], found), 0.0)
+
+        for limit in args.postings_limits:
+            start = time.perf_counter()
+            approximate = ExemplarIndex(exact.vectorizer, exact.matrix, responses, mode='pruned', postings_limit=limit)
+            build_time = time.perf_counter() - start
+            latencies, found = time_queries(approximate, queries, args.k)
+            report(f'pruned{limit}', size, latencies, recall(expected, found), build_time)
+
+
+if __name__ == '__main__':
+    main()
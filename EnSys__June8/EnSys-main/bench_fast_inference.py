@@ -0,0 +1,70 @@
+'''
+Benchmark for single-message emotion prediction: per-message latency of the sklearn path
+(vectorizer.transform + predict on a one-row sparse matrix) against CompiledEmotionModel, for the
+batch (TF-IDF + LogisticRegression) and streaming (hashed features + SGDClassifier) models, and a check
+that both give the same label on every held-out message.
+Uses a synthetic dialogue CSV unless one is given; the messages timed are the held-out utterances,
+which are about chat-message length.
+Usage: python bench_fast_inference.py [--dataset annotated_empatheticdialogues.csv] [--rows 20000] [--messages 2000]
+'''
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from bench_streaming_training import make_dataset
+from model import EmotionModel
+
+
+def latencies(predict, messages):
+    timings = []
+    for message in messages:
+        start = time.perf_counter()
+        predict(message)
+        timings.append(time.perf_counter() - start)
+    return np.array(timings) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dataset', default=None)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--classes', type=int, default=32)
+    parser.add_argument('--messages', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.dataset
+        if path is None:
+            path = os.path.join(directory, 'dialogues.csv')
+            make_dataset(path, args.rows, args.classes)
+        utterances = pd.read_csv(path, usecols=['utterance'], dtype=str, keep_default_na=False)['utterance']
+        messages = [text for text in utterances if EmotionModel.is_holdout(text, 0.2)][:args.messages]
+
+        print(f"{len(messages)} messages, {np.mean([len(text.split()) for text in messages]):.0f} words on average")
+        print(f"{'model':<10} {'path':<9} {'p50 us':>8} {'p99 us':>8} {'mean us':>8} {'mismatches':>11}")
+        for name in ('batch', 'streaming'):
+            model = EmotionModel(None)
+            with contextlib.redirect_stdout(io.StringIO()):
+                if name == 'batch':
+                    model.train_model(path)
+                else:
+                    model.train_model_streaming(path)
+            vectorizer, classifier, compiled = model.fitted
+            expected = classifier.predict(vectorizer.transform(messages))
+            mismatches = len(compiled.verify(messages, expected))
+            paths = (('sklearn', lambda text: classifier.predict(vectorizer.transform([text]))[0]),
+                     ('compiled', compiled.predict))
+            for label, predict in paths:
+                timings = latencies(predict, messages)
+                print(f"{name:<10} {label:<9} {np.percentile(timings, 50):>8.1f} {np.percentile(timings, 99):>8.1f} "
+                      f"{timings.mean():>8.1f} {mismatches if label == 'compiled' else '':>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+'''
+Benchmark for the feedback reports: time of one interpret_feedback() after a chat's worth of new
+messages, with the previous full recompute (a new analyzer over the whole history, list membership
+tests while categorizing) against the incremental FeedbackAnalyzer, at several history sizes.
+Messages are AnnotatedMessage records scored by a keyword stand-in for VADER, so no NLTK data is needed
+and both sides time only the analysis itself.
+Usage: python bench_feedback_analyzer.py [--history 1000 10000 30000] [--new 10]
+'''
+import argparse
+import random
+import time
+
+from annotation import AnnotatedMessage
+from feedback_analyzer import FeedbackAnalyzer
+
+TOPICS = ('The food', 'Our dish', 'The service', 'The waiter', 'The atmosphere', 'The restroom', 'The price',
+          'The view', 'You should add a kids menu', 'It would be better if the music were quieter')
+VERDICTS = (('was great', 0.6), ('was awful', -0.6), ('was fine', 0.0), ('could be cleaner', -0.2))
+
+
+class KeywordScorer:
+    def polarity_scores(self, statement):
+        for verdict, compound in VERDICTS:
+            if verdict in statement:
+                return {'neg': 0.0, 'neu': 1.0, 'pos': 0.0, 'compound': compound}
+        return {'neg': 0.0, 'neu': 1.0, 'pos': 0.0, 'compound': 0.0}
+
+
+class PreviousAnalyzer(FeedbackAnalyzer):
+    # The report as it was computed before: everything from scratch, with list membership tests
+    def categorize_feedback(self, feedback_data=None):
+        categories = {category: {kind: [] for kind in kinds} for category, kinds in self.category_kinds.items()}
+        for feedback in feedback_data:
+            label = self.classify(feedback['message'], feedback['sentiment']['compound'])
+            if label is not None and feedback not in categories[label[0]][label[1]]:
+                categories[label[0]][label[1]].append(feedback)
+        return categories
+
+    def interpret_feedback(self):
+        detailed_feedback, unique_messages = [], set()
+        for message in self.conversation:
+            for statement, sentiment in self.scored_statements(message):
+                if statement not in unique_messages:
+                    unique_messages.add(statement)
+                    detailed_feedback.append({'message': statement, 'sentiment': sentiment})
+        categorized_feedback = self.categorize_feedback(detailed_feedback)
+        category_percentages = self.calculate_percentages(categorized_feedback)
+        return categorized_feedback, self.generate_essay_summary(categorized_feedback, category_percentages)
+
+
+def make_messages(count, start, rng, scorer):
+    messages = []
+    for index in range(start, start + count):
+        verdict, compound = rng.choice(VERDICTS)
+        text = f"{rng.choice(TOPICS)} {verdict} on visit {index}. Thanks"
+        messages.append(AnnotatedMessage(text, text.lower(), {'compound': compound}, scorer))
+    return messages
+
+
+def messages(report):
+    # Compared by statement text; the incremental analyzer only keeps the compound score
+    categorized, summary = report
+    return {category: {kind: [feedback['message'] for feedback in feedbacks] for kind, feedbacks in kinds.items()}
+            for category, kinds in categorized.items()}, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--history', type=int, nargs='+', default=[1000, 10000, 30000])
+    parser.add_argument('--new', type=int, default=10, help='messages added before each report')
+    parser.add_argument('--reports', type=int, default=5)
+    args = parser.parse_args()
+
+    rng, scorer = random.Random(0), KeywordScorer()
+    print(f"{'history':>8} {'previous ms':>12} {'incremental ms':>15} {'same report':>12}")
+    for history in args.history:
+        feedback = make_messages(history, 0, rng, scorer)
+        incremental = FeedbackAnalyzer(feedback)
+        incremental.interpret_feedback()
+        timings = {'previous': 0.0, 'incremental': 0.0}
+        for report in range(args.reports):
+            feedback.extend(make_messages(args.new, history + report * args.new, rng, scorer))
+            start = time.perf_counter()
+            expected = PreviousAnalyzer(feedback).interpret_feedback()
+            timings['previous'] += time.perf_counter() - start
+            start = time.perf_counter()
+            actual = incremental.interpret_feedback()
+            timings['incremental'] += time.perf_counter() - start
+        print(f"{history:>8} {timings['previous'] / args.reports * 1000:>12.1f} "
+              f"{timings['incremental'] / args.reports * 1000:>15.1f} {str(messages(actual) == messages(expected)):>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+'''
+Benchmark for the columnar feedback store: memory of N unique statements held as the previous list
+of {'message', 'sentiment'} dicts (full VADER dict) against FeedbackColumns, and the time of category
+percentages, compliment/complaint ratios and an hourly sentiment trend computed with Python loops
+over the dicts against the NumPy reductions.
+Usage: python bench_feedback_columns.py [--statements 100000 1000000]
+'''
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from collections import defaultdict
+
+from feedback_columns import FeedbackColumns, CATEGORIES, KINDS
+from taxonomy import Taxonomy
+
+PHRASES = ('the food was great', 'the waiter was rude', 'the atmosphere felt cozy', 'the restroom was dirty',
+           'prices are too expensive', 'you should open earlier', 'the dessert was amazing', 'we loved the view')
+
+
+def make_statements(count, seed=0):
+    rng = random.Random(seed)
+    start = time.time() - 30 * 86400
+    for index in range(count):
+        compound = round(rng.uniform(-1, 1), 4)
+        yield (f"{rng.choice(PHRASES)} on visit {index}", {'neg': 0.1, 'neu': 0.6, 'pos': 0.3, 'compound': compound},
+               start + index * 30 * 86400 / count)
+
+
+TAXONOMY = Taxonomy.load()
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, size
+
+
+def build_dicts(count):
+    return [{'message': message, 'sentiment': sentiment, 'created': created}
+            for message, sentiment, created in make_statements(count)]
+
+
+def build_columns(count):
+    columns = FeedbackColumns()
+    for message, sentiment, created in make_statements(count):
+        label = TAXONOMY.classify(message, sentiment['compound'])
+        category, kind = (CATEGORIES.index(label[0]), KINDS.index(label[1])) if label else (-1, -1)
+        columns.add(message, sentiment['compound'], category, kind, created)
+    return columns
+
+
+def loop_aggregates(feedback):
+    counts = defaultdict(lambda: defaultdict(int))
+    hours = defaultdict(lambda: [0, 0.0])
+    for entry in feedback:
+        compound = entry['sentiment']['compound']
+        label = TAXONOMY.classify(entry['message'], compound)
+        if label is not None:
+            counts[label[0]][label[1]] += 1
+        hour = hours[int(entry['created']) // 3600]
+        hour[0] += 1
+        hour[1] += compound
+    judged = {category: counts[category]['compliments'] + counts[category]['complaints'] for category in CATEGORIES}
+    total = sum(judged.values())
+    percentages = {category: judged[category] / total * 100 for category in CATEGORIES}
+    return percentages, {hour: total / count for hour, (count, total) in sorted(hours.items())}
+
+
+def column_aggregates(columns):
+    return columns.category_percentages(), columns.ratios(), columns.trend('hour')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--statements', type=int, nargs='+', default=[100000, 1000000])
+    args = parser.parse_args()
+
+    print(f"{'statements':>10} {'dicts MB':>9} {'columns MB':>11} {'ratio':>6} {'loop ms':>8} {'numpy ms':>9}")
+    for count in args.statements:
+        feedback, dict_bytes = measure(lambda: build_dicts(count))
+        columns, column_bytes = measure(lambda: build_columns(count))
+        # The dict timing classifies each statement again; the columns already hold the labels
+        start = time.perf_counter()
+        loop_aggregates(feedback)
+        loop_time = time.perf_counter() - start
+        start = time.perf_counter()
+        column_aggregates(columns)
+        numpy_time = time.perf_counter() - start
+        print(f"{count:>10} {dict_bytes / 2 ** 20:>9.1f} {column_bytes / 2 ** 20:>11.1f} "
+              f"{column_bytes / dict_bytes:>6.2f} {loop_time * 1000:>8.1f} {numpy_time * 1000:>9.1f}")
+        del feedback, columns
+
+
+if __name__ == '__main__':
+    main()
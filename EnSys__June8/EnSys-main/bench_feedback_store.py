@@ -0,0 +1,124 @@
+'''
+Benchmark for the SQLite feedback store: insert rate of statements added through the batching writer
+against one committed INSERT per statement, then the time of a one-month report (label counts and the
+first page of every category and kind) read from a year of stored statements with indexed queries,
+against filtering and grouping the same statements held in memory. Prints the query plans.
+Usage: python bench_feedback_store.py [--statements 1000000] [--days 365] [--path bench_feedback.sqlite3]
+'''
+import argparse
+import os
+import random
+import sqlite3
+import time
+from collections import defaultdict
+
+from feedback_analyzer import FeedbackAnalyzer
+from feedback_columns import KINDS
+from feedback_store import FeedbackStore, SCHEMA
+from taxonomy import Taxonomy
+
+SUBJECTS = ('The food', 'The seafood pasta', 'Our waiter', 'The staff', 'The atmosphere', 'The restroom',
+            'Prices for the dessert', 'The view', 'You should add a kids menu and', 'The noise')
+VERDICTS = (('was great', 0.6), ('was awful', -0.6), ('was fine', 0.0), ('could be cleaner', -0.2))
+
+
+def make_statements(count, days, seed=0):
+    # (statement, compound, created) spread evenly over the last `days` days, oldest first
+    rng = random.Random(seed)
+    end = time.time()
+    start = end - days * 86400
+    for index in range(count):
+        verdict, compound = rng.choice(VERDICTS)
+        yield f"{rng.choice(SUBJECTS)} {verdict} on visit {index}", compound, start + index * (end - start) / count
+
+
+def labelled(taxonomy, statements, chunk=65536):
+    # Statements with their (category, kind) name pairs, categorized a chunk at a time
+    statements = list(statements)
+    for offset in range(0, len(statements), chunk):
+        part = statements[offset:offset + chunk]
+        category, kind = taxonomy.categorize([statement for statement, _, _ in part], [compound for _, compound, _ in part])
+        for (statement, compound, created), code, kind_code in zip(part, category.tolist(), kind.tolist()):
+            yield statement, compound, [(taxonomy.categories[code], KINDS[kind_code])] if code >= 0 else [], created
+
+
+def insert_unbatched(path, rows):
+    db = sqlite3.connect(path)
+    db.execute('PRAGMA journal_mode=WAL')
+    db.executescript(SCHEMA)
+    for statement, compound, labels, created in rows:
+        with db:
+            FeedbackStore.write(db, [(statement, compound, labels, created)])
+    db.close()
+
+
+def memory_report(feedback, start, end, per_page):
+    # What a report over in-memory feedback has to do: scan everything for the range, then group
+    groups = defaultdict(list)
+    for statement, compound, labels, created in feedback:
+        if start <= created < end:
+            for label in labels:
+                groups[label].append((created, statement, compound))
+    counts = {label: len(rows) for label, rows in groups.items()}
+    pages = {label: sorted(rows, reverse=True)[:per_page] for label, rows in groups.items()}
+    return counts, pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--statements', type=int, default=1000000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--unbatched', type=int, default=2000, help='statements for the one-commit-per-insert rate')
+    parser.add_argument('--per-page', type=int, default=20)
+    parser.add_argument('--path', default='bench_feedback.sqlite3')
+    args = parser.parse_args()
+
+    for path in (args.path, args.path + '.unbatched'):
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    taxonomy = Taxonomy.load()
+    feedback = list(labelled(taxonomy, make_statements(args.statements, args.days)))
+
+    start = time.perf_counter()
+    insert_unbatched(args.path + '.unbatched', feedback[:args.unbatched])
+    unbatched_rate = args.unbatched / (time.perf_counter() - start)
+    store = FeedbackStore(args.path)
+    start = time.perf_counter()
+    for statement, compound, labels, created in feedback:
+        store.add(statement, compound, labels, created)
+    store.flush(timeout=None)
+    batched_rate = len(feedback) / (time.perf_counter() - start)
+    print(f"insert rate: {unbatched_rate:,.0f}/s one commit per statement, {batched_rate:,.0f}/s batched "
+          f"({len(store):,} statements, {os.path.getsize(args.path) / 2 ** 20:.0f} MB)")
+
+    end = time.time()
+    month = (end - 30 * 86400, end)
+    analyzer = FeedbackAnalyzer([], taxonomy, store=store)
+    start = time.perf_counter()
+    _, _, counts, pages = analyzer.stored_report(*month, per_page=args.per_page)
+    indexed_time = time.perf_counter() - start
+    start = time.perf_counter()
+    memory_counts, _ = memory_report(feedback, *month, args.per_page)
+    memory_time = time.perf_counter() - start
+    same = memory_counts == {(category, kind): total for category, kinds in counts.items() for kind, total in kinds.items()}
+    print(f"month report: {indexed_time * 1000:.1f} ms indexed ({pages} pages), {memory_time * 1000:.1f} ms "
+          f"scanning memory, same counts: {same}")
+
+    for sql, params in (("SELECT category, kind, COUNT(DISTINCT statement_id) FROM occurrence_labels "
+                         "WHERE created >= ? AND created < ? GROUP BY category, kind", month),
+                        ("SELECT statements.message FROM occurrence_labels JOIN statements ON statements.id = occurrence_labels.statement_id "
+                         "WHERE occurrence_labels.category = ? AND occurrence_labels.kind = ? AND occurrence_labels.created >= ? "
+                         "AND occurrence_labels.created < ? AND NOT EXISTS (SELECT 1 FROM occurrences AS later "
+                         "WHERE later.statement_id = occurrence_labels.statement_id AND later.created > occurrence_labels.created "
+                         "AND later.created < ?) ORDER BY occurrence_labels.created DESC, occurrence_labels.statement_id DESC LIMIT 20",
+                         ('food_quality', 'complaints') + month + month[1:]),
+                        ("SELECT COUNT(DISTINCT statement_id) FROM occurrences WHERE polarity = ? AND created >= ? AND created < ?",
+                         (1,) + month)):
+        plan = store.query('EXPLAIN QUERY PLAN ' + sql, params)
+        print(' | '.join(row['detail'] for row in plan))
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+'''
+Benchmark for emotion prediction under concurrent load: throughput and per-call latency of direct
+predict_emotion calls against MicroBatcher(predict_emotions) at several concurrency levels (threads,
+each predicting messages back to back), for the compiled and the plain sklearn inference paths.
+Also times predict_emotions on its own per batch size, the numbers VECTORIZE_MIN_BATCH is based on.
+Uses a synthetic dialogue CSV unless one is given.
+Usage: python bench_micro_batcher.py [--dataset annotated_empatheticdialogues.csv] [--concurrency 1 4 16 64]
+'''
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from bench_streaming_training import make_dataset
+from micro_batcher import MicroBatcher
+from model import EmotionModel
+
+
+def load(concurrency, calls, predict, messages):
+    latencies = [[] for _ in range(concurrency)]
+
+    def client(index):
+        for call in range(calls):
+            message = messages[(index * calls + call) % len(messages)]
+            start = time.perf_counter()
+            predict(message)
+            latencies[index].append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies = np.concatenate(latencies) * 1000
+    return concurrency * calls / elapsed, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dataset', default=None)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--classes', type=int, default=32)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--calls', type=int, default=2000, help='predictions per concurrency level')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--wait', type=float, nargs='+', default=[0.0, 0.002])
+    parser.add_argument('--streaming', action='store_true', help='hashed features + SGD instead of TF-IDF + LR')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.dataset
+        if path is None:
+            path = os.path.join(directory, 'dialogues.csv')
+            make_dataset(path, args.rows, args.classes)
+        utterances = pd.read_csv(path, usecols=['utterance'], dtype=str, keep_default_na=False)['utterance']
+        messages = [text for text in utterances if EmotionModel.is_holdout(text, 0.2)][:5000]
+
+        model = EmotionModel(None)
+        with contextlib.redirect_stdout(io.StringIO()):
+            if args.streaming:
+                model.train_model_streaming(path)
+            else:
+                model.train_model(path)
+        vectorizer, classifier, compiled = model.fitted
+
+        print(f"{'path':<9} {'batch':>6} {'us/text':>8}")
+        for inference, fitted_compiled in (('compiled', compiled), ('sklearn', None)):
+            model.use_fitted(vectorizer, classifier, None, fitted_compiled)
+            for size in (1, 8, 32, 128, 512):
+                start = time.perf_counter()
+                for offset in range(0, 2048, size):
+                    model.predict_emotions(messages[offset:offset + size])
+                print(f"{inference:<9} {size:>6} {(time.perf_counter() - start) / 2048 * 1e6:>8.1f}")
+
+        print()
+        print(f"{'path':<9} {'caller':<14} {'threads':>7} {'msg/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'batch':>6}")
+        for inference, fitted_compiled in (('compiled', compiled), ('sklearn', None)):
+            model.use_fitted(vectorizer, classifier, None, fitted_compiled)
+            callers = [('direct', None)] + [(f"batched {wait * 1000:g}ms", wait) for wait in args.wait]
+            for caller, wait in callers:
+                for concurrency in args.concurrency:
+                    calls = max(args.calls // concurrency, 1)
+                    if inference == 'sklearn':
+                        calls = max(calls // 10, 1)
+                    if wait is None:
+                        rate, p50, p99 = load(concurrency, calls, model.predict_emotion, messages)
+                        mean_batch = 1.0
+                    else:
+                        batcher = MicroBatcher(model.predict_emotions, args.batch_size, wait)
+                        rate, p50, p99 = load(concurrency, calls, batcher, messages)
+                        mean_batch = batcher.stats()['mean_batch_size']
+                        batcher.close()
+                    print(f"{inference:<9} {caller:<14} {concurrency:>7} {rate:>8.0f} {p50:>8.2f} {p99:>8.2f} "
+                          f"{mean_batch:>6.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+'''
+Benchmark for TextPreprocessor: per-message time of the previous implementation (word_tokenize, a
+WordNet lemmatizer call per token and two prints per message) against the cached preprocess, and
+preprocess_batch, on a synthetic stream of chat messages in which popular messages repeat.
+stdout goes to os.devnull while the previous implementation runs, so its prints cost what a
+redirected server log would. Needs the NLTK data main.py downloads.
+Usage: python bench_preprocess.py [--messages 20000] [--distinct 2000] [--batch 64]
+'''
+import argparse
+import contextlib
+import os
+import random
+import time
+
+import nltk
+from nltk.tokenize import word_tokenize
+
+from preprocess import TextPreprocessor
+
+WORDS = ('the pasta was cold and the service slow', 'I loved the baked lasagna', 'can I see the menu',
+         'what drinks do you have', 'the seafood sotanghon tasted amazing', 'portions were too small',
+         'our waiter forgot the sides', 'desserts are my favourite part', 'any recommendations for the main course',
+         'the salad dressing was too salty', 'we waited forty minutes', 'thank you so much')
+
+
+class PreviousPreprocessor(TextPreprocessor):
+    # The pipeline as it was before the caches: no multi-word keywords, no memoization, print per message
+    def preprocess(self, text):
+        print("Original text:", text)
+        tokens = word_tokenize(text)
+        lowercased = [w.lower() for w in tokens]
+        filtered = [w for w in lowercased if w not in self.stop_words or w in self.menu_keywords]
+        lemmatized = [w if w in self.menu_keywords else self.lemmatizer.lemmatize(w) for w in filtered]
+        preprocessed_text = ' '.join(lemmatized)
+        print("Preprocessed text:", preprocessed_text)
+        return preprocessed_text
+
+
+def make_messages(count, distinct, seed=0):
+    rng = random.Random(seed)
+    pool = []
+    for index in range(distinct):
+        clauses = rng.sample(WORDS, rng.randint(1, 3))
+        pool.append(f"{', '.join(clauses).capitalize()}{rng.choice(['.', '!', '?', ''])} #{index}")
+    # Zipf-like popularity: a few messages ("1", "thanks", menu names) make up much of the traffic
+    weights = [1.0 / (rank + 1) for rank in range(distinct)]
+    return rng.choices(pool, weights, k=count)
+
+
+def timed(function, messages):
+    start = time.perf_counter()
+    function(messages)
+    return (time.perf_counter() - start) / len(messages) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--distinct', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=64)
+    args = parser.parse_args()
+    for package in ('stopwords', 'punkt', 'punkt_tab', 'wordnet', 'vader_lexicon'):
+        nltk.download(package, quiet=True)
+
+    messages = make_messages(args.messages, args.distinct)
+    previous, current = PreviousPreprocessor(), TextPreprocessor()
+    batched = TextPreprocessor()
+    # Load WordNet before timing anything
+    previous.lemmatizer.lemmatize('warmup')
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        previous_us = timed(lambda texts: [previous.preprocess(text) for text in texts], messages)
+    current_us = timed(lambda texts: [current.preprocess(text) for text in texts], messages)
+    batch_us = timed(lambda texts: [batched.preprocess_batch(texts[start:start + args.batch])
+                                    for start in range(0, len(texts), args.batch)], messages)
+    cold = TextPreprocessor(cache_size=1)
+    cold_us = timed(lambda texts: [cold.preprocess(text) for text in texts], messages)
+
+    stats = current.cache_stats()
+    print(f"{len(messages)} messages, {len(set(messages))} distinct")
+    print(f"{'implementation':<28} {'us/message':>10} {'speedup':>8}")
+    for name, value in (('previous', previous_us), ('preprocess (text cache off)', cold_us),
+                        ('preprocess', current_us), (f"preprocess_batch({args.batch})", batch_us)):
+        print(f"{name:<28} {value:>10.1f} {previous_us / value:>7.1f}x")
+    print(f"text cache hit rate {stats['texts']['hits'] / max(stats['texts']['hits'] + stats['texts']['misses'], 1):.2f}, "
+          f"lemma cache hit rate {stats['lemmas']['hits'] / max(stats['lemmas']['hits'] + stats['lemmas']['misses'], 1):.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+'''
+Benchmark for the materialized report cache: mean latency of /analyze_feedback, /feedback_report and
+/download_report through Flask's test client when every request builds the report (the cache is
+invalidated before each one, as new feedback would), when the report is served from the cache, and for
+a dashboard poll that sends the ETag it got last time and is answered 304.
+Messages are AnnotatedMessage records scored by bench_feedback_analyzer's keyword stand-in for VADER.
+Usage: python bench_report_cache.py [--history 10000] [--requests 20]
+'''
+import argparse
+import os
+import random
+import tempfile
+import time
+from types import SimpleNamespace
+
+from flask import Flask
+
+import routes
+from bench_feedback_analyzer import KeywordScorer, make_messages
+from feedback_analyzer import FeedbackAnalyzer
+from feedback_store import FeedbackStore
+from report_cache import ReportCache
+
+URLS = ('/analyze_feedback', '/feedback_report', '/download_report')
+
+
+def mean_latency(client, url, requests, before=None, headers=None):
+    total = 0.0
+    for _ in range(requests):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        total += time.perf_counter() - start
+    return total / requests, response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--history', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = FeedbackStore(os.path.join(directory, 'feedback.sqlite3'))
+        analyzer = FeedbackAnalyzer(make_messages(args.history, 0, random.Random(0), KeywordScorer()), store=store)
+        analyzer.update()
+        store.flush(timeout=None)
+        chatbot = SimpleNamespace(feedback_analyzer=analyzer, report_cache=ReportCache(analyzer))
+        app = Flask(__name__, template_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates'))
+        routes.initialize_routes(app, chatbot)
+        client = app.test_client()
+
+        def invalidate():
+            # Store-backed reports are versioned by the store, which does not change here, so drop them too
+            analyzer.version += 1
+            chatbot.report_cache.entries.clear()
+
+        print(f"{args.history} messages, {len(analyzer.columns)} statements")
+        print(f"{'route':<18} {'built ms':>9} {'cached ms':>10} {'304 ms':>8} {'bytes':>8}")
+        for url in URLS:
+            built, _ = mean_latency(client, url, args.requests, before=invalidate)
+            cached, response = mean_latency(client, url, args.requests)
+            polled, not_modified = mean_latency(client, url, args.requests, headers={'If-None-Match': response.headers['ETag']})
+            assert not_modified.status_code == 304
+            print(f"{url:<18} {built * 1000:>9.2f} {cached * 1000:>10.2f} {polled * 1000:>8.2f} {len(response.data):>8}")
+        print(chatbot.report_cache.stats())
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
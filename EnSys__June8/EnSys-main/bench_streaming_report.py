@@ -0,0 +1,73 @@
+'''
+Benchmark for streamed reports: time to first byte, total time and peak traced memory of a request to
+/analyze_feedback (page and summary built whole, then sent) against /analyze_feedback/stream, and of
+the streamed CSV export, as the number of statements grows. Responses are read chunk by chunk and
+dropped, as a client would; the cache is invalidated before each request so every one is rendered.
+Messages are AnnotatedMessage records scored by bench_feedback_analyzer's keyword stand-in for VADER.
+Usage: python bench_streaming_report.py [--history 20000 100000 300000]
+'''
+import argparse
+import gc
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from flask import Flask
+
+import routes
+from bench_feedback_analyzer import KeywordScorer, make_messages
+from feedback_analyzer import FeedbackAnalyzer
+from feedback_store import FeedbackStore
+from report_cache import ReportCache
+
+URLS = ('/analyze_feedback', '/analyze_feedback/stream', '/export_feedback?format=csv')
+
+
+def measure(client, url):
+    # (seconds to the first chunk, total seconds, peak traced bytes, body bytes)
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = client.get(url, buffered=False)
+    first, size = None, 0
+    for chunk in response.response:
+        if first is None:
+            first = time.perf_counter() - start
+        size += len(chunk)
+    total = time.perf_counter() - start
+    response.close()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return first, total, peak, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--history', type=int, nargs='+', default=[20000, 100000, 300000])
+    args = parser.parse_args()
+
+    template_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+    print(f"{'statements':>10} {'route':<28} {'first byte ms':>14} {'total ms':>9} {'peak MB':>8} {'body MB':>8}")
+    for history in args.history:
+        with tempfile.TemporaryDirectory() as directory:
+            store = FeedbackStore(os.path.join(directory, 'feedback.sqlite3'))
+            analyzer = FeedbackAnalyzer(make_messages(history, 0, random.Random(0), KeywordScorer()), store=store)
+            analyzer.update()
+            store.flush(timeout=None)
+            chatbot = SimpleNamespace(feedback_analyzer=analyzer, feedback_store=store, report_cache=ReportCache(analyzer))
+            app = Flask(__name__, template_folder=template_folder)
+            routes.initialize_routes(app, chatbot)
+            client = app.test_client()
+            for url in URLS:
+                analyzer.version += 1
+                first, total, peak, size = measure(client, url)
+                print(f"{len(analyzer.columns):>10} {url:<28} {first * 1000:>14.1f} {total * 1000:>9.1f} "
+                      f"{peak / 2 ** 20:>8.1f} {size / 2 ** 20:>8.1f}")
+            store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+'''
+Benchmark for EmotionModel training: peak RSS and wall time of train_model (whole CSV in memory,
+TF-IDF vocabulary, LogisticRegression) against train_model_streaming (chunked reads, hashed features,
+SGDClassifier.partial_fit), on a synthetic dialogue CSV with the empathetic dialogues columns.
+Each run happens in a fresh subprocess, so peak RSS is measured per path.
+Usage: python bench_streaming_training.py [--rows 50000 200000 500000] [--classes 32]
+'''
+import argparse
+import contextlib
+import csv
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def make_dataset(path, rows, classes, vocabulary=30000, seed=0):
+    rng = np.random.default_rng(seed)
+    words = np.array([f"w{i}" for i in range(vocabulary)])
+    # Each emotion has its own favourite words on top of a Zipf-like background
+    emotion_words = rng.integers(0, vocabulary, size=(classes, 40))
+    background = 1.0 / np.arange(1, vocabulary + 1)
+    background /= background.sum()
+
+    def sentences(emotions, length):
+        own = rng.random((len(emotions), length)) < 0.2
+        chosen = np.where(own, emotion_words[emotions[:, None], rng.integers(0, 40, (len(emotions), length))],
+                          rng.choice(vocabulary, (len(emotions), length), p=background))
+        return [' '.join(row) for row in words[chosen]]
+
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['context', 'prompt', 'utterance', 'emotion'])
+        for start in range(0, rows, 10000):
+            emotions = rng.integers(0, classes, min(10000, rows - start))
+            writer.writerows(zip(sentences(emotions, 5), sentences(emotions, 25), sentences(emotions, 15),
+                                 (f"emotion{emotion}" for emotion in emotions)))
+
+
+def worker(mode, path):
+    from model import EmotionModel
+    model = EmotionModel(None)
+    start = time.perf_counter()
+    if mode == 'stream':
+        metrics = model.train_model_streaming(path)
+    else:
+        # train_model prints the accuracy on its own random 20% split
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            model.train_model(path)
+        metrics = {'Accuracy': float(output.getvalue().split("Model accuracy:")[1].split()[0])}
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{elapsed:.2f} {peak_kb} {metrics['Accuracy']:.3f}")
+
+
+def run(mode, path):
+    output = subprocess.run([sys.executable, __file__, '--worker', mode, path], capture_output=True, text=True,
+                            check=True).stdout.strip().splitlines()[-1]
+    elapsed, peak_kb, accuracy = output.split()
+    return float(elapsed), int(peak_kb) / 1024, float(accuracy)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[50000, 200000, 500000])
+    parser.add_argument('--classes', type=int, default=32)
+    parser.add_argument('--worker', nargs=2, metavar=('MODE', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        worker(*args.worker)
+        return
+
+    print(f"{'path':<8} {'rows':>8} {'csv MB':>8} {'wall s':>8} {'peak MB':>8} {'accuracy':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in args.rows:
+            path = os.path.join(directory, f"dialogues_{rows}.csv")
+            make_dataset(path, rows, args.classes)
+            size = os.path.getsize(path) / 2 ** 20
+            for mode in ('batch', 'stream'):
+                elapsed, peak, accuracy = run(mode, path)
+                print(f"{mode:<8} {rows:>8} {size:>8.1f} {elapsed:>8.2f} {peak:>8.0f} {accuracy:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+'''
+Benchmark for the taxonomy engine: time to categorize N statements with the per-statement chain of
+substring tests (Taxonomy.classify, the rule FeedbackAnalyzer.classify always applied) against
+Taxonomy.categorize, which matches the whole batch with NumPy and takes one sparse matrix product,
+in single-label (compatibility) and multi-label mode. The single-label codes are checked against the
+per-statement labels.
+Usage: python bench_taxonomy.py [--statements 10000 100000 1000000] [--taxonomy taxonomy.json]
+'''
+import argparse
+import random
+import time
+
+from feedback_columns import KINDS
+from taxonomy import Taxonomy, TAXONOMY_PATH
+
+SUBJECTS = ('The food', 'The seafood pasta', 'Our waiter', 'The staff and the manager', 'The atmosphere',
+            'The restroom', 'Prices for the dessert', 'The view from the terrace', 'Everything',
+            'You should add a kids menu and', 'It would be better if the music and the noise')
+VERDICTS = (('was great', 0.6), ('was awful', -0.6), ('was fine', 0.0), ('could be cleaner', -0.2),
+            ('felt too expensive', -0.4), ('is worth the cost', 0.5))
+
+
+def make_statements(count, seed=0):
+    rng = random.Random(seed)
+    statements, compounds = [], []
+    for index in range(count):
+        verdict, compound = rng.choice(VERDICTS)
+        statements.append(f"{rng.choice(SUBJECTS)} {verdict} on visit {index}")
+        compounds.append(compound)
+    return statements, compounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--statements', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--taxonomy', default=TAXONOMY_PATH)
+    args = parser.parse_args()
+
+    taxonomy = Taxonomy.load(args.taxonomy)
+    print(f"{len(taxonomy.categories)} categories, {len(taxonomy.terms)} terms")
+    print(f"{'statements':>10} {'loop ms':>9} {'single ms':>10} {'multi ms':>9} {'labels':>9} {'same labels':>12}")
+    for count in args.statements:
+        statements, compounds = make_statements(count)
+        start = time.perf_counter()
+        expected = [taxonomy.classify(statement, compound) for statement, compound in zip(statements, compounds)]
+        loop_time = time.perf_counter() - start
+        start = time.perf_counter()
+        category, kind = taxonomy.categorize(statements, compounds)
+        single_time = time.perf_counter() - start
+        start = time.perf_counter()
+        rows, _, _ = taxonomy.categorize(statements, compounds, multi_label=True)
+        multi_time = time.perf_counter() - start
+        actual = [(taxonomy.categories[category], KINDS[kind]) if category >= 0 else None
+                  for category, kind in zip(category.tolist(), kind.tolist())]
+        print(f"{count:>10} {loop_time * 1000:>9.1f} {single_time * 1000:>10.1f} {multi_time * 1000:>9.1f} "
+              f"{len(rows):>9} {str(actual == expected):>12}")
+
+
+if __name__ == '__main__':
+    main()
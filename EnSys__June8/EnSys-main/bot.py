@@ -1,31 +1,111 @@
-import os, random
+import os, random, time, asyncio, atexit, logging, queue
+from collections import Counter
+from concurrent.futures import TimeoutError as FutureTimeoutError
 import openai
 import pandas as pd
 from dotenv import load_dotenv
 from model import EmotionModel
 from preprocess import TextPreprocessor
 from feedback_analyzer import FeedbackAnalyzer
+from feedback_store import FeedbackStore
+from report_cache import ReportCache
+from annotation import MessageAnnotator
+from menu_index import MenuIndex
+from dish_matcher import DishMatcher
+from intent_router import IntentRouter, default_intents
+from session_store import SessionStore
+from prompt_builder import PromptBuilder
+from chat_journal import ChatJournal
+from response_cache import ResponseCache
+from async_llm import AsyncCompletionClient, CompletionError, EventLoopThread
+from fallback_responder import FallbackResponder
+from model_registry import ModelRegistry
+from jobs import JobScheduler
+from micro_batcher import MicroBatcher
+from sweep import run_sweep
+
+logger = logging.getLogger(__name__)
 
 def load_config():
     dotenv_path = os.path.join(os.path.dirname(__file__), 'static', 'key.env')
     load_dotenv(dotenv_path)
     return os.getenv('OPENAI_API_KEY')
 
+# Feedback keyword matched by the intent router -> feedback type recorded for it
+FEEDBACK_TYPES = {'like': 'like', 'dislike': 'dislike', 'suggestions': 'suggestion'}
+
+# Session used when no session id is given, e.g. the command line chat below
+DEFAULT_SESSION_ID = 'default'
+
+# Completion model served by main.py and async_server.py
+#ENGINE = "ft:gpt-3.5-turbo-0125:ensys:restaurant-2:9SO7Maw7"
+ENGINE = "ft:gpt-3.5-turbo-0125:ensys:empatheticd:9XQSt7AX"
+
+def create_bot(**options):
+    # Bot for a server process: API key from static/key.env, OPENAI_API_BASE to use a local stand-in
+    return EnSysBot(ENGINE, load_config(), api_base=os.getenv('OPENAI_API_BASE'), **options)
+
 class EnSysBot:
-    def __init__(self, engine, api_key):
+    def __init__(self, engine, api_key, api_base=None, session_budget_bytes=64 * 1024 * 1024, session_idle_ttl=30 * 60,
+                 prompt_token_budget=3000, prompt_keep_turns=6, journal_path='chat_history.jsonl',
+                 response_cache_path=None, response_similarity=0.85, llm_concurrency=32, llm_timeout=30.0,
+                 llm_retries=2, fallback_deadline=8.0, exemplar_index_path=None, model_registry_path='models',
+                 model_check_interval=5.0, jobs_path='jobs.sqlite3', job_workers=2, emotion_batch_size=32,
+                 emotion_batch_wait=0.0, feedback_store_path='feedback.sqlite3', data_dir=None):
         self.engine = engine
         self.api_key = api_key
-        self.last_topic = None
-        self.conversation = []
+        # Feedback of finished (or evicted) chats not yet ingested; live conversations are kept per session
         self.feedback = []
-        self.feedback_data = []
+        # Kept up to date incrementally as finished chats are flushed into self.feedback; the analyzed
+        # statements are also written to a SQLite store, which the dated, paginated reports read. Ingested
+        # messages are dropped from self.feedback, so only their statements in the columns and store remain
+        self.feedback_store = FeedbackStore(feedback_store_path)
+        self.feedback_analyzer = FeedbackAnalyzer(self.feedback, store=self.feedback_store, keep_messages=False)
+        # Report pages and downloads are rebuilt only after new feedback has been ingested
+        self.report_cache = ReportCache(self.feedback_analyzer)
+        self.sessions = SessionStore(max_bytes=session_budget_bytes, idle_ttl=session_idle_ttl,
+                                     on_evict=self.flush_session)
         self.preprocessor = TextPreprocessor()
-        self.model = EmotionModel(engine)
+        # Each customer message is annotated once; routing, emotion analysis and reports all read the record
+        self.annotator = MessageAnnotator(self.preprocessor)
+        self.journal = ChatJournal(journal_path)
+        self.response_cache = ResponseCache(similarity_threshold=response_similarity, persist_path=response_cache_path)
+        self.prompt_builder = PromptBuilder(token_budget=prompt_token_budget, keep_turns=prompt_keep_turns, model=engine)
+        # Start from the latest published emotion model; newer versions are picked up as they are promoted
+        self.model = EmotionModel(engine, registry=ModelRegistry(model_registry_path))
+        self.model.load_current()
+        self.model_check_interval = model_check_interval
+        self.model_checked = time.monotonic()
+        # Emotion predictions from concurrent sessions are answered in batches when the model has no compiled
+        # path; with the default wait of 0, a batch is whatever arrived while the previous one ran
+        self.emotion_batcher = MicroBatcher(self.model.predict_emotions, emotion_batch_size, emotion_batch_wait,
+                                            name='emotion-batcher')
+        # Training and evaluation run as background jobs, never inside a request, on datasets from data_dir only
+        self.jobs = JobScheduler(jobs_path, workers=job_workers)
+        self.data_dir = os.path.abspath(data_dir or os.path.dirname(__file__))
         openai.api_key = self.api_key
+        # Lets the bot talk to a local stand-in such as fake_completion_server.py
+        if api_base:
+            openai.api_base = api_base
+
+        # Completion calls run on one shared event loop thread with a pooled HTTP client
+        self.llm_loop = EventLoopThread()
+        self.llm = AsyncCompletionClient(api_key, engine, api_base=openai.api_base, max_concurrency=llm_concurrency,
+                                         timeout=llm_timeout, max_retries=llm_retries)
+        atexit.register(self.close)
+
+        # Past fallback_deadline seconds a local retrieval answer is served (None waits for the API);
+        # served_by counts which path answered each completion request
+        self.fallback_deadline = fallback_deadline
+        self.fallback_responder = FallbackResponder(self.model, index_path=exemplar_index_path)
+        self.served_by = Counter()
 
         # Load restaurant data
-        self.restaurant_data = self.load_restaurant_data()
         self.menu_categories = ['dessert', 'drinks', 'main course', 'pasta', 'salad', 'sides']
+        self.menu_index = None
+        self.dish_matcher = None
+        self.intent_router = None
+        self.reload_menu()
         
         # Add a pre-prompt that establishes the bot's identity
         self.pre_prompt = (
@@ -35,76 +115,83 @@ class EnSysBot:
             "Please ensure to maintain a helpful and polite tone in your responses."
         )
 
-    def add_system_message(self, content):
-        self.conversation.append({"role": "system", "content": content})
-
-    def add_user_message(self, content):
-        self.conversation.append({"role": "user", "content": content})
-        self.feedback.append(content)
-
-    def save_chat_history(self, filename='chat_history.txt'):
-        with open(filename, 'a') as file:
-            for message in self.conversation:
-                file.write(f"{message['role'].capitalize()}: {message['content']}\n")
-            file.write("\n--- End of Conversation ---\n\n")
-
-    def generate_response(self, prompt):
-        # Add the user's message to the conversation
-        self.add_user_message(prompt)
-
-        # Preprocess the user's prompt
-        preprocessed_prompt = self.preprocessor.preprocess(prompt)
-        sentiment = self.preprocessor.get_sentiment(prompt)
+    def close(self):
+        # Release the pooled HTTP connections and stop the completion loop
+        if not self.jobs.closed:
+            self.jobs.close()
+        if not self.emotion_batcher.closed:
+            self.emotion_batcher.close()
+        self.feedback_store.close()
+        if self.llm_loop.thread.is_alive():
+            self.llm_loop.run(self.llm.close(), timeout=5)
+            self.llm_loop.stop()
+
+    def get_session(self, session_id=None):
+        return self.sessions.get(session_id or DEFAULT_SESSION_ID)
+
+    def add_system_message(self, content, session):
+        self.sessions.add_message(session, "system", content)
+
+    def add_user_message(self, message, session):
+        self.sessions.add_message(session, "user", message.text)
+        self.sessions.add_feedback(session, message)
+
+    def save_chat_history(self, session):
+        # Journal only the messages added since the last save; the writes happen on the journal's thread
+        for role, content in session.conversation[session.journaled:]:
+            self.journal.append(session.session_id, role, content)
+        session.journaled = len(session.conversation)
+
+    # mode decides how replies that come from the completion API are returned: 'text' returns the string,
+    # 'stream' a generator of text chunks and 'async' a coroutine (see agenerate_response); streamed and
+    # async replies are recorded in the conversation once they are complete
+    def generate_response(self, prompt, session_id=None, mode='text'):
+        session = self.get_session(session_id)
+
+        # Annotate the user's prompt (tokens, normalized text, sentiment) and add it to the conversation
+        message = self.annotator.annotate(prompt)
+        self.add_user_message(message, session)
+        preprocessed_prompt = message.normalized
+        sentiment = message.sentiment
 
         response = ""  # Initialize the response variable
 
-        # Check if the user's input matches a specific dish within each menu category
-        for cat, items in self.get_menu().items():
-            for item in items:
-                if item['name'].lower() in preprocessed_prompt:
-                    # Call generate_dish_response method for the specific dish
-                    dish_response = self.generate_dish_response(item)
-                    self.add_system_message(dish_response)
-                    self.save_chat_history()  # Save the chat history
-                    print("Bot:", dish_response)
-                    return dish_response
+        # Check if the user's input mentions a specific dish; the first mention wins
+        item = self.dish_matcher.find(preprocessed_prompt)
+        if item is not None:
+            # Call generate_dish_response method for the specific dish
+            dish_response = self.generate_dish_response(item)
+            self.add_system_message(dish_response, session)
+            self.save_chat_history(session)  # Save the chat history
+            print("Bot:", dish_response)
+            return dish_response
 
-        # Handle feedback-related queries
-        feedback_query_response = self.handle_feedback_query(preprocessed_prompt)
-        if feedback_query_response:
-            self.save_chat_history()  # Save the chat history
-            return feedback_query_response
-
-        # Check if the user's input indicates positive sentiment towards a food item
-        if sentiment['compound'] > 0.05 and 'no' not in preprocessed_prompt.lower():
-            response = self.generate_gpt_response(prompt, sentiment, context="positive")
-            self.add_system_message(response)
-            self.save_chat_history()  # Save the chat history
-            print("Bot:", response)
-            return response
+        # Classify the prompt against the intent table in a single pass
+        route = self.intent_router.classify(preprocessed_prompt, sentiment['compound'], has_topic=bool(session.last_topic))
+        intent = route.intent if route else None
 
-        # Check if the user's input indicates negative sentiment towards a food item
-        elif sentiment['compound'] < -0.05:
-            response = self.generate_gpt_response(prompt, sentiment, context="negative")
-            self.add_system_message(response)
-            self.save_chat_history()  # Save the chat history
+        # Handle feedback-related queries
+        if intent == 'feedback':
+            return self.handle_feedback_query(message, route.keyword, session, mode)
+
+        # The user's input indicates positive sentiment towards a food item
+        if intent == 'positive_sentiment':
+            return self.reply_gpt(message, "positive", session, mode)
+
+        # The user's input indicates negative sentiment towards a food item
+        if intent == 'negative_sentiment':
+            return self.reply_gpt(message, "negative", session, mode)
+
+        # The user's input praises the menu
+        if intent == 'menu_praise':
+            response = self.get_menu_praise_response()
+            self.add_system_message(response, session)
+            self.save_chat_history(session)  # Save the chat history
             print("Bot:", response)
             return response
 
-        # Check if the user's input praises the menu
-        menu_praise_keywords = ['love menu', 'like menu', 'great menu', 'awesome menu', 'amazing menu', 'menu is good']
-        if any(keyword in preprocessed_prompt for keyword in menu_praise_keywords):
-            sentiment_score = sentiment['compound']
-            if sentiment_score > 0.05:
-                response = self.get_menu_praise_response()
-                self.add_system_message(response)
-                self.save_chat_history()  # Save the chat history
-                print("Bot:", response)
-                return response
-
-        # Check if the user's input is related to the restaurant name
-        restaurant_name_keywords = ['restaurant name', 'name of this place', 'called', 'called this', 'name', 'tell place', 'this place']
-        if any(keyword in preprocessed_prompt for keyword in restaurant_name_keywords):
+        # The user's input is related to the restaurant name
+        if intent == 'restaurant_name':
             # Generate a response with the restaurant's name
             restaurant_name = self.get_restaurant_name_response()
             # Mix canned and generated response
@@ -114,62 +201,47 @@ class EnSysBot:
             ]
             # Randomly select a response
             response = random.choice(canned_responses)
-            self.add_system_message(response)
-            self.save_chat_history()  # Save the chat history
+            self.add_system_message(response, session)
+            self.save_chat_history(session)  # Save the chat history
             print("Bot:", response)
             return response
 
-        # Check if the user's input is related to the restaurant profile
-        restaurant_profile_keywords = ['restaurant profile', 'about the restaurant', 'tell me about', 'more about this place', 'more about this restaurant', 'tell atin-atehan', 'tell restaurant']
-        if any(keyword in preprocessed_prompt for keyword in restaurant_profile_keywords):
+        # The user's input is related to the restaurant profile
+        if intent == 'restaurant_profile':
             # Get the restaurant profile from the CSV data
             restaurant_profile = self.get_restaurant_profile_response()
             if restaurant_profile:
                 # Generate a prompt to ask for more information about the restaurant profile
                 prompt = f"Could you provide more details about {restaurant_profile}?"
                 # Generate a response using OpenAI model
-                response = self.generate_gpt_response(prompt, sentiment, context="restaurant_profile")
-                self.save_chat_history()  # Save the chat history
-                print("Restaurant Profile:", response)
-                return response
+                return self.reply_gpt(message, "restaurant_profile", session, mode, prompt=prompt)
             else:
                 response = "I'm sorry, but I couldn't find information about the restaurant profile at the moment."
-                self.add_system_message(response)
-                self.save_chat_history()  # Save the chat history
+                self.add_system_message(response, session)
+                self.save_chat_history(session)  # Save the chat history
                 print("Bot:", response)
                 return response
 
-        # Check if the user's input is related to the menu
-        if 'menu' in preprocessed_prompt:
-            # If sentiment is neutral, respond with category list
-            if -0.05 <= sentiment['compound'] <= 0.05:
-                response = self.get_menu_category_response()
-                self.add_system_message(response)
-                self.save_chat_history()  # Save the chat history
-                print("Bot:", response)
-                return response
+        # The user's input is about the menu with neutral sentiment, respond with category list
+        if intent == 'menu_overview':
+            response = self.get_menu_category_response()
+            self.add_system_message(response, session)
+            self.save_chat_history(session)  # Save the chat history
+            print("Bot:", response)
+            return response
+
+        # The user's input matches a specific category
+        if intent == 'menu_category':
+            # Pre-rendered numbered list of the category's dishes
+            response = self.menu_index.category_text[route.keyword]
+            self.add_system_message(response, session)
+            session.last_topic = route.keyword
+            self.save_chat_history(session)  # Save the chat history
+            print("Bot:", response)
+            return response
 
-        # Check if the user's input matches a specific category
-        for category in self.menu_categories:
-            if category.lower() in preprocessed_prompt:
-                menu = self.get_menu()
-                if category.lower() in menu:
-                    # Start with the category name followed by a colon and newline
-                    formatted_menu = f"{category.capitalize()}:\n"
-                    # Add each menu item on a new line preceded by its index
-                    for idx, item in enumerate(menu[category.lower()], start=1):
-                        formatted_menu += f"{idx}. {item['name']}\n"
-                    response = formatted_menu.strip()  # Remove any trailing newlines
-                    self.add_system_message(response)
-                    self.last_topic = category.lower()
-                    self.save_chat_history()  # Save the chat history
-                    print("Bot:", response)
-                    return response
-
-
-        # Check if the user's input is related to recommendations
-        recommendation_keywords = ['recommend', 'suggest']
-        if any(keyword in preprocessed_prompt for keyword in recommendation_keywords):
+        # The user's input is related to recommendations
+        if intent == 'recommendation':
             # Sample recommendations
             recommendations = [
                 "Our chef's special pasta dish is highly recommended!",
@@ -178,71 +250,84 @@ class EnSysBot:
                 "How about indulging in our decadent chocolate lava cake for dessert?"
             ]
             response = "Sure! Here are some recommendations based on our popular dishes:\n\n" + "\n".join(recommendations)
-            self.add_system_message(response)
-            self.save_chat_history()  # Save the chat history
+            self.add_system_message(response, session)
+            self.save_chat_history(session)  # Save the chat history
             print("Bot:", response)
             return response
 
-        # Check if the user's input is a number after a menu list
-        if preprocessed_prompt.isdigit() and self.last_topic:
+        # The user's input is a number after a menu list
+        if intent == 'menu_selection':
             selected_index = int(preprocessed_prompt) - 1
-            menu_items = self.get_menu().get(self.last_topic, [])
+            menu_items = self.menu_index.get_category(session.last_topic)
             if 0 <= selected_index < len(menu_items):
                 selected_dish = menu_items[selected_index]
                 response = self.generate_dish_response(selected_dish)
-                self.add_system_message(response)
-                self.save_chat_history()  # Save the chat history
+                self.add_system_message(response, session)
+                self.save_chat_history(session)  # Save the chat history
                 print("Bot:", response)
                 return response
             else:
                 response = "I'm sorry, but that selection is out of range. Please choose a valid number from the menu."
-                self.add_system_message(response)
-                self.save_chat_history()  # Save the chat history
+                self.add_system_message(response, session)
+                self.save_chat_history(session)  # Save the chat history
                 print("Bot:", response)
                 return response
 
         # Use the last relevant topic if available
-        if self.last_topic:
-            response = f"Can you tell me more about {self.last_topic}?"
-            self.add_system_message(response)
-            self.save_chat_history()  # Save the chat history
+        if intent == 'follow_up':
+            response = f"Can you tell me more about {session.last_topic}?"
+            self.add_system_message(response, session)
+            self.save_chat_history(session)  # Save the chat history
             print("Bot:", response)
             return response
 
         # Use OpenAI to understand the context and generate a response
         try:
-            response = self.generate_gpt_response(prompt, sentiment)
-            self.add_system_message(response)
-            self.save_chat_history()  # Save the chat history
-            print("Bot:", response)
-            return response
+            return self.reply_gpt(message, None, session, mode)
 
         except Exception as e:
             print("Error:", e)
             return "I encountered an error while processing your request."
 
-    def handle_feedback_query(self, preprocessed_prompt):
-        # Check if the user's input indicates feedback-related queries
-        if 'like' in preprocessed_prompt or 'dislike' in preprocessed_prompt or 'suggestions' in preprocessed_prompt:
-            # Extract relevant information from the user input
-            feedback_type = None
-            if 'like' in preprocessed_prompt:
-                feedback_type = 'like'
-            elif 'dislike' in preprocessed_prompt:
-                feedback_type = 'dislike'
-            elif 'suggestions' in preprocessed_prompt:
-                feedback_type = 'suggestion'
-
-            if feedback_type:
-                # Analyze the user's feedback
-                feedback_analysis = self.analyze_feedback(feedback_type, preprocessed_prompt)
-                # Add the system response for feedback-related queries
-                feedback_response = f"Thank you for your {feedback_type}! We appreciate your input and will use it to improve our services."
-                self.add_system_message(feedback_response)
-                self.save_chat_history()  # Save the chat history
-                print("Bot:", feedback_response)
-                return feedback_response
-        return None
+    # Replies to the annotated message, or to prompt in its place, using the normalized text already computed
+    # (for the message) or cached (for a fixed prompt) as the response cache key
+    def reply_gpt(self, message, context, session, mode='text', prompt=None):
+        if prompt is None:
+            prompt, normalized_prompt = message.text, message.normalized
+        else:
+            normalized_prompt = self.preprocessor.normalize(prompt)
+        sentiment = message.sentiment
+        if mode == 'stream':
+            return self.stream_gpt_response(prompt, normalized_prompt, sentiment, context=context, session=session)
+        if mode == 'async':
+            return self.areply_gpt(prompt, normalized_prompt, sentiment, context, session)
+        response = self.generate_gpt_response(prompt, normalized_prompt, sentiment, context=context, session=session)
+        self.add_system_message(response, session)
+        self.save_chat_history(session)  # Save the chat history
+        print("Bot:", response)
+        return response
+
+    def handle_feedback_query(self, message, keyword, session, mode='text'):
+        # 'like', 'dislike' or 'suggestions', as matched by the feedback intent
+        feedback_type = FEEDBACK_TYPES[keyword]
+        if mode == 'async':
+            return self.ahandle_feedback_query(message, feedback_type, session)
+
+        # Analyze the user's feedback
+        feedback_analysis = self.analyze_feedback(feedback_type, message, session)
+        return self.feedback_reply(feedback_type, session)
+
+    async def ahandle_feedback_query(self, message, feedback_type, session):
+        await self.aanalyze_feedback(feedback_type, message, session)
+        return self.feedback_reply(feedback_type, session)
+
+    def feedback_reply(self, feedback_type, session):
+        # Add the system response for feedback-related queries
+        feedback_response = f"Thank you for your {feedback_type}! We appreciate your input and will use it to improve our services."
+        self.add_system_message(feedback_response, session)
+        self.save_chat_history(session)  # Save the chat history
+        print("Bot:", feedback_response)
+        return feedback_response
 
     def get_restaurant_name_response(self):
         if not self.restaurant_data.empty:
@@ -257,20 +342,24 @@ class EnSysBot:
             return "Sorry, I couldn't retrieve information about the restaurant profile at the moment."
 
     def get_menu(self):
-        menu = {}
-        if not self.restaurant_data.empty:
-            for dish_type in self.restaurant_data['Dish Type'].unique():
-                menu[dish_type.lower()] = []
-                group_df = self.restaurant_data[self.restaurant_data['Dish Type'].str.lower() == dish_type.lower()]
-                if not group_df.empty:
-                    for _, row in group_df.iterrows():
-                        # Ensure unique items
-                        if row['Dish Name'] not in [item['name'] for item in menu[dish_type.lower()]]:
-                            menu[dish_type.lower()].append({
-                                'name': row['Dish Name'],
-                                'description': row['Description']
-                            })
-        return menu
+        # Category -> ordered dish records, precomputed once when the menu is loaded
+        return self.menu_index.categories
+
+    def get_menu_text(self):
+        return self.menu_index.full_menu_text
+
+    def reload_menu(self):
+        self.restaurant_data = self.load_restaurant_data()
+        menu_index = MenuIndex.from_dataframe(self.restaurant_data)
+        # Keep the current index, and with it the compiled dish automaton, when the menu data is unchanged
+        if self.menu_index is None or menu_index.fingerprint != self.menu_index.fingerprint:
+            self.menu_index = menu_index
+        if self.dish_matcher is None or self.dish_matcher.is_stale(self.menu_index):
+            self.dish_matcher = DishMatcher(self.menu_index, alias_fn=self.preprocessor.normalize)
+            # Only categories that exist on the loaded menu can be routed to
+            categories = [category for category in self.menu_categories if category in self.menu_index]
+            self.intent_router = IntentRouter(default_intents(categories))
+            self.fallback_responder.build(self.menu_index, self.generate_dish_response)
 
     def load_restaurant_data(self):
         file_path = 'Atin-atehan.csv'
@@ -294,58 +383,281 @@ class EnSysBot:
     def get_menu_category_response(self):
         return "Our menu is divided into several categories including Dessert, Drinks, Main Course, Pasta, Salad, and Sides. Which category would you like to explore?"
 
-    def generate_gpt_response(self, prompt, sentiment, context=None):
-        messages = [{"role": "system", "content": self.pre_prompt}]
-        messages.extend(self.conversation)
+    def build_gpt_messages(self, prompt, sentiment, context=None, session=None):
+        extra_messages = []
 
         # Add additional context if provided
         if context:
             context_message = f"Context: {context}. Sentiment: {sentiment}"
-            messages.append({"role": "system", "content": context_message})
-
-        messages.append({"role": "user", "content": prompt})
+            extra_messages.append({"role": "system", "content": context_message})
+
+        extra_messages.append({"role": "user", "content": prompt})
+
+        if session is None:
+            return [{"role": "system", "content": self.pre_prompt}] + extra_messages
+        # Recent turns verbatim, older ones as a cached rolling summary, within the token budget
+        messages, prompt_stats = self.prompt_builder.build(self.pre_prompt, session, extra_messages)
+        logger.debug("Prompt tokens: %d (saved %d of %d)", prompt_stats['prompt_tokens'], prompt_stats['tokens_saved'],
+                     prompt_stats['full_tokens'])
+        return messages
+
+    def generate_gpt_response(self, prompt, normalized_prompt, sentiment, context=None, session=None):
+        served = 'cache'
+
+        # Only called when the response cache has nothing close enough to the prompt
+        def request_completion():
+            nonlocal served
+            served = 'upstream'
+            start = time.perf_counter()
+            future = self.llm_loop.submit(self.llm.complete(self.build_gpt_messages(prompt, sentiment, context, session)))
+            try:
+                return future.result(timeout=self.fallback_deadline)
+            except FutureTimeoutError:
+                # The call keeps running, so its answer still reaches the cache for the next asker
+                future.add_done_callback(lambda f: self.cache_late_completion(normalized_prompt, context, f, start))
+                raise
 
         try:
-            response = openai.ChatCompletion.create(
-                model=self.engine,
-                messages=messages
-            )
-            return response.choices[0].message['content'].strip()
-        except openai.error.OpenAIError as e:
+            response = self.response_cache.get_or_compute(normalized_prompt, context, request_completion)
+        except FutureTimeoutError:
+            served = 'local_deadline'
+            response = self.fallback_responder.respond(prompt)
+        except CompletionError as e:
             print("Error with OpenAI API:", e)
-            return "I'm sorry, but I couldn't process your request at the moment."
+            served = 'local_error'
+            response = self.fallback_responder.respond(prompt)
+        self.record_served_by(served, session)
+        return response
+
+    def cache_late_completion(self, normalized_prompt, context, future, start):
+        if not future.cancelled() and future.exception() is None:
+            self.response_cache.put(normalized_prompt, context, future.result(), time.perf_counter() - start)
+            self.served_by['late_upstream'] += 1
+
+    def record_served_by(self, served, session=None):
+        self.served_by[served] += 1
+        if session is not None:
+            self.journal.append_event(session.session_id, 'served', path=served)
+        logger.debug("Served by: %s", served)
+
+    def stream_gpt_response(self, prompt, normalized_prompt, sentiment, context=None, session=None):
+        # Yields the completion as it arrives, then records the full text like reply_gpt does. The stream runs
+        # through the pooled client on the LLM loop; past fallback_deadline without a first chunk the local
+        # answer is sent instead, and the call keeps running so its answer still reaches the cache
+        response = self.response_cache.lookup(normalized_prompt, context)
+        if response is not None:
+            served = 'cache'
+            yield response
+        else:
+            served = 'upstream'
+            chunks = []
+            start = time.perf_counter()
+            deltas = queue.SimpleQueue()
+
+            async def pump():
+                parts = []
+                async for delta in self.llm.stream(self.build_gpt_messages(prompt, sentiment, context, session)):
+                    parts.append(delta)
+                    deltas.put(delta)
+                return ''.join(parts).strip()
+
+            future = self.llm_loop.submit(pump())
+            future.add_done_callback(lambda f: deltas.put(None))
+            try:
+                timeout = self.fallback_deadline
+                while True:
+                    try:
+                        delta = deltas.get(timeout=timeout)
+                    except queue.Empty:
+                        future.add_done_callback(lambda f: self.cache_late_completion(normalized_prompt, context, f, start))
+                        served = 'local_deadline'
+                        response = self.fallback_responder.respond(prompt)
+                        yield response
+                        break
+                    if delta is None:
+                        response = future.result()
+                        self.response_cache.put(normalized_prompt, context, response, time.perf_counter() - start)
+                        break
+                    chunks.append(delta)
+                    yield delta
+                    # The client's own deadline bounds the rest of the stream
+                    timeout = None
+            except CompletionError as e:
+                print("Error with OpenAI API:", e)
+                if chunks:
+                    served = 'error'
+                    response = "I'm sorry, but I couldn't process your request at the moment."
+                    yield "\n" + response
+                else:
+                    served = 'local_error'
+                    response = self.fallback_responder.respond(prompt)
+                    yield response
+            finally:
+                # The client went away mid-stream; the answer is no longer wanted
+                if served == 'upstream' and not future.done():
+                    future.cancel()
+
+        self.record_served_by(served, session)
+        if session is not None:
+            self.add_system_message(response, session)
+            self.save_chat_history(session)  # Save the chat history
+        print("Bot:", response)
+
+    async def agenerate_response(self, prompt, session_id=None):
+        # Async counterpart of generate_response: only the completion call is awaited
+        response = self.generate_response(prompt, session_id, mode='async')
+        if asyncio.iscoroutine(response):
+            response = await response
+        return response
+
+    async def areply_gpt(self, prompt, normalized_prompt, sentiment, context, session):
+        response = await self.agenerate_gpt_response(prompt, normalized_prompt, sentiment, context, session)
+        self.add_system_message(response, session)
+        self.save_chat_history(session)  # Save the chat history
+        print("Bot:", response)
+        return response
+
+    async def agenerate_gpt_response(self, prompt, normalized_prompt, sentiment, context=None, session=None):
+        response = self.response_cache.lookup(normalized_prompt, context)
+        if response is not None:
+            self.record_served_by('cache', session)
+            return response
+        start = time.perf_counter()
+        completion = self.llm.complete(self.build_gpt_messages(prompt, sentiment, context, session))
+        if asyncio.get_running_loop() is self.llm_loop.loop:
+            task = asyncio.ensure_future(completion)
+        else:
+            # The pooled client belongs to the LLM loop; await it from whichever loop we are on
+            task = asyncio.wrap_future(self.llm_loop.submit(completion))
+
+        # asyncio.wait leaves the call running past the deadline, unlike wait_for
+        done, _ = await asyncio.wait({task}, timeout=self.fallback_deadline)
+        if not done:
+            task.add_done_callback(lambda f: self.cache_late_completion(normalized_prompt, context, f, start))
+            self.record_served_by('local_deadline', session)
+            return self.fallback_responder.respond(prompt)
+        try:
+            response = task.result()
+        except CompletionError as e:
+            print("Error with OpenAI API:", e)
+            self.record_served_by('local_error', session)
+            return self.fallback_responder.respond(prompt)
+        self.response_cache.put(normalized_prompt, context, response, time.perf_counter() - start)
+        self.record_served_by('upstream', session)
+        return response
+
+    def train_emotion_model(self, dataset_path, streaming=False):
+        if streaming:
+            self.model.train_model_streaming(dataset_path)
+        else:
+            self.model.train_model(dataset_path)
+
+    # Path of a dataset named in a request: a CSV file directly in data_dir, so a client cannot make the
+    # server read any other file, nor learn whether one exists
+    def resolve_dataset(self, name):
+        path = os.path.join(self.data_dir, name)
+        if os.path.basename(name) != name or not name.endswith('.csv') or not os.path.isfile(path):
+            raise ValueError("Unknown dataset")
+        return path
+
+    # Queue a training run; the current model keeps serving until the new one is fitted and swapped in
+    def start_training(self, dataset_path, streaming=False, priority=0):
+        def train(job):
+            job.log(f"Training on {dataset_path} ({'streaming' if streaming else 'in memory'})")
+            # job.progress is the last cancellation point: both training methods call it once more just before
+            # they publish, and a cancel that arrives after that is ignored, so the job returns the new version
+            if streaming:
+                metrics = self.model.train_model_streaming(dataset_path, progress=job.progress)
+            else:
+                job.progress(0.0, message='fitting')
+                metrics = {'Accuracy': self.model.train_model(dataset_path, progress=job.progress)}
+            self.jobs.append_log(job.id, f"Serving emotion model {self.model.version or '(unregistered)'}")
+            return {'version': self.model.version, 'metrics': metrics}
+
+        return self.jobs.submit('train', train, {'dataset': dataset_path, 'streaming': streaming}, priority)
 
-    def train_emotion_model(self, dataset_path):
-        self.model.train_model(dataset_path)
+    def start_evaluation(self, grid, folds=5, dataset_path='annotated_empatheticdialogues.csv', priority=0):
+        def evaluate(job):
+            texts, labels = self.model.load_dataset(dataset_path)
+            job.log(f"Loaded {len(texts)} samples from {dataset_path}")
+            results = run_sweep(texts, labels, grid, folds, progress=job.progress)
+            job.log(f"Best configuration: {results['best']}")
+            return results
+
+        return self.jobs.submit('evaluate', evaluate, {'dataset': dataset_path, 'grid': grid, 'folds': folds}, priority)
 
     def process_feedback(self, feedback):
         analyzer = FeedbackAnalyzer()
         analysis = analyzer.analyze_feedback(feedback)
         return analysis
     
-    def analyze_feedback(self, feedback_type, preprocessed_prompt):
-        feedback_analysis = self.model.predict_emotion(preprocessed_prompt)
-        self.feedback_data.append({
+    def refresh_model(self):
+        # Reading CURRENT is cheap, but there is no need to do it for every message
+        now = time.monotonic()
+        if now - self.model_checked >= self.model_check_interval:
+            self.model_checked = now
+            self.model.load_current()
+
+    def analyze_feedback(self, feedback_type, message, session):
+        self.refresh_model()
+        if message.emotion is None:
+            # A compiled prediction takes tens of microseconds, less than handing it to the batcher
+            if self.model.compiled is not None:
+                message.emotion = self.model.predict_emotion(message.normalized)
+            else:
+                message.emotion = self.emotion_batcher(message.normalized)
+        self.record_feedback(feedback_type, message, session)
+        return message.emotion
+
+    async def aanalyze_feedback(self, feedback_type, message, session):
+        # Same as analyze_feedback, but the batched prediction is awaited rather than waited for, so the event
+        # loop keeps serving (and adding to the batch) other chats while the batch runs
+        self.refresh_model()
+        if message.emotion is None:
+            if self.model.compiled is not None:
+                message.emotion = self.model.predict_emotion(message.normalized)
+            else:
+                message.emotion = await asyncio.wrap_future(self.emotion_batcher.submit(message.normalized))
+        self.record_feedback(feedback_type, message, session)
+        return message.emotion
+
+    def record_feedback(self, feedback_type, message, session):
+        self.sessions.add_feedback_data(session, {
             'type': feedback_type,
-            'content': preprocessed_prompt,
-            'analysis': feedback_analysis
+            'content': message.normalized,
+            'analysis': message.emotion
         })
 
-    def end_chat(self):
-        self.save_conversation()
-        # Create an instance of FeedbackAnalyzer
-        feedback_analyzer = FeedbackAnalyzer(self.feedback)
-        # Analyze the feedback
-        self.feedback_data = feedback_analyzer.analyze_feedback()
-
-    def save_conversation(self):
-        for message in self.conversation:
-            if message["role"] == "user":
-                self.feedback.append(message["content"])
-        self.conversation = []
+    def predict_emotions(self, texts):
+        # Same preprocessing as chat messages get before analyze_feedback
+        return self.model.predict_emotions(self.preprocessor.preprocess_batch(texts))
+
+    def end_chat(self, session_id=None):
+        session = self.sessions.pop(session_id or DEFAULT_SESSION_ID)
+        if session is None:
+            return
+        self.save_chat_history(session)
+        self.journal.append_event(session.session_id, 'end')
+        self.save_conversation(session)
+        self.flush_session(session)
+
+    def save_conversation(self, session):
+        # User messages are already in session.feedback (see add_user_message); adding them again here
+        # made every later analysis score them twice
+        self.sessions.clear_conversation(session)
+
+    # Hand a session's feedback to the analysis used by the reports, before the session is dropped; its
+    # emotion entries are only needed while the chat is live (end_chat used to overwrite them anyway)
+    def flush_session(self, session):
+        self.feedback.extend(session.feedback)
+        session.feedback = []
+        session.feedback_data = []
+        # Ingested (and so written to the feedback store) right away, even if no report is asked of this process
+        self.feedback_analyzer.update()
 
     def display_feedback_analysis(self):
-        if self.feedback_data:
+        self.feedback_analyzer.update()
+        if len(self.feedback_analyzer.columns):
             print("Feedback Analysis Report:")
             print(self.feedback_analyzer.interpret_feedback())
         else:
@@ -0,0 +1,99 @@
+import atexit
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+
+_STOP = object()
+
+
+class ChatJournal:
+    '''
+    Append-only JSON-lines journal of chat messages.
+    append() only enqueues the record; a background writer thread batches the writes, fsyncs
+    periodically, rotates the file once it reaches max_bytes and optionally gzips the rotated segments,
+    so the request thread never waits on file I/O.
+    '''
+    def __init__(self, path='chat_history.jsonl', batch_size=64, flush_interval=0.5, fsync_interval=5.0,
+                 max_bytes=10 * 1024 * 1024, compress=True):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.queue = queue.SimpleQueue()
+        self.written = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, name='chat-journal', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def append(self, session_id, role, content):
+        self.queue.put({'session': session_id, 'ts': time.time(), 'role': role, 'content': content})
+
+    def append_event(self, session_id, event, **fields):
+        self.queue.put(dict({'session': session_id, 'ts': time.time(), 'event': event}, **fields))
+
+    def close(self, timeout=5.0):
+        if self.thread.is_alive():
+            self.queue.put(_STOP)
+            self.thread.join(timeout)
+
+    def _run(self):
+        file = open(self.path, 'a', encoding='utf-8')
+        last_fsync = time.monotonic()
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                # Wait for the first record, then drain whatever else is already queued
+                record = self.queue.get(timeout=self.flush_interval)
+                while True:
+                    if record is _STOP:
+                        stopping = True
+                        break
+                    batch.append(record)
+                    if len(batch) >= self.batch_size:
+                        break
+                    record = self.queue.get_nowait()
+            except queue.Empty:
+                pass
+
+            try:
+                if batch:
+                    file.write(''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in batch))
+                    file.flush()
+                    self.written += len(batch)
+                now = time.monotonic()
+                if batch and (stopping or now - last_fsync >= self.fsync_interval):
+                    os.fsync(file.fileno())
+                    last_fsync = now
+                if file.tell() >= self.max_bytes:
+                    file = self._rotate(file)
+            except OSError as e:
+                self.dropped += len(batch)
+                print("Error writing chat journal:", e)
+        file.close()
+
+    def _rotate(self, file):
+        os.fsync(file.fileno())
+        file.close()
+        base, ext = os.path.splitext(self.path)
+        rotated = f"{base}.{time.strftime('%Y%m%d-%H%M%S')}{ext}"
+        suffix = 1
+        while os.path.exists(rotated) or os.path.exists(rotated + '.gz'):
+            rotated = f"{base}.{time.strftime('%Y%m%d-%H%M%S')}-{suffix}{ext}"
+            suffix += 1
+        os.replace(self.path, rotated)
+        if self.compress:
+            with open(rotated, 'rb') as source, gzip.open(rotated + '.gz', 'wb') as target:
+                shutil.copyfileobj(source, target)
+            os.remove(rotated)
+        return open(self.path, 'a', encoding='utf-8')
+
+    def stats(self):
+        return {'written': self.written, 'dropped': self.dropped, 'pending': self.queue.qsize()}
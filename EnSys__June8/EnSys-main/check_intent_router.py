@@ -0,0 +1,89 @@
+'''
+Replays every user message in chat_history.txt through the old keyword cascade of
+EnSysBot.generate_response and through the compiled IntentRouter, and reports any prompt
+the two route differently, plus the router's per-intent hit counts.
+Usage: python check_intent_router.py [chat_history.txt]
+'''
+import sys
+
+from preprocess import TextPreprocessor
+from intent_router import IntentRouter, default_intents, MENU_PRAISE_KEYWORDS, RESTAURANT_NAME_KEYWORDS, \
+    RESTAURANT_PROFILE_KEYWORDS, RECOMMENDATION_KEYWORDS
+
+MENU_CATEGORIES = ['dessert', 'drinks', 'main course', 'pasta', 'salad', 'sides']
+
+
+def legacy_route(preprocessed_prompt, compound, last_topic):
+    # The cascade exactly as it was written in generate_response / handle_feedback_query
+    if 'like' in preprocessed_prompt or 'dislike' in preprocessed_prompt or 'suggestions' in preprocessed_prompt:
+        if 'like' in preprocessed_prompt:
+            return ('feedback', 'like')
+        elif 'dislike' in preprocessed_prompt:
+            return ('feedback', 'dislike')
+        return ('feedback', 'suggestions')
+    if compound > 0.05 and 'no' not in preprocessed_prompt.lower():
+        return ('positive_sentiment', None)
+    elif compound < -0.05:
+        return ('negative_sentiment', None)
+    if any(keyword in preprocessed_prompt for keyword in MENU_PRAISE_KEYWORDS):
+        if compound > 0.05:
+            return ('menu_praise', next(k for k in MENU_PRAISE_KEYWORDS if k in preprocessed_prompt))
+    if any(keyword in preprocessed_prompt for keyword in RESTAURANT_NAME_KEYWORDS):
+        return ('restaurant_name', next(k for k in RESTAURANT_NAME_KEYWORDS if k in preprocessed_prompt))
+    if any(keyword in preprocessed_prompt for keyword in RESTAURANT_PROFILE_KEYWORDS):
+        return ('restaurant_profile', next(k for k in RESTAURANT_PROFILE_KEYWORDS if k in preprocessed_prompt))
+    if 'menu' in preprocessed_prompt:
+        if -0.05 <= compound <= 0.05:
+            return ('menu_overview', 'menu')
+    for category in MENU_CATEGORIES:
+        if category.lower() in preprocessed_prompt:
+            return ('menu_category', category)
+    if any(keyword in preprocessed_prompt for keyword in RECOMMENDATION_KEYWORDS):
+        return ('recommendation', next(k for k in RECOMMENDATION_KEYWORDS if k in preprocessed_prompt))
+    if preprocessed_prompt.isdigit() and last_topic:
+        return ('menu_selection', None)
+    if last_topic:
+        return ('follow_up', None)
+    return None
+
+
+def load_user_messages(path):
+    messages = []
+    seen = set()
+    with open(path, encoding='utf-8', errors='replace') as file:
+        for line in file:
+            if line.startswith('User: '):
+                message = line[len('User: '):].strip()
+                if message and message not in seen:
+                    seen.add(message)
+                    messages.append(message)
+    return messages
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else 'chat_history.txt'
+    preprocessor = TextPreprocessor()
+    router = IntentRouter(default_intents(MENU_CATEGORIES))
+
+    messages = load_user_messages(path)
+    mismatches = 0
+    for message in messages:
+        preprocessed_prompt = preprocessor.normalize(message)
+        compound = preprocessor.analyzer.polarity_scores(message)['compound']
+        # Check both with and without an active menu topic
+        for last_topic in (None, 'pasta'):
+            expected = legacy_route(preprocessed_prompt, compound, last_topic)
+            route = router.classify(preprocessed_prompt, compound, has_topic=bool(last_topic))
+            actual = tuple(route) if route else None
+            if expected != actual:
+                mismatches += 1
+                print(f"MISMATCH {message!r}: cascade={expected} router={actual}")
+
+    print(f"{len(messages)} unique prompts, {mismatches} mismatches")
+    for name, count in sorted(router.stats().items(), key=lambda item: -item[1]):
+        print(f"  {name:<20} {count}")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,38 @@
+from collections import namedtuple
+from keyword_automaton import KeywordAutomaton
+
+DishMatch = namedtuple('DishMatch', ['start', 'end', 'dish', 'alias'])
+
+class DishMatcher:
+    '''
+    Finds every dish mentioned in a (preprocessed) prompt in one pass.
+    The automaton is compiled from the dish names of a MenuIndex plus their aliases and is
+    only rebuilt when the bot is given a different MenuIndex.
+    '''
+    def __init__(self, menu_index, alias_fn=None):
+        self.menu_index = menu_index
+        patterns = []
+        for dish in menu_index.dishes:
+            name = dish['name'].lower()
+            patterns.append((name, dish))
+            # Aliases let the preprocessed prompt match, e.g. "spaghetti cheese sauce" for "Spaghetti with Cheese Sauce"
+            if alias_fn is not None:
+                alias = alias_fn(dish['name'])
+                if alias and alias != name:
+                    patterns.append((alias, dish))
+        self.automaton = KeywordAutomaton(patterns)
+
+    def find_all(self, text):
+        matches = []
+        for start, end, keyword_id in self.automaton.longest_matches(text.lower()):
+            # A keyword shared by several dishes resolves to the first one on the menu
+            dish = self.automaton.values[keyword_id][0]
+            matches.append(DishMatch(start, end, dish, self.automaton.keywords[keyword_id]))
+        return matches
+
+    def find(self, text):
+        matches = self.find_all(text)
+        return matches[0].dish if matches else None
+
+    def is_stale(self, menu_index):
+        return menu_index is not self.menu_index
@@ -1,43 +1,53 @@
 '''
-This script sends a GET request to the Evaluation Endpoint of the Flask API to evaluate the model with different hyperparameters.
-The hyperparameters are specified as a dictionary and converted to a string for the GET request.
-The response from the API is parsed as JSON to extract the evaluation results.
-The evaluation results include accuracy, precision, recall, and F1-score metrics.
+This script sends a GET request to the Evaluation Endpoint of the Flask API to run a cross-validated hyperparameter sweep.
+The parameter grid is specified as a dictionary and sent as JSON in the GET request, together with the number of folds.
+The sweep runs as a background job: the script polls the job's status URL until it finishes, then prints its results.
+The results include the mean accuracy, precision, recall, F1-score and fit time of every configuration, best first.
 '''
+import json
+import time
 import requests
-import pandas as pd
 
 # URL of the Evaluation Endpoint
-evaluation_url = 'http://127.0.0.1:5000/evaluate_model'
+base_url = 'http://127.0.0.1:5000'
+evaluation_url = base_url + '/evaluate_model'
 
-# Load the training data
-train_data = pd.read_csv('annotated_empatheticdialogues.csv')
-
-# Hyperparameters for the model
+# Hyperparameters for the model: "alpha" is regularization strength (C = 1 / alpha); names starting
+# with "vectorizer__" set TfidfVectorizer options, e.g. "vectorizer__ngram_range": [[1, 1], [1, 2]]
 hyperparameters = {'alpha': [0.1, 0.5, 1.0, 1.5, 2.0]}
 
-# Convert hyperparameters to a string for GET request
-hyperparameters_str = str(hyperparameters)
+# Number of cross-validation folds
+folds = 5
+
+# Make a GET request to the Evaluation Endpoint with hyperparameters; it queues the sweep as a background job
+response = requests.get(evaluation_url, params={'hyperparameters': json.dumps(hyperparameters), 'folds': folds})
+
+# Check if the job was accepted (status code 202)
+if response.status_code == 202:
+    job_url = base_url + response.json()['status_url']
+    print("Queued evaluation job:", response.json()['job_id'])
 
-# Make a GET request to the Evaluation Endpoint with hyperparameters
-response = requests.get(evaluation_url, params={'hyperparameters': hyperparameters_str})
+    # Poll the job until it finishes, printing progress and new log lines as they come in
+    last_log = 0
+    while True:
+        job = requests.get(job_url).json()
+        for line in requests.get(job_url + '/logs', params={'since': last_log}).json()['logs']:
+            print("  log:", line['message'])
+            last_log = line['seq']
+        print(f"  {job['state']}: {job['progress'] * 100:.0f}%")
+        if job['state'] not in ('queued', 'running'):
+            break
+        time.sleep(2)
 
-# Check if the request was successful (status code 200)
-if response.status_code == 200:
-    try:
-        # Print the entire response content
-        print("Response Content:", response.content)
-        
-        # Parse the JSON response
-        evaluation_results = response.json()
-        if 'error' in evaluation_results:
-            print("Error:", evaluation_results['error'])
-        else:
-            # Print the evaluation results
-            print("Evaluation Results:")
-            print(evaluation_results)
-    except ValueError:
-        print("Error: Invalid JSON format in response.")
+    if job['state'] != 'succeeded':
+        print("Error:", job['error'] or job['state'])
+    else:
+        # Print the evaluation results, one line per configuration
+        results = job['result']
+        print(f"Evaluation Results ({results['folds']} folds, {results['workers']} workers, {results['wall_time']:.1f} s):")
+        for config in results['configs']:
+            print(f"{json.dumps(config['params'])}: accuracy {config['Accuracy']:.3f}, precision {config['Precision']:.3f}, "
+                  f"recall {config['Recall']:.3f}, F1 {config['F1']:.3f}, fit time {config['fit_time']:.2f} s")
 else:
     # Print the error message if request was not successful
     print("Error:", response.text)
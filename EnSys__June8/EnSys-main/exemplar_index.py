@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+MODES = ('exact', 'pruned')
+
+
+class ExemplarIndex:
+    '''
+    Top-k nearest exemplars by TF-IDF cosine similarity.
+    Rows are L2-normalized once at build time, so a query is one sparse dot product against the
+    term-major (transposed) matrix and only touches the rows that share a term with it. In 'pruned'
+    mode each term only keeps its postings_limit highest-weighted rows, so a query costs at most
+    postings_limit rows per term however large the corpus; the rows found are then rescored exactly.
+    Common words, which have the longest postings and the lowest weights, lose the most.
+    '''
+    def __init__(self, vectorizer, matrix, responses, mode='exact', postings_limit=200, fingerprint=None,
+                 columns=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown exemplar index mode: {mode}")
+        self.vectorizer = vectorizer
+        self.matrix = matrix
+        self.responses = list(responses)
+        self.mode = mode
+        self.postings_limit = postings_limit
+        self.fingerprint = fingerprint
+        self.columns = columns
+        if columns is None:
+            self.columns = matrix.T.tocsr()
+            if mode == 'pruned':
+                self.columns = self.prune(self.columns, postings_limit)
+
+    @classmethod
+    def build(cls, texts, responses, mode='exact', postings_limit=200):
+        vectorizer = TfidfVectorizer(stop_words='english')
+        matrix = normalize(vectorizer.fit_transform(texts).tocsr(), norm='l2', copy=False)
+        matrix.data = matrix.data.astype(np.float32)
+        return cls(vectorizer, matrix, responses, mode, postings_limit,
+                   fingerprint=cls.corpus_fingerprint(texts, responses))
+
+    @staticmethod
+    def corpus_fingerprint(texts, responses):
+        digest = hashlib.sha1()
+        for text, response in zip(texts, responses):
+            digest.update(text.encode('utf-8'))
+            digest.update(b'\0')
+            digest.update(response.encode('utf-8'))
+            digest.update(b'\1')
+        return digest.hexdigest()
+
+    @staticmethod
+    def prune(columns, limit):
+        # Order every term's postings by weight (highest first) and keep the first `limit` of each
+        terms = np.repeat(np.arange(columns.shape[0]), np.diff(columns.indptr))
+        order = np.lexsort((-columns.data, terms))
+        rank = np.arange(len(order)) - columns.indptr[terms[order]]
+        keep = order[rank < limit]
+        keep.sort()
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(terms[keep], minlength=columns.shape[0]))])
+        return sparse.csr_matrix((columns.data[keep], columns.indices[keep], indptr), shape=columns.shape)
+
+    def __len__(self):
+        return len(self.responses)
+
+    def transform(self, texts):
+        return normalize(self.vectorizer.transform(texts), norm='l2', copy=False)
+
+    def query(self, text, k=5, min_similarity=0.0):
+        # [(response, score, row)] best first
+        return self.query_vector(self.transform([text]), k, min_similarity)
+
+    def query_vector(self, vector, k=5, min_similarity=0.0):
+        if not len(self.responses) or not vector.nnz:
+            return []
+        result = (vector @ self.columns).tocsr()
+        rows, scores = result.indices, result.data
+        if self.mode == 'pruned' and len(rows):
+            # Pruned postings only give partial sums; rescore the rows they found against the full rows
+            scores = np.asarray((self.matrix[rows] @ vector.T).todense()).ravel()
+        return self.top_k(rows, scores, k, min_similarity)
+
+    def top_k(self, rows, scores, k, min_similarity):
+        keep = scores >= min_similarity if min_similarity > 0 else scores > 0
+        rows, scores = rows[keep], scores[keep]
+        if len(scores) > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[best], scores[best]
+        order = np.argsort(-scores, kind='stable')
+        return [(self.responses[rows[i]], float(scores[i]), int(rows[i])) for i in order]
+
+    def save(self, path):
+        # A directory: both matrices as .npz, idf.npy and meta.json (vocabulary, responses, settings)
+        os.makedirs(path, exist_ok=True)
+        sparse.save_npz(os.path.join(path, 'matrix.npz'), self.matrix, compressed=False)
+        sparse.save_npz(os.path.join(path, 'columns.npz'), self.columns, compressed=False)
+        np.save(os.path.join(path, 'idf.npy'), self.vectorizer.idf_)
+        meta = {
+            'mode': self.mode,
+            'postings_limit': self.postings_limit,
+            'fingerprint': self.fingerprint,
+            'vocabulary': {term: int(column) for term, column in self.vectorizer.vocabulary_.items()},
+            'responses': self.responses,
+        }
+        # meta.json is written last, so a reader never sees it next to missing arrays
+        temp_path = os.path.join(path, 'meta.json.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(meta, file)
+        os.replace(temp_path, os.path.join(path, 'meta.json'))
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as file:
+            meta = json.load(file)
+        vectorizer = TfidfVectorizer(stop_words='english', vocabulary=meta['vocabulary'])
+        vectorizer.idf_ = np.load(os.path.join(path, 'idf.npy'))
+        matrix = sparse.load_npz(os.path.join(path, 'matrix.npz')).tocsr()
+        # The saved term-major matrix is used as is, instead of transposing (and pruning) again
+        columns = sparse.load_npz(os.path.join(path, 'columns.npz')).tocsr()
+        return cls(vectorizer, matrix, meta['responses'], meta['mode'], meta['postings_limit'],
+                   fingerprint=meta['fingerprint'], columns=columns)
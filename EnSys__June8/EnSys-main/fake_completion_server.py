@@ -0,0 +1,118 @@
+'''
+Local stand-in for the OpenAI chat completion API, for trying the chat paths without a key or network.
+It answers POST /v1/chat/completions in the same JSON format as the real API, and as server-sent
+events when the request sets "stream": true, with a configurable delay before and between tokens.
+Usage:
+    python fake_completion_server.py --port 8001 --first-token-delay 0.5 --token-delay 0.05
+    OPENAI_API_BASE=http://127.0.0.1:8001/v1 python main.py
+'''
+import argparse
+import json
+import socket
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_reply(messages):
+    # Canned answer that echoes the last user message, so responses are easy to tell apart
+    last_user = next((m['content'] for m in reversed(messages) if m.get('role') == 'user'), '')
+    return f"Thank you for your message about \"{last_user}\". EnSys is happy to help you with that!"
+
+
+class CompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    first_token_delay = 0.0
+    token_delay = 0.0
+
+    def setup(self):
+        super().setup()
+        # Headers and body are separate writes; don't let Nagle delay the second one on keep-alive connections
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self.send_error(404)
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        reply = make_reply(body.get('messages', []))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        model = body.get('model', 'fake-model')
+
+        time.sleep(self.first_token_delay)
+        if body.get('stream'):
+            self.stream_reply(completion_id, model, reply)
+        else:
+            time.sleep(self.token_delay * len(reply.split()))
+            self.send_json({
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': reply}, 'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': len(reply.split()), 'total_tokens': len(reply.split())},
+            })
+
+    def stream_reply(self, completion_id, model, reply):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        words = reply.split(' ')
+        for index, word in enumerate(words):
+            delta = {'content': word if index == 0 else ' ' + word}
+            if index == 0:
+                delta['role'] = 'assistant'
+            self.send_event(completion_id, model, delta, None)
+            time.sleep(self.token_delay)
+        self.send_event(completion_id, model, {}, 'stop')
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def send_event(self, completion_id, model, delta, finish_reason):
+        chunk = {
+            'id': completion_id,
+            'object': 'chat.completion.chunk',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+        }
+        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+    def send_json(self, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host='127.0.0.1', port=8001, first_token_delay=0.0, token_delay=0.0):
+    handler = type('ConfiguredCompletionHandler', (CompletionHandler,), {
+        'first_token_delay': first_token_delay,
+        'token_delay': token_delay,
+    })
+    server_class = type('CompletionServer', (ThreadingHTTPServer,), {'request_queue_size': 256, 'daemon_threads': True})
+    return server_class((host, port), handler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for the chat completion API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--first-token-delay', type=float, default=0.5)
+    parser.add_argument('--token-delay', type=float, default=0.05)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.first_token_delay, args.token_delay)
+    print(f"Fake completion server on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
@@ -0,0 +1,58 @@
+import os
+
+from exemplar_index import ExemplarIndex
+
+
+class FallbackResponder:
+    '''
+    Local answers for when the completion API is too slow or failing.
+    Replies with the closest exemplar from the empathetic dialogues corpus and the menu descriptions,
+    using EmotionModel.retrieve_exemplar (TF-IDF cosine similarity), or default_response when nothing
+    is at least min_similarity close. With index_path set, the built index is saved there and reused
+    on the next start as long as the corpus and menu are unchanged.
+    '''
+    def __init__(self, model, dialogues_path='annotated_empatheticdialogues.csv', min_similarity=0.2,
+                 default_response="I'm sorry, but I couldn't process your request at the moment.",
+                 index_path=None, index_mode='exact'):
+        self.model = model
+        self.dialogues_path = dialogues_path
+        self.index_path = index_path
+        self.index_mode = index_mode
+        self.min_similarity = min_similarity
+        self.default_response = default_response
+        self.dialogue_exemplars = None
+        self.size = 0
+
+    def build(self, menu_index, dish_formatter):
+        # The dialogue corpus is read once; the menu part is rebuilt whenever the menu changes
+        if self.dialogue_exemplars is None:
+            self.dialogue_exemplars = self.model.load_exemplars(self.dialogues_path)
+        texts, responses = list(self.dialogue_exemplars[0]), list(self.dialogue_exemplars[1])
+        for dish in menu_index.dishes:
+            texts.append(f"{dish['name']} {dish['category']} {dish['description']}")
+            responses.append(dish_formatter(dish))
+        self.size = len(texts)
+        if not texts:
+            return
+        if self.load_saved_index(ExemplarIndex.corpus_fingerprint(texts, responses)):
+            return
+        self.model.build_exemplar_index(texts, responses, mode=self.index_mode)
+        if self.index_path:
+            self.model.save_exemplar_index(self.index_path)
+
+    def load_saved_index(self, fingerprint):
+        if not self.index_path or not os.path.exists(os.path.join(self.index_path, 'meta.json')):
+            return False
+        try:
+            index = ExemplarIndex.load(self.index_path)
+        except (OSError, ValueError, KeyError) as e:
+            print("Error loading exemplar index:", e)
+            return False
+        if index.fingerprint != fingerprint or index.mode != self.index_mode:
+            return False
+        self.model.exemplar_index = index
+        return True
+
+    def respond(self, prompt):
+        response = self.model.retrieve_exemplar(prompt, self.min_similarity)
+        return response if response is not None else self.default_response
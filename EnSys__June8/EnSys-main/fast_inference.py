@@ -0,0 +1,111 @@
+import math
+
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.utils import murmurhash3_32
+
+
+class CompiledEmotionModel:
+    '''
+    Single-message inference for a fitted (vectorizer, linear classifier) pair without sklearn's
+    per-call validation and sparse matrix construction.
+    Tokens map straight to a weight column and their IDF, so one prediction is the analyzer, a dict
+    lookup per token and one small dense product over the message's columns. Works for TfidfVectorizer
+    and HashingVectorizer features with LogisticRegression (softmax) or SGDClassifier (one-vs-rest).
+    '''
+    def __init__(self, vectorizer, classifier):
+        self.analyzer = vectorizer.build_analyzer()
+        self.classes = classifier.classes_
+        self.coef = np.asarray(classifier.coef_)
+        self.intercept = np.asarray(classifier.intercept_, dtype=np.float64)
+        self.binary = getattr(vectorizer, 'binary', False)
+        self.sublinear_tf = getattr(vectorizer, 'sublinear_tf', False)
+        self.norm = vectorizer.norm
+        self.one_vs_rest = isinstance(classifier, SGDClassifier)
+
+        if isinstance(vectorizer, HashingVectorizer):
+            self.columns = None
+            self.n_features = vectorizer.n_features
+            self.alternate_sign = vectorizer.alternate_sign
+            self.idf = None
+        else:
+            # token -> column; the IDF is looked up by column (None when use_idf is off)
+            self.columns = vectorizer.vocabulary_
+            self.idf = np.asarray(vectorizer.idf_, dtype=np.float64).tolist() if vectorizer.use_idf else None
+
+    def features(self, text):
+        # (columns, values) of the message's non-zero features, as the vectorizer would produce them
+        counts = {}
+        if self.columns is not None:
+            columns = self.columns
+            for token in self.analyzer(text):
+                column = columns.get(token)
+                if column is not None:
+                    counts[column] = counts.get(column, 0) + 1
+        else:
+            for token in self.analyzer(text):
+                hashed = murmurhash3_32(token, seed=0)
+                column = abs(hashed) % self.n_features
+                sign = -1 if self.alternate_sign and hashed < 0 else 1
+                counts[column] = counts.get(column, 0) + sign
+            counts = {column: value for column, value in counts.items() if value != 0}
+
+        columns = list(counts)
+        values = [float(value) for value in counts.values()]
+        if self.binary:
+            values = [1.0] * len(values)
+        if self.sublinear_tf:
+            values = [1.0 + math.log(value) for value in values]
+        if self.idf is not None:
+            idf = self.idf
+            values = [value * idf[column] for column, value in zip(columns, values)]
+        if self.norm == 'l2':
+            length = math.sqrt(sum(value * value for value in values))
+        elif self.norm == 'l1':
+            length = sum(abs(value) for value in values)
+        else:
+            length = 0.0
+        if length:
+            values = [value / length for value in values]
+        return columns, values
+
+    def decision(self, text):
+        columns, values = self.features(text)
+        if not columns:
+            return self.intercept.copy()
+        return self.coef[:, columns] @ np.array(values) + self.intercept
+
+    def predict(self, text):
+        scores = self.decision(text)
+        if len(self.classes) == 2 and len(scores) == 1:
+            return self.classes[int(scores[0] > 0)]
+        return self.classes[int(np.argmax(scores))]
+
+    def predict_matrix(self, matrix):
+        # Labels for the rows of an already vectorized batch. Only the weight columns the batch uses are
+        # gathered: sklearn's predict copies the whole transposed coef_, which dominates for hashed features
+        used = np.unique(matrix.indices)
+        scores = matrix[:, used] @ self.coef[:, used].T + self.intercept
+        if scores.shape[1] == 1:
+            return self.classes[(scores[:, 0] > 0).astype(int)]
+        return self.classes[scores.argmax(axis=1)]
+
+    def predict_proba(self, text):
+        # (label, {class: probability}), calibrated the same way as the classifier's predict_proba
+        scores = self.decision(text)
+        if len(scores) == 1:
+            positive = 1.0 / (1.0 + math.exp(-scores[0]))
+            probabilities = np.array([1.0 - positive, positive])
+        elif self.one_vs_rest:
+            probabilities = 1.0 / (1.0 + np.exp(-scores))
+            probabilities /= probabilities.sum()
+        else:
+            exponents = np.exp(scores - scores.max())
+            probabilities = exponents / exponents.sum()
+        label = self.classes[int(np.argmax(probabilities))]
+        return label, dict(zip(self.classes.tolist(), probabilities.tolist()))
+
+    def verify(self, texts, expected):
+        # Indices of the texts whose compiled prediction differs from the expected (sklearn) one
+        return [i for i, (text, label) in enumerate(zip(texts, expected)) if self.predict(text) != label]
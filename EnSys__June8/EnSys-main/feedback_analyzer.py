@@ -1,68 +1,121 @@
 from nltk.sentiment import SentimentIntensityAnalyzer
-import re
+import math
+import threading
+import time
+from annotation import AnnotatedMessage, split_statements
+from feedback_columns import FeedbackColumns, FeedbackRows, KINDS
+from taxonomy import Taxonomy
 
 class FeedbackAnalyzer:
-    def __init__(self, conversation):
+    '''
+    Feedback report over a growing list of customer messages (AnnotatedMessage records, whose statement
+    scores are reused, or plain strings). Messages are ingested once, in order: each new statement is
+    deduplicated by its hash and stored with its category and kind in a columnar FeedbackColumns store,
+    so the categorized feedback and the counts behind the percentages are always current. A report then
+    costs time proportional to its own size, not to the history. The list may only be appended to.
+    Only the compound score of each statement's sentiment is kept. With keep_messages=False the ingested
+    messages are removed from the front of the list, so a message is released once its statements are
+    in the columns (and the store), and the list only holds what has not been ingested yet.
+    Categories, keywords and suggestion cues come from a Taxonomy (taxonomy.json by default), and each
+    batch of new statements is categorized at once. By default a statement gets the single label it always
+    did; with multi_label it is filed under every category it names.
+    With a FeedbackStore, each statement is also written to it with its labels, repeats included, and
+    stored_report() reads a date range of everything stored there, including feedback from before the last
+    restart; a statement counts once in a range, however often it was repeated there.
+    '''
+    def __init__(self, conversation, taxonomy=None, multi_label=False, store=None, keep_messages=True):
         self.conversation = conversation
-        self.analyzer = SentimentIntensityAnalyzer()
+        self.keep_messages = keep_messages
+        self.store = store
+        self.taxonomy = taxonomy or Taxonomy.load()
+        self.multi_label = multi_label
+        self.category_kinds = self.taxonomy.category_kinds(multi_label)
+        self.analyzer = None
+        self.lock = threading.RLock()
+        self.ingested = 0       # messages ingested so far
+        self.released = 0       # ingested messages removed from the front of self.conversation
+        self.version = 0        # bumped whenever a new statement is added
+        self.columns = FeedbackColumns(self.taxonomy.categories)
 
     def split_statements(self, message):
         # Split based on punctuation that usually denotes the end of a statement.
-        statements = re.split(r'[.!?]', message)
-        return [statement.strip() for statement in statements if statement.strip()]
+        return split_statements(message)
+
+    def scored_statements(self, message):
+        if isinstance(message, AnnotatedMessage):
+            return zip(message.statements, message.statement_sentiments)
+        # The VADER lexicon is only loaded when there are plain strings to score
+        if self.analyzer is None:
+            self.analyzer = SentimentIntensityAnalyzer()
+        return ((statement, self.analyzer.polarity_scores(statement)) for statement in self.split_statements(message))
+
+    # Ingest the messages appended since the last call
+    def update(self):
+        with self.lock:
+            end = len(self.conversation)
+            statements, compounds, sources = [], [], []
+            for position in range(self.ingested - self.released, end):
+                message = self.conversation[position]
+                index = self.released + position
+                timestamp = getattr(message, 'created', None) or time.time()
+                for statement, sentiment in self.scored_statements(message):
+                    statements.append(statement)
+                    compounds.append(sentiment['compound'])
+                    sources.append((index, timestamp))
+            labels = self.labels(statements, compounds)
+            for statement, compound, (index, timestamp), statement_labels in zip(statements, compounds, sources, labels):
+                category, kind = statement_labels[0] if statement_labels else (-1, -1)
+                if self.columns.add(statement, compound, category, kind, timestamp, index, statement_labels[1:]) is not None:
+                    self.version += 1
+                # Repeats go to the store too, which keeps the time of each one for its date ranges
+                if self.store is not None:
+                    self.store.add(statement, compound, [(self.taxonomy.categories[category], KINDS[kind])
+                                                         for category, kind in statement_labels], timestamp)
+            self.ingested = self.released + end
+            if not self.keep_messages:
+                # Messages appended meanwhile are past end and stay for the next update
+                del self.conversation[:end]
+                self.released = self.ingested
+
+    def labels(self, statements, compounds):
+        # (category, kind) code pairs of each statement, categorized as one batch; empty for unlabelled ones
+        if not self.multi_label:
+            category, kind = self.taxonomy.categorize(statements, compounds)
+            return [((category, kind),) if category >= 0 else () for category, kind in zip(category.tolist(), kind.tolist())]
+        labels = [[] for _ in statements]
+        rows, category, kind = self.taxonomy.categorize(statements, compounds, multi_label=True)
+        for row, label in zip(rows.tolist(), zip(category.tolist(), kind.tolist())):
+            labels[row].append(label)
+        return labels
+
+    def classify(self, statement, compound):
+        # Single-label (category, kind) of one statement, or None if it names no category or is neutral
+        return self.taxonomy.classify(statement, compound)
 
     def analyze_feedback(self):
-        detailed_feedback = []
-        unique_messages = set()  # To store unique messages
-        for message in self.conversation:
-            statements = self.split_statements(message)
-            for statement in statements:
-                sentiment = self.analyzer.polarity_scores(statement)
-                if statement not in unique_messages:  # Check if message is unique
-                    unique_messages.add(statement)
-                    detailed_feedback.append({
-                        'message': statement,
-                        'sentiment': sentiment
-                    })
-        return detailed_feedback
-
-    def categorize_feedback(self, feedback_data):
-        categories = {
-            'food_quality': {'compliments': [], 'complaints': []},
-            'service_quality': {'compliments': [], 'complaints': []},
-            'ambiance': {'compliments': [], 'complaints': []},
-            'cleanliness': {'compliments': [], 'complaints': [], 'suggestions': []},  # Add 'suggestions' category
-            'affordability': {'compliments': [], 'complaints': []},
-        }
-
-        suggestion_keywords = ['should', 'could', 'recommend', 'suggest', 'it would be better if']
-
-        for feedback in feedback_data:
-            message = feedback['message'].lower()
-            sentiment = feedback['sentiment']
-            if any(word in message for word in suggestion_keywords):
-                categories['cleanliness']['suggestions'].append(feedback)  # Assign suggestions to cleanliness category
-            else:
-                if any(word in message for word in ['food', 'dish', 'meal', 'dessert']):
-                    category = 'food_quality'
-                elif any(word in message for word in ['service', 'waiter', 'staff', 'manager']):
-                    category = 'service_quality'
-                elif any(word in message for word in ['ambiance', 'atmosphere', 'environment', 'noise']):
-                    category = 'ambiance'
-                elif any(word in message for word in ['cleanliness', 'restroom', 'clean', 'hygiene']):
-                    category = 'cleanliness'
-                elif any(word in message for word in ['price', 'cost', 'expensive', 'affordable']):
-                    category = 'affordability'
-                else:
-                    continue
-
-                if sentiment['compound'] >= 0.05:
-                    if feedback not in categories[category]['compliments']:
-                        categories[category]['compliments'].append(feedback)
-                elif sentiment['compound'] <= -0.05:
-                    if feedback not in categories[category]['complaints']:
-                        categories[category]['complaints'].append(feedback)
-
+        # Unique statements with their sentiment, oldest first
+        self.update()
+        with self.lock:
+            return [self.columns.feedback(row) for row in range(len(self.columns))]
+
+    def categorize_feedback(self, feedback_data=None):
+        # Without feedback_data: the running categorization of everything ingested, as FeedbackRows sequences
+        if feedback_data is None:
+            self.update()
+            with self.lock:
+                return {category: {kind: self.columns.select(index, KINDS.index(kind)) for kind in kinds}
+                        for index, (category, kinds) in enumerate(self.category_kinds.items())}
+        feedback_data = list(feedback_data)
+        categories = {category: {kind: [] for kind in kinds} for category, kinds in self.category_kinds.items()}
+        seen = {category: {kind: set() for kind in kinds} for category, kinds in self.category_kinds.items()}
+        labels = self.labels([feedback['message'] for feedback in feedback_data],
+                             [feedback['sentiment']['compound'] for feedback in feedback_data])
+        for feedback, statement_labels in zip(feedback_data, labels):
+            for category, kind in statement_labels:
+                category, kind = self.taxonomy.categories[category], KINDS[kind]
+                if feedback['message'] not in seen[category][kind]:
+                    seen[category][kind].add(feedback['message'])
+                    categories[category][kind].append(feedback)
         return categories
 
     def calculate_percentages(self, categorized_feedback):
@@ -81,44 +134,82 @@ class FeedbackAnalyzer:
 
         return percentages
 
+    @staticmethod
+    def unique_messages(feedbacks):
+        # Statements of a FeedbackRows sequence are unique already, and are read one at a time
+        if isinstance(feedbacks, FeedbackRows):
+            return feedbacks.messages()
+        return dict.fromkeys(feedback['message'] for feedback in feedbacks)  # Unique, in order
+
     def generate_essay_summary(self, categorized_feedback, category_percentages):
-        summary = "Based on the feedback received, customers had varied experiences at the restaurant.\n"
+        return ''.join(self.iter_essay_summary(categorized_feedback, category_percentages))
+
+    # The summary in short chunks, so a streamed report never holds all of it
+    def iter_essay_summary(self, categorized_feedback, category_percentages):
+        yield "Based on the feedback received, customers had varied experiences at the restaurant.\n"
 
         for category, feedbacks in categorized_feedback.items():
             if isinstance(feedbacks, dict):
-                compliments_set = set()  # Set to store unique compliments
-                complaints_set = set()   # Set to store unique complaints
-
                 if feedbacks['compliments']:
-                    summary += f"{category.replace('_', ' ').capitalize()} received several compliments ({category_percentages[category]:.2f}% of total feedback). "
-                    for feedback in feedbacks['compliments']:
-                        compliments_set.add(feedback['message'])  # Add to set to remove duplicates
-                    for compliment in compliments_set:  # Iterate over unique compliments
-                        summary += f"One customer mentioned, '{compliment}' "
-                    summary += "\n\n"
+                    yield f"{category.replace('_', ' ').capitalize()} received several compliments ({category_percentages[category]:.2f}% of total feedback). "
+                    for compliment in self.unique_messages(feedbacks['compliments']):
+                        yield f"One customer mentioned, '{compliment}' "
+                    yield "\n\n"
                 if feedbacks['complaints']:
-                    summary += f"{category.replace('_', ' ').capitalize()} received some complaints ({category_percentages[category]:.2f}% of total feedback). "
-                    for feedback in feedbacks['complaints']:
-                        complaints_set.add(feedback['message'])  # Add to set to remove duplicates
-                    for complaint in complaints_set:  # Iterate over unique complaints
-                        summary += f"One customer mentioned, '{complaint}' "
-                    summary += "\n\n"
+                    yield f"{category.replace('_', ' ').capitalize()} received some complaints ({category_percentages[category]:.2f}% of total feedback). "
+                    for complaint in self.unique_messages(feedbacks['complaints']):
+                        yield f"One customer mentioned, '{complaint}' "
+                    yield "\n\n"
             else:
                 if feedbacks:
-                    suggestions_set = set()  # Set to store unique suggestions
-                    summary += f"{category.replace('_', ' ').capitalize()} were mentioned in suggestions ({category_percentages[category]:.2f}% of total feedback). "
-                    for feedback in feedbacks:
-                        suggestions_set.add(feedback['message'])  # Add to set to remove duplicates
-                    for suggestion in suggestions_set:  # Iterate over unique suggestions
-                        summary += f"One suggestion was, '{suggestion}' "
-                    summary += "\n\n"
-
-        summary += "\n\nTo enhance customer satisfaction and loyalty, addressing the highlighted concerns and maintaining the positive aspects will be crucial."
-        return summary
+                    yield f"{category.replace('_', ' ').capitalize()} were mentioned in suggestions ({category_percentages[category]:.2f}% of total feedback). "
+                    for suggestion in self.unique_messages(feedbacks):
+                        yield f"One suggestion was, '{suggestion}' "
+                    yield "\n\n"
+
+        yield "\n\nTo enhance customer satisfaction and loyalty, addressing the highlighted concerns and maintaining the positive aspects will be crucial."
+
+    # Compliment and complaint counts and the compliment share per category
+    def category_ratios(self):
+        self.update()
+        with self.lock:
+            return self.columns.ratios()
+
+    # Sentiment per hour or day; start and end are epoch seconds
+    def sentiment_trend(self, period='hour', start=None, end=None):
+        self.update()
+        with self.lock:
+            return self.columns.trend(period, start, end)
+
+    def stored_report(self, start=None, end=None, page=1, per_page=20):
+        # One page of the stored feedback with start <= time < end (epoch seconds): up to per_page of the newest
+        # statements of each category and kind, the statement counts, the number of pages, and a summary with
+        # the category percentages of the whole range
+        self.update()
+        self.store.flush()
+        counts = self.store.counts(start, end)
+        categorized_feedback = {category: {kind: self.store.page(category, kind, start, end, per_page, (page - 1) * per_page)
+                                           for kind in kinds}
+                                for category, kinds in self.category_kinds.items()}
+        judged = {category: sum(counts.get(category, {}).get(kind, 0) for kind in ('compliments', 'complaints'))
+                  for category in self.category_kinds}
+        total = sum(judged.values())
+        category_percentages = {category: judged[category] / total * 100 if total else 0 for category in judged}
+        largest = max((counts.get(category, {}).get(kind, 0) for category, kinds in self.category_kinds.items()
+                       for kind in kinds), default=0)
+        pages = max(math.ceil(largest / per_page), 1)
+        return categorized_feedback, self.generate_essay_summary(categorized_feedback, category_percentages), counts, pages
+
+    def interpret_feedback_chunks(self):
+        # interpret_feedback() with the summary as a generator of chunks, for streaming the report
+        with self.lock:
+            categorized_feedback = self.categorize_feedback()
+            category_percentages = self.columns.category_percentages()
+        return categorized_feedback, self.iter_essay_summary(categorized_feedback, category_percentages)
 
     def interpret_feedback(self):
-        feedback_data = self.analyze_feedback()
-        categorized_feedback = self.categorize_feedback(feedback_data)
-        category_percentages = self.calculate_percentages(categorized_feedback)
-        summary = self.generate_essay_summary(categorized_feedback, category_percentages)
-        return categorized_feedback, summary
+        with self.lock:
+            categorized_feedback = self.categorize_feedback()
+            category_percentages = self.columns.category_percentages()
+            summary = self.generate_essay_summary(categorized_feedback, category_percentages)
+        return categorized_feedback, summary
\ No newline at end of file
@@ -0,0 +1,162 @@
+import time
+from array import array
+
+import numpy as np
+
+# Categories of the default taxonomy.json; a FeedbackColumns store takes its analyzer's taxonomy categories
+CATEGORIES = ('food_quality', 'service_quality', 'ambiance', 'cleanliness', 'affordability')
+KINDS = ('compliments', 'complaints', 'suggestions')
+COMPLIMENT, COMPLAINT, SUGGESTION = range(len(KINDS))
+PERIODS = {'hour': 3600, 'day': 86400}
+# Hashes of new statements are merged into the sorted hash array once this many have accumulated
+HASH_MERGE_SIZE = 65536
+
+
+class FeedbackRows:
+    '''
+    Read-only sequence of {'message', 'sentiment'} dicts for some rows of a FeedbackColumns store.
+    The dicts are built as they are read, so a report doesn't keep a copy of every statement.
+    '''
+    def __init__(self, columns, rows):
+        self.columns = columns
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        return self.columns.feedback(self.rows[index])
+
+    def __iter__(self):
+        return (self.columns.feedback(row) for row in self.rows)
+
+    def messages(self):
+        return (self.columns.statement(row) for row in self.rows)
+
+
+class FeedbackColumns:
+    '''
+    Unique feedback statements stored column-wise in growable typed arrays: source message index,
+    float32 compound score, int8 category, kind and polarity codes, and uint32 timestamps (seconds).
+    The row number is the statement id. Statement texts are interned separately as UTF-8 in one buffer
+    with offsets, and deduplicated by their 64-bit hash (kept in a sorted array, plus a set of the most
+    recent ones), so the store costs a few dozen bytes per statement on top of the text. Aggregates run as NumPy reductions over zero-copy views of the columns.
+    Rows are also listed per (category, kind), so a category's statements are found without a scan; with a
+    multi-label taxonomy a row is listed under each of its labels, the first of which fills its columns.
+    Not thread safe: FeedbackAnalyzer serializes access.
+    '''
+    def __init__(self, categories=CATEGORIES):
+        self.categories = tuple(categories)
+        self.message = array('i')
+        self.compound = array('f')
+        self.category = array('b')     # index into self.categories, -1 when no category matched
+        self.kind = array('b')         # index into KINDS, -1 for neutral or uncategorized statements
+        self.polarity = array('b')     # 1 positive (compound >= 0.05), -1 negative (<= -0.05), 0 neutral
+        self.timestamp = array('I')
+        self.text = bytearray()
+        self.offsets = array('Q', [0])
+        self.hashes = np.empty(0, dtype=np.int64)
+        self.recent_hashes = set()
+        self.buckets = {}              # (category, kind) -> rows
+
+    def __len__(self):
+        return len(self.compound)
+
+    def add(self, statement, compound, category=-1, kind=-1, timestamp=None, message=-1, labels=()):
+        # Row of the new statement, or None if the same text was added before; labels are further (category, kind) pairs
+        key = hash(statement)
+        if key in self.recent_hashes:
+            return None
+        position = np.searchsorted(self.hashes, key)
+        if position < len(self.hashes) and self.hashes[position] == key:
+            return None
+        self.recent_hashes.add(key)
+        if len(self.recent_hashes) >= HASH_MERGE_SIZE:
+            self.hashes = np.union1d(self.hashes, np.fromiter(self.recent_hashes, np.int64, len(self.recent_hashes)))
+            self.recent_hashes = set()
+        row = len(self.compound)
+        self.message.append(message)
+        self.compound.append(compound)
+        self.category.append(category)
+        self.kind.append(kind)
+        self.polarity.append(1 if compound >= 0.05 else -1 if compound <= -0.05 else 0)
+        self.timestamp.append(int(time.time() if timestamp is None else timestamp))
+        self.text += statement.encode('utf-8')
+        self.offsets.append(len(self.text))
+        if category >= 0:
+            self.buckets.setdefault((category, kind), array('i')).append(row)
+        for label in labels:
+            self.buckets.setdefault(label, array('i')).append(row)
+        return row
+
+    def statement(self, row):
+        return self.text[self.offsets[row]:self.offsets[row + 1]].decode('utf-8')
+
+    def feedback(self, row):
+        return {'message': self.statement(row), 'sentiment': {'compound': float(self.compound[row])}}
+
+    def rows(self, category, kind):
+        return self.buckets.get((category, kind), ())
+
+    def select(self, category, kind):
+        # Snapshot of the (category, kind) rows as FeedbackRows; later additions don't show up in it
+        rows = self.rows(category, kind)
+        return FeedbackRows(self, rows[:] if rows else ())
+
+    def view(self, name):
+        # Zero-copy; don't keep it past the next add, which may need to grow the buffer
+        column = getattr(self, name)
+        return np.frombuffer(column, dtype=np.dtype(column.typecode)) if len(column) else np.empty(0, column.typecode)
+
+    def counts(self):
+        # counts[category, kind], over every label of every row
+        counts = np.zeros((len(self.categories), len(KINDS)), dtype=np.int64)
+        for (category, kind), rows in self.buckets.items():
+            if kind >= 0:
+                counts[category, kind] = len(rows)
+        return counts
+
+    def category_percentages(self):
+        # Share of each category in all compliments and complaints (suggestions are not counted)
+        judged = self.counts()[:, [COMPLIMENT, COMPLAINT]].sum(axis=1)
+        total = judged.sum()
+        if not total:
+            return {category: 0 for category in self.categories}
+        return dict(zip(self.categories, (judged / total * 100).tolist()))
+
+    def ratios(self):
+        counts = self.counts()
+        ratios = {}
+        for index, category in enumerate(self.categories):
+            compliments, complaints = int(counts[index, COMPLIMENT]), int(counts[index, COMPLAINT])
+            judged = compliments + complaints
+            ratios[category] = {'compliments': compliments, 'complaints': complaints,
+                                'compliment_ratio': compliments / judged if judged else None}
+        return ratios
+
+    def trend(self, period='hour', start=None, end=None):
+        # Mean compound score and compliment/complaint counts per hour or day with feedback, oldest first
+        seconds = PERIODS[period]
+        timestamp, compound, kind = self.view('timestamp'), self.view('compound'), self.view('kind')
+        selected = np.ones(len(timestamp), dtype=bool)
+        if start is not None:
+            selected &= timestamp >= start
+        if end is not None:
+            selected &= timestamp < end
+        buckets, inverse = np.unique(timestamp[selected] // seconds, return_inverse=True)
+        statements = np.bincount(inverse, minlength=len(buckets))
+        total = np.bincount(inverse, weights=compound[selected], minlength=len(buckets))
+        kind = kind[selected]
+        compliments = np.bincount(inverse[kind == COMPLIMENT], minlength=len(buckets))
+        complaints = np.bincount(inverse[kind == COMPLAINT], minlength=len(buckets))
+        return [{'start': int(bucket) * seconds, 'statements': int(count), 'mean_compound': float(score / count),
+                 'compliments': int(good), 'complaints': int(bad)}
+                for bucket, count, score, good, bad in zip(buckets, statements, total, compliments, complaints)]
+
+    def nbytes(self):
+        # Approximate footprint: the columns, the text buffer, the hashes and the bucket lists
+        columns = sum(column.itemsize * column.buffer_info()[1]
+                      for column in (self.message, self.compound, self.category, self.kind, self.polarity,
+                                     self.timestamp, self.offsets))
+        buckets = sum(rows.itemsize * len(rows) for rows in self.buckets.values())
+        return columns + len(self.text) + buckets + self.hashes.nbytes + 70 * len(self.recent_hashes)
@@ -0,0 +1,265 @@
+import atexit
+import hashlib
+import queue
+import sqlite3
+import threading
+import time
+
+_STOP = object()
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS statements (
+    id INTEGER PRIMARY KEY,
+    hash INTEGER NOT NULL UNIQUE,
+    message TEXT NOT NULL,
+    compound REAL NOT NULL,
+    polarity INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS labels (
+    statement_id INTEGER NOT NULL REFERENCES statements (id),
+    category TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (statement_id, category, kind)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS occurrences (
+    id INTEGER PRIMARY KEY,
+    statement_id INTEGER NOT NULL REFERENCES statements (id),
+    polarity INTEGER NOT NULL,
+    created REAL NOT NULL,
+    UNIQUE (statement_id, created)
+);
+CREATE TABLE IF NOT EXISTS occurrence_labels (
+    category TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    created REAL NOT NULL,
+    statement_id INTEGER NOT NULL REFERENCES statements (id),
+    PRIMARY KEY (category, kind, created, statement_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS occurrences_created ON occurrences (created, statement_id);
+CREATE INDEX IF NOT EXISTS occurrences_polarity ON occurrences (polarity, created, statement_id);
+CREATE INDEX IF NOT EXISTS occurrence_labels_created ON occurrence_labels (created, category, kind, statement_id);
+DROP INDEX IF EXISTS statements_created;
+DROP INDEX IF EXISTS statements_polarity;
+DROP INDEX IF EXISTS labels_category;
+DROP INDEX IF EXISTS labels_created;
+'''
+
+# Files written before occurrences were kept: each statement occurred once, when it was first stored
+UPGRADE = '''
+INSERT OR IGNORE INTO occurrences (statement_id, polarity, created) SELECT id, polarity, created FROM statements;
+INSERT OR IGNORE INTO occurrence_labels (category, kind, created, statement_id)
+    SELECT category, kind, created, statement_id FROM labels;
+'''
+
+
+def statement_hash(statement):
+    # Stable across processes, unlike hash(), so a statement seen before a restart is still a duplicate
+    return int.from_bytes(hashlib.blake2b(statement.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+
+def time_range(column, start=None, end=None):
+    # SQL condition and parameters for start <= column < end; either bound may be None
+    clauses, params = [], []
+    if start is not None:
+        clauses.append(f"{column} >= ?")
+        params.append(start)
+    if end is not None:
+        clauses.append(f"{column} < ?")
+        params.append(end)
+    return ' AND '.join(clauses) or '1', params
+
+
+def latest_in_range(table, end=None):
+    # SQL condition and parameters for a row of table (occurrences or occurrence_labels) being its statement's last
+    # occurrence before end, so a query walking the time index newest first lists each statement once
+    later, params = time_range('later.created', None, end)
+    return (f"NOT EXISTS (SELECT 1 FROM occurrences AS later WHERE later.statement_id = {table}.statement_id "
+            f"AND later.created > {table}.created AND {later})", params)
+
+
+class FeedbackStore:
+    '''
+    Durable copy of the analyzed feedback in a SQLite file in WAL mode: every unique statement with its
+    compound score, polarity (1, 0 or -1) and (category, kind) labels, and every time it was made. Each
+    occurrence is stored with the statement's polarity and labels, so reports read a date range through
+    the indexes on time, category and polarity, one page at a time; they neither depend on what the process
+    has seen since it started nor grow with the whole history. A statement is in a range if any of its
+    occurrences is, and counts once there however often it was repeated.
+    add() only enqueues; a writer thread inserts whatever has queued up in one transaction, so the chat
+    path never waits on the disk. Queries go through a second connection, which WAL lets read while the
+    writer commits; flush() waits for the queued statements when a report must include them.
+    '''
+    def __init__(self, path='feedback.sqlite3', batch_size=512, flush_interval=0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.lock, self.db:
+            self.db.execute('PRAGMA journal_mode=WAL')
+            upgrade = self.db.execute("SELECT 1 FROM sqlite_master WHERE name = 'occurrences'").fetchone() is None
+            self.db.executescript(SCHEMA)
+            if upgrade:
+                self.db.executescript(UPGRADE)
+        self.queue = queue.SimpleQueue()
+        self.written = 0
+        self.dropped = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name='feedback-store', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def add(self, statement, compound, labels=(), created=None):
+        # labels are (category, kind) name pairs; for a statement already stored only the new time is recorded
+        self.queue.put((statement, compound, tuple(labels), time.time() if created is None else created))
+
+    def flush(self, timeout=5.0):
+        # Wait until everything added so far is committed
+        if not self.thread.is_alive():
+            return False
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        if self.closed:
+            return
+        self.closed = True
+        if self.thread.is_alive():
+            self.queue.put(_STOP)
+            self.thread.join(timeout)
+        with self.lock:
+            self.db.close()
+
+    def _run(self):
+        db = sqlite3.connect(self.path)
+        db.execute('PRAGMA synchronous=NORMAL')
+        stopping = False
+        while not stopping:
+            batch, waiting = [], []
+            try:
+                # Wait for the first statement, then drain whatever else is already queued
+                item = self.queue.get(timeout=self.flush_interval)
+                while True:
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    if isinstance(item, threading.Event):
+                        waiting.append(item)
+                    else:
+                        batch.append(item)
+                        if len(batch) >= self.batch_size:
+                            break
+                    item = self.queue.get_nowait()
+            except queue.Empty:
+                pass
+
+            if batch:
+                try:
+                    self.write(db, batch)
+                    self.written += len(batch)
+                except sqlite3.Error as e:
+                    self.dropped += len(batch)
+                    print("Error writing feedback store:", e)
+            for done in waiting:
+                done.set()
+        db.close()
+
+    @staticmethod
+    def write(db, batch):
+        with db:
+            for statement, compound, labels, created in batch:
+                polarity = 1 if compound >= 0.05 else -1 if compound <= -0.05 else 0
+                digest = statement_hash(statement)
+                cursor = db.execute('INSERT OR IGNORE INTO statements (hash, message, compound, polarity, created) '
+                                    'VALUES (?, ?, ?, ?, ?)', (digest, statement, compound, polarity, created))
+                if cursor.rowcount:
+                    statement_id = cursor.lastrowid
+                    if labels:
+                        db.executemany('INSERT OR IGNORE INTO labels (statement_id, category, kind, created) '
+                                       'VALUES (?, ?, ?, ?)',
+                                       [(statement_id, category, kind, created) for category, kind in labels])
+                else:
+                    statement_id = db.execute('SELECT id FROM statements WHERE hash = ?', (digest,)).fetchone()[0]
+                # A repeat keeps the polarity and labels the statement was first stored with
+                if db.execute('INSERT OR IGNORE INTO occurrences (statement_id, polarity, created) '
+                              'SELECT id, polarity, ? FROM statements WHERE id = ?', (created, statement_id)).rowcount:
+                    db.execute('INSERT INTO occurrence_labels (category, kind, created, statement_id) '
+                               'SELECT category, kind, ?, statement_id FROM labels WHERE statement_id = ?',
+                               (created, statement_id))
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.db.execute(sql, params).fetchall()
+
+    def counts(self, start=None, end=None):
+        # {category: {kind: statements}} made at least once with start <= created < end (epoch seconds)
+        condition, params = time_range('created', start, end)
+        counts = {}
+        for row in self.query(f"SELECT category, kind, COUNT(DISTINCT statement_id) AS total FROM occurrence_labels "
+                              f"WHERE {condition} GROUP BY category, kind", params):
+            counts.setdefault(row['category'], {})[row['kind']] = row['total']
+        return counts
+
+    def polarity_counts(self, start=None, end=None):
+        # Positive, neutral and negative statements in the range, labelled or not; each is one index range
+        condition, params = time_range('created', start, end)
+        return {name: self.query(f"SELECT COUNT(DISTINCT statement_id) FROM occurrences WHERE polarity = ? AND {condition}",
+                                 [polarity] + params)[0][0]
+                for polarity, name in ((1, 'positive'), (0, 'neutral'), (-1, 'negative'))}
+
+    def page(self, category, kind, start=None, end=None, limit=20, offset=0):
+        # One page of a category's statements of a kind in the range, as report feedback dicts, newest first by
+        # their latest time in the range
+        condition, params = time_range('occurrence_labels.created', start, end)
+        latest, latest_params = latest_in_range('occurrence_labels', end)
+        rows = self.query(f"SELECT statements.message, statements.compound, occurrence_labels.created FROM occurrence_labels "
+                          f"JOIN statements ON statements.id = occurrence_labels.statement_id "
+                          f"WHERE occurrence_labels.category = ? AND occurrence_labels.kind = ? AND {condition} AND {latest} "
+                          f"ORDER BY occurrence_labels.created DESC, occurrence_labels.statement_id DESC LIMIT ? OFFSET ?",
+                          [category, kind] + params + latest_params + [limit, offset])
+        return [{'message': row['message'], 'sentiment': {'compound': row['compound']}, 'created': row['created']}
+                for row in rows]
+
+    def statements(self, start=None, end=None, polarity=None, limit=100, offset=0):
+        # Stored statements in the range, newest first by their latest time in it, optionally of one polarity
+        condition, params = time_range('occurrences.created', start, end)
+        if polarity is not None:
+            condition, params = f"occurrences.polarity = ? AND {condition}", [polarity] + params
+        latest, latest_params = latest_in_range('occurrences', end)
+        rows = self.query(f"SELECT message, compound, occurrences.polarity, occurrences.created FROM occurrences "
+                          f"JOIN statements ON statements.id = occurrences.statement_id WHERE {condition} AND {latest} "
+                          f"ORDER BY occurrences.created DESC, occurrences.statement_id DESC LIMIT ? OFFSET ?",
+                          params + latest_params + [limit, offset])
+        return [dict(row) for row in rows]
+
+    def export_rows(self, start=None, end=None, batch_size=1000):
+        # (created, message, compound, polarity, category, kind) for each label of each time a statement was made in
+        # the range, oldest first, so a repeated statement is listed once per repeat; category and kind are None for
+        # unlabelled statements. Rows are fetched in batches through a connection of the export's own, so a long
+        # export neither holds the result nor blocks other queries.
+        condition, params = time_range('occurrences.created', start, end)
+        db = sqlite3.connect(self.path)
+        try:
+            cursor = db.execute(f"SELECT occurrences.created, message, compound, statements.polarity, category, kind "
+                                f"FROM occurrences JOIN statements ON statements.id = occurrences.statement_id "
+                                f"LEFT JOIN labels ON labels.statement_id = occurrences.statement_id WHERE {condition} "
+                                f"ORDER BY occurrences.created, occurrences.id", params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            db.close()
+
+    def version(self):
+        # Id of the newest occurrence, from any process writing to the file; it only grows, as nothing is ever updated
+        # or deleted and a new statement's labels are committed with its first occurrence
+        return self.query('SELECT MAX(id) FROM occurrences')[0][0] or 0
+
+    def __len__(self):
+        return self.query('SELECT COUNT(*) FROM statements')[0][0]
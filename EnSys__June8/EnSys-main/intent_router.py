@@ -0,0 +1,97 @@
+from collections import Counter, namedtuple
+from keyword_automaton import KeywordAutomaton
+
+# keywords: substrings that trigger the intent (None = no keyword needed)
+# sentiment: 'positive', 'negative' or 'neutral' guard on the VADER compound score
+# exclude: substrings that veto the intent
+# needs_digits / needs_topic: the prompt must be a bare number / a menu topic must be active
+Intent = namedtuple('Intent', ['name', 'priority', 'keywords', 'sentiment', 'exclude', 'needs_digits', 'needs_topic'],
+                    defaults=(None, None, (), False, False))
+
+Route = namedtuple('Route', ['intent', 'keyword'])
+
+MENU_PRAISE_KEYWORDS = ('love menu', 'like menu', 'great menu', 'awesome menu', 'amazing menu', 'menu is good')
+RESTAURANT_NAME_KEYWORDS = ('restaurant name', 'name of this place', 'called', 'called this', 'name', 'tell place', 'this place')
+RESTAURANT_PROFILE_KEYWORDS = ('restaurant profile', 'about the restaurant', 'tell me about', 'more about this place',
+                               'more about this restaurant', 'tell atin-atehan', 'tell restaurant')
+RECOMMENDATION_KEYWORDS = ('recommend', 'suggest')
+FEEDBACK_KEYWORDS = ('like', 'dislike', 'suggestions')
+
+
+def default_intents(menu_categories):
+    # Same order as the original keyword cascade in EnSysBot.generate_response
+    return [
+        Intent('feedback', 10, FEEDBACK_KEYWORDS),
+        Intent('positive_sentiment', 20, sentiment='positive', exclude=('no',)),
+        Intent('negative_sentiment', 30, sentiment='negative'),
+        Intent('menu_praise', 40, MENU_PRAISE_KEYWORDS, sentiment='positive'),
+        Intent('restaurant_name', 50, RESTAURANT_NAME_KEYWORDS),
+        Intent('restaurant_profile', 60, RESTAURANT_PROFILE_KEYWORDS),
+        Intent('menu_overview', 70, ('menu',), sentiment='neutral'),
+        Intent('menu_category', 80, tuple(category.lower() for category in menu_categories)),
+        Intent('recommendation', 90, RECOMMENDATION_KEYWORDS),
+        Intent('menu_selection', 100, needs_digits=True, needs_topic=True),
+        Intent('follow_up', 110, needs_topic=True),
+    ]
+
+
+class IntentRouter:
+    '''
+    Classifies a preprocessed prompt against a declarative intent table.
+    Every keyword of every intent is compiled into one automaton, so a prompt is scanned once
+    no matter how many intents are declared; the guards are then checked in priority order.
+    '''
+    def __init__(self, intents):
+        self.intents = sorted(intents, key=lambda intent: intent.priority)
+        patterns = []
+        for intent in self.intents:
+            for order, keyword in enumerate(intent.keywords or ()):
+                patterns.append((keyword, (intent.name, order)))
+            for keyword in intent.exclude:
+                patterns.append((keyword, (intent.name, None)))
+        self.automaton = KeywordAutomaton(patterns)
+        self.hits = Counter()
+
+    def classify(self, text, compound, has_topic=False):
+        # Collect, per intent, the declaration order of the keywords present and whether a veto fired
+        found = {}
+        vetoed = set()
+        for keyword_id in self.automaton.matched_ids(text):
+            for name, order in self.automaton.values[keyword_id]:
+                if order is None:
+                    vetoed.add(name)
+                else:
+                    found.setdefault(name, []).append(order)
+
+        for intent in self.intents:
+            keyword = None
+            if intent.keywords is not None:
+                if intent.name not in found:
+                    continue
+                keyword = intent.keywords[min(found[intent.name])]
+            if intent.name in vetoed:
+                continue
+            if not self.sentiment_matches(intent.sentiment, compound):
+                continue
+            if intent.needs_digits and not text.isdigit():
+                continue
+            if intent.needs_topic and not has_topic:
+                continue
+            self.hits[intent.name] += 1
+            return Route(intent.name, keyword)
+
+        self.hits[None] += 1
+        return None
+
+    @staticmethod
+    def sentiment_matches(guard, compound):
+        if guard == 'positive':
+            return compound > 0.05
+        if guard == 'negative':
+            return compound < -0.05
+        if guard == 'neutral':
+            return -0.05 <= compound <= 0.05
+        return True
+
+    def stats(self):
+        return {('fallback' if name is None else name): count for name, count in self.hits.items()}
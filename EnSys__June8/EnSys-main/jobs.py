@@ -0,0 +1,270 @@
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+QUEUED, RUNNING = 'queued', 'running'
+SUCCEEDED, FAILED, CANCELLED, INTERRUPTED = 'succeeded', 'failed', 'cancelled', 'interrupted'
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED, INTERRUPTED)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    owner TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS job_logs (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    message TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+CREATE TABLE IF NOT EXISTS job_owners (
+    owner TEXT PRIMARY KEY,
+    heartbeat REAL NOT NULL
+);
+'''
+# Columns added to jobs after the first release, for files created before them
+ADDED_COLUMNS = {'owner': 'TEXT', 'cancel_requested': 'INTEGER NOT NULL DEFAULT 0'}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    '''
+    Handle passed to a running job function, for reporting progress and log lines.
+    Both check for cancellation, requested here or by any scheduler sharing the file, and raise
+    JobCancelled, so a job stops at its next report.
+    '''
+    def __init__(self, scheduler, job_id):
+        self.scheduler = scheduler
+        self.id = job_id
+        self.cancel_requested = threading.Event()
+
+    def progress(self, done, total=None, message=None):
+        # progress(0.4) or progress(done, total)
+        fraction = done / total if total else done
+        self.check_cancelled()
+        fields = {'progress': min(max(fraction, 0.0), 1.0)}
+        if message is not None:
+            fields['message'] = message
+        self.scheduler.update(self.id, **fields)
+
+    def log(self, message):
+        self.check_cancelled()
+        self.scheduler.append_log(self.id, message)
+
+    def check_cancelled(self):
+        if self.cancel_requested.is_set() or self.scheduler.cancel_requested(self.id):
+            raise JobCancelled()
+
+
+class JobScheduler:
+    '''
+    Runs training and evaluation jobs on a bounded pool of worker threads, highest priority first
+    (first come first served within a priority). Job state, progress, logs and results are kept in
+    a SQLite file, so they can be polled from any request.
+    Several schedulers (e.g. the Flask and asyncio servers) may share the file. Each tags its jobs
+    with an owner id (pid plus a start token) and keeps a heartbeat for it; cancel() goes through the
+    database, so it reaches a job whichever scheduler runs it. Queued or running jobs whose owner has
+    stopped beating for heartbeat_timeout seconds are marked interrupted, since their functions cannot
+    be resumed; a live scheduler's jobs are never touched.
+    '''
+    def __init__(self, path='jobs.sqlite3', workers=2, heartbeat_interval=10.0, heartbeat_timeout=30.0):
+        self.path = path
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.lock, self.db:
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.executescript(SCHEMA)
+            columns = {row['name'] for row in self.db.execute('PRAGMA table_info(jobs)')}
+            for name, definition in ADDED_COLUMNS.items():
+                if name not in columns:
+                    self.db.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+        self.beat()
+        self.reclaim()
+        self.stopping = threading.Event()
+        self.heartbeat_thread = threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True)
+        self.heartbeat_thread.start()
+        self.queue = []
+        self.order = itertools.count()
+        self.functions = {}
+        self.running = {}
+        self.condition = threading.Condition()
+        self.closed = False
+        self.threads = [threading.Thread(target=self._run, name=f'job-worker-{i}', daemon=True) for i in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, kind, function, params=None, priority=0):
+        # function(job) runs on a worker thread; its return value must be JSON serializable
+        job_id = uuid.uuid4().hex
+        with self.lock, self.db:
+            self.db.execute('INSERT INTO jobs (id, kind, params, priority, state, created, owner) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                            (job_id, kind, json.dumps(params or {}), priority, QUEUED, time.time(), self.owner))
+        with self.condition:
+            self.functions[job_id] = function
+            heapq.heappush(self.queue, (-priority, next(self.order), job_id))
+            self.condition.notify()
+        return job_id
+
+    def cancel(self, job_id):
+        # Queued jobs are cancelled at once; running ones stop at their next progress or log call. Either
+        # may belong to another scheduler on the same file, which sees the change in the database
+        with self.lock, self.db:
+            cancelled = self.db.execute('UPDATE jobs SET state = ?, finished = ? WHERE id = ? AND state = ?',
+                                        (CANCELLED, time.time(), job_id, QUEUED)).rowcount
+            if not cancelled:
+                cancelled = self.db.execute('UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND state = ?',
+                                            (job_id, RUNNING)).rowcount
+        with self.condition:
+            self.functions.pop(job_id, None)
+            job = self.running.get(job_id)
+        if job is not None:
+            job.cancel_requested.set()
+        return bool(cancelled)
+
+    def cancel_requested(self, job_id):
+        with self.lock:
+            row = self.db.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return row is not None and bool(row[0])
+
+    def beat(self):
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO job_owners (owner, heartbeat) VALUES (?, ?)', (self.owner, time.time()))
+
+    def reclaim(self):
+        # Mark interrupted the unfinished jobs of schedulers that stopped without finishing them
+        now = time.time()
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM job_owners WHERE heartbeat < ?', (now - self.heartbeat_timeout,))
+            reclaimed = self.db.execute('UPDATE jobs SET state = ?, finished = ? WHERE state IN (?, ?) AND '
+                                        '(owner IS NULL OR owner NOT IN (SELECT owner FROM job_owners))',
+                                        (INTERRUPTED, now, QUEUED, RUNNING)).rowcount
+        return reclaimed
+
+    def _heartbeat(self):
+        while not self.stopping.wait(self.heartbeat_interval):
+            try:
+                self.beat()
+                self.reclaim()
+            except sqlite3.Error as e:
+                print("Error updating job heartbeat:", e)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.closed and not self.queue:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                _, _, job_id = heapq.heappop(self.queue)
+                function = self.functions.pop(job_id, None)
+                if function is None:
+                    continue    # cancelled while queued
+                job = self.running[job_id] = Job(self, job_id)
+            try:
+                if not self.start(job_id):
+                    continue    # cancelled (possibly by another scheduler) before it started
+                try:
+                    result = function(job)
+                    self.finish(job_id, state=SUCCEEDED, progress=1.0, result=json.dumps(result), finished=time.time())
+                except JobCancelled:
+                    self.append_log(job_id, 'Cancelled')
+                    self.finish(job_id, state=CANCELLED, finished=time.time())
+                except Exception as e:
+                    print(f"Job {job_id} failed: {e}")
+                    self.append_log(job_id, traceback.format_exc())
+                    self.finish(job_id, state=FAILED, error=str(e), finished=time.time())
+            finally:
+                with self.condition:
+                    self.running.pop(job_id, None)
+
+    def start(self, job_id):
+        with self.lock, self.db:
+            return self.db.execute('UPDATE jobs SET state = ?, started = ? WHERE id = ? AND state = ? AND owner = ?',
+                                   (RUNNING, time.time(), job_id, QUEUED, self.owner)).rowcount == 1
+
+    def finish(self, job_id, **fields):
+        # Final state of a job this scheduler ran; a row another scheduler already marked finished is kept
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self.lock, self.db:
+            self.db.execute(f"UPDATE jobs SET {assignments} WHERE id = ? AND state = ? AND owner = ?",
+                            (*fields.values(), job_id, RUNNING, self.owner))
+
+    def update(self, job_id, **fields):
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self.lock, self.db:
+            self.db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def append_log(self, job_id, message):
+        with self.lock, self.db:
+            self.db.execute('INSERT INTO job_logs (job_id, seq, ts, message) '
+                            'SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ? FROM job_logs WHERE job_id = ?',
+                            (job_id, time.time(), message, job_id))
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self.to_dict(row) if row is not None else None
+
+    def list(self, limit=50):
+        with self.lock:
+            rows = self.db.execute('SELECT * FROM jobs ORDER BY created DESC LIMIT ?', (limit,)).fetchall()
+        return [self.to_dict(row) for row in rows]
+
+    def logs(self, job_id, since=0):
+        # Log lines after sequence number `since`, for incremental polling
+        with self.lock:
+            rows = self.db.execute('SELECT seq, ts, message FROM job_logs WHERE job_id = ? AND seq > ? ORDER BY seq',
+                                   (job_id, since)).fetchall()
+        return [dict(row) for row in rows]
+
+    @staticmethod
+    def to_dict(row):
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            for job in self.running.values():
+                job.cancel_requested.set()
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join(timeout=5)
+        self.stopping.set()
+        self.heartbeat_thread.join(timeout=5)
+        # Jobs still queued here will never run; the owner row goes, so whatever is left is reclaimed
+        with self.lock, self.db:
+            self.db.execute('UPDATE jobs SET state = ?, finished = ? WHERE state = ? AND owner = ?',
+                            (INTERRUPTED, time.time(), QUEUED, self.owner))
+            self.db.execute('DELETE FROM job_owners WHERE owner = ?', (self.owner,))
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,93 @@
+from collections import deque
+
+class KeywordAutomaton:
+    '''
+    Aho-Corasick automaton over a fixed set of keywords.
+    A single left-to-right pass over the text reports every occurrence of every keyword,
+    so the cost of a lookup depends on the length of the text, not on the number of keywords.
+    '''
+    def __init__(self, keywords):
+        # keywords is an iterable of (keyword, value) pairs; the same keyword may carry several values
+        self.keywords = []
+        self.values = []
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [()]
+        index = {}
+        for keyword, value in keywords:
+            if not keyword:
+                continue
+            if keyword not in index:
+                index[keyword] = len(self.keywords)
+                self.keywords.append(keyword)
+                self.values.append([])
+                self.add_keyword(keyword, index[keyword])
+            self.values[index[keyword]].append(value)
+        self.build_failure_links()
+
+    def add_keyword(self, keyword, keyword_id):
+        state = 0
+        for char in keyword:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(())
+            state = next_state
+        self.output[state] = self.output[state] + (keyword_id,)
+
+    def build_failure_links(self):
+        # Breadth-first so a state's failure target is always finished before its children
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[next_state] = target if target != next_state else 0
+                # Inherit the matches of the longest proper suffix
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def iter_matches(self, text):
+        # Yields (start, end, keyword_id) for every, possibly overlapping, occurrence
+        goto, fail, output, keywords = self.goto, self.fail, self.output, self.keywords
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for keyword_id in output[state]:
+                end = position + 1
+                yield end - len(keywords[keyword_id]), end, keyword_id
+
+    def matched_ids(self, text):
+        return {keyword_id for _, _, keyword_id in self.iter_matches(text)}
+
+    def longest_matches(self, text, whole_words=True):
+        # Leftmost-longest, non-overlapping occurrences as (start, end, keyword_id)
+        candidates = []
+        for start, end, keyword_id in self.iter_matches(text):
+            if whole_words and not self.is_word_bounded(text, start, end):
+                continue
+            candidates.append((start, -end, keyword_id))
+        candidates.sort()
+
+        matches = []
+        last_end = 0
+        for start, neg_end, keyword_id in candidates:
+            if start >= last_end:
+                matches.append((start, -neg_end, keyword_id))
+                last_end = -neg_end
+        return matches
+
+    @staticmethod
+    def is_word_bounded(text, start, end):
+        return (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())
+
+    def __len__(self):
+        return len(self.keywords)
@@ -0,0 +1,127 @@
+'''
+Load test for the completion path against fake_completion_server.py (started as a subprocess).
+Sends the same number of requests at increasing concurrency through the pooled AsyncCompletionClient
+on one event loop thread, and the same workload through blocking calls on a thread pool, and reports
+throughput, latency and the number of OS threads each approach needed.
+Usage: python load_test_llm.py [--requests 256] [--latency 0.5]
+'''
+import argparse
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from async_llm import AsyncCompletionClient
+
+MESSAGES = [{"role": "user", "content": "Is the beef lengua good?"}]
+
+
+class ThreadSampler:
+    # Highest number of live threads in this process seen while requests complete
+    def __init__(self):
+        self.peak = threading.active_count()
+
+    def sample(self):
+        self.peak = max(self.peak, threading.active_count())
+
+
+# Latencies are measured from the moment the whole batch is submitted, so they include queueing
+async def run_async(client, requests, sampler):
+    latencies = []
+    start = time.perf_counter()
+
+    async def one():
+        await client.complete(MESSAGES)
+        latencies.append(time.perf_counter() - start)
+        sampler.sample()
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return time.perf_counter() - start, latencies
+
+
+def blocking_call(url):
+    body = json.dumps({'model': 'fake', 'messages': MESSAGES}).encode('utf-8')
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request) as response:
+        json.loads(response.read())
+
+
+def run_threads(url, requests, concurrency, sampler):
+    start = time.perf_counter()
+
+    def call(_):
+        blocking_call(url)
+        sampler.sample()
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(call, range(requests)))
+    return time.perf_counter() - start, latencies
+
+
+def wait_for_server(api_base, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            blocking_call(api_base + '/chat/completions')
+            return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.1)
+    raise RuntimeError("fake completion server did not start")
+
+
+def report(label, concurrency, requests, elapsed, latencies, threads):
+    p95 = sorted(latencies)[int(len(latencies) * 0.95) - 1]
+    print(f"{label:<8} {concurrency:>6} {requests / elapsed:>10.1f} {statistics.median(latencies) * 1000:>10.0f} "
+          f"{p95 * 1000:>10.0f} {threads:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=256)
+    parser.add_argument('--latency', type=float, default=0.5, help='simulated upstream latency in seconds')
+    parser.add_argument('--port', type=int, default=8002)
+    args = parser.parse_args()
+
+    server = subprocess.Popen([sys.executable, 'fake_completion_server.py', '--port', str(args.port),
+                               '--first-token-delay', str(args.latency), '--token-delay', '0'],
+                              stdout=subprocess.DEVNULL)
+    api_base = f"http://127.0.0.1:{args.port}/v1"
+    try:
+        wait_for_server(api_base)
+        measure_all(api_base, args.requests)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def measure_all(api_base, max_requests):
+    print(f"{'path':<8} {'conc':>6} {'req/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'threads':>8}")
+    for concurrency in (1, 8, 32, 128):
+        requests = min(max_requests, max(concurrency * 4, 16))
+
+        async def measure(sampler):
+            client = AsyncCompletionClient('test-key', 'fake', api_base=api_base, max_concurrency=concurrency,
+                                           pool_size=concurrency)
+            try:
+                return await run_async(client, requests, sampler)
+            finally:
+                await client.close()
+
+        sampler = ThreadSampler()
+        elapsed, latencies = asyncio.run(measure(sampler))
+        report('asyncio', concurrency, requests, elapsed, latencies, sampler.peak)
+
+        sampler = ThreadSampler()
+        elapsed, latencies = run_threads(api_base + '/chat/completions', requests, concurrency, sampler)
+        report('threads', concurrency, requests, elapsed, latencies, sampler.peak)
+
+
+if __name__ == '__main__':
+    main()
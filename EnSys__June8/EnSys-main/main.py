@@ -2,6 +2,7 @@
 This is the main file for the EnSys chatbot. It initializes the Flask app and loads the chatbot with the API key.
 Old model: ft:gpt-3.5-turbo-0125:ensys:restaurant:9IrHirrM 
 '''
+import logging
 import nltk
 import os
 nltk.download('stopwords')
@@ -9,17 +10,17 @@ nltk.download('punkt')
 nltk.download('vader_lexicon')
 nltk.download('wordnet')
 
+# Debug output (e.g. each preprocessed prompt) is only written with LOG_LEVEL=DEBUG
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'WARNING'))
+
 from flask import Flask
 from routes import initialize_routes
-from bot import EnSysBot, load_config
+from bot import create_bot
 
 
-# Load environment variables and get the API key
+# Load environment variables and get the API key (see bot.create_bot for the engine)
 try:
-    api_key = load_config()
-    #engine = "ft:gpt-3.5-turbo-0125:ensys:restaurant-2:9SO7Maw7"
-    engine ="ft:gpt-3.5-turbo-0125:ensys:empatheticd:9XQSt7AX"
-    bot = EnSysBot(engine, api_key)
+    bot = create_bot()
 except Exception as e:
     raise e
 
@@ -0,0 +1,69 @@
+from types import MappingProxyType
+
+class MenuIndex:
+    '''
+    Read-only view of the restaurant menu, built once from the CSV data.
+    Holds the dish records, the per-category dish order, a lowercase name lookup
+    and the pre-rendered category and full-menu strings so a chat turn never touches pandas.
+    '''
+    __slots__ = ('dishes', 'categories', 'by_name', 'category_text', 'full_menu_text', 'fingerprint')
+
+    def __init__(self, dishes, categories):
+        object.__setattr__(self, 'dishes', dishes)
+        object.__setattr__(self, 'categories', categories)
+        by_name = {}
+        for dish in dishes:
+            by_name.setdefault(dish['name'].lower(), dish)
+        object.__setattr__(self, 'by_name', MappingProxyType(by_name))
+        object.__setattr__(self, 'category_text', MappingProxyType({
+            category: self.format_category(category, items) for category, items in categories.items()
+        }))
+        object.__setattr__(self, 'full_menu_text', ''.join(
+            f"{self.category_text[category]}\n\n" for category in categories
+        ))
+        # Identifies the menu contents, so a reload of unchanged data can keep the existing index
+        object.__setattr__(self, 'fingerprint', hash(tuple(
+            (dish['category'], dish['name'], str(dish['description'])) for dish in dishes
+        )))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("MenuIndex is immutable")
+
+    @classmethod
+    def from_dataframe(cls, restaurant_data):
+        dishes = []
+        categories = {}
+        if not restaurant_data.empty:
+            # Single pass over the rows, keeping the first-seen order of categories and dishes
+            rows = zip(restaurant_data['Dish Type'], restaurant_data['Dish Name'], restaurant_data['Description'])
+            seen = set()
+            for dish_type, name, description in rows:
+                category = dish_type.lower()
+                items = categories.setdefault(category, [])
+                # Ensure unique items within a category
+                if (category, name) in seen:
+                    continue
+                seen.add((category, name))
+                dish = MappingProxyType({'name': name, 'description': description, 'category': category})
+                items.append(dish)
+                dishes.append(dish)
+        return cls(tuple(dishes), MappingProxyType({category: tuple(items) for category, items in categories.items()}))
+
+    @staticmethod
+    def format_category(category, items):
+        # Category name followed by a colon, then each dish on its own numbered line
+        lines = [f"{category.capitalize()}:"]
+        lines.extend(f"{idx}. {item['name']}" for idx, item in enumerate(items, start=1))
+        return "\n".join(lines)
+
+    def get_category(self, category):
+        return self.categories.get(category.lower(), ())
+
+    def get_dish(self, name):
+        return self.by_name.get(name.lower())
+
+    def __contains__(self, category):
+        return category.lower() in self.categories
+
+    def __len__(self):
+        return len(self.dishes)
@@ -0,0 +1,76 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    '''
+    Coalesces concurrent single calls into batched calls of function(items) -> results (same order).
+    A worker thread takes the first waiting item, waits up to max_wait seconds for more to arrive,
+    then runs the batch as soon as it has max_batch_size items or the wait is over. While a batch runs,
+    new calls queue up for the next one, so batches grow with the load. An exception from function
+    is raised in every caller of that batch.
+    '''
+    def __init__(self, function, max_batch_size=32, max_wait=0.002, name='micro-batcher'):
+        self.function = function
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.batches = 0
+        self.items = 0
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, item):
+        future = Future()
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("MicroBatcher is closed")
+            self.pending.append((item, future))
+            # The worker only needs waking for the first item of a batch and when one is full
+            if len(self.pending) == 1 or len(self.pending) >= self.max_batch_size:
+                self.condition.notify()
+        return future
+
+    def __call__(self, item, timeout=None):
+        return self.submit(item).result(timeout)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.closed and not self.pending:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                deadline = time.monotonic() + self.max_wait
+                while not self.closed and len(self.pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                batch = [self.pending.popleft() for _ in range(min(len(self.pending), self.max_batch_size))]
+            self.batches += 1
+            self.items += len(batch)
+
+            try:
+                results = self.function([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        return {'batches': self.batches, 'items': self.items,
+                'mean_batch_size': self.items / self.batches if self.batches else 0.0}
+
+    def close(self):
+        # Items already submitted are still answered
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join(timeout=5)
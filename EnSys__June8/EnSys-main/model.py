@@ -1,63 +1,249 @@
+import time, zlib, random, logging
+from array import array
+import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
-from sklearn.metrics.pairwise import cosine_similarity
+from exemplar_index import ExemplarIndex
+from fast_inference import CompiledEmotionModel
+
+logger = logging.getLogger(__name__)
+
+# Smallest batch predict_emotions vectorizes in one call when the compiled path is available (see bench_micro_batcher.py)
+VECTORIZE_MIN_BATCH = 64
+
+# Columns of the training dataset read by load_dataset and iter_dataset
+DATASET_COLUMNS = ['context', 'prompt', 'utterance', 'emotion']
 
 class EmotionModel:
-    def __init__(self, engine):
+    def __init__(self, engine, registry=None):
         self.vectorizer = TfidfVectorizer()
         self.model = LogisticRegression() 
         self.engine = engine
+        # Trained versions are published to the registry (see model_registry.py) and loaded from it
+        self.registry = registry
+        self.version = None
+        self.fitted = (self.vectorizer, self.model, None)
+        # Exemplar retrieval has its own index and vectorizer, so it works before the emotion model is trained
+        self.exemplar_index = None
 
-    # Load the dataset from a CSV file
+    # Load the dataset from a CSV file; missing fields are read as empty strings, as in iter_dataset, so both
+    # paths build the same texts (and so the same features and holdout rows) from the same file
     def load_dataset(self, file_path):
-        df = pd.read_csv(file_path)
-        combined_text = df['context'].astype(str) + ' ' + df['prompt'].astype(str) + ' ' + df['utterance'].astype(str)
-        labels = df['emotion'].tolist()
-        return combined_text.tolist(), labels
+        df = pd.read_csv(file_path, usecols=DATASET_COLUMNS, dtype=str, keep_default_na=False)
+        return self.combine_text(df), df['emotion'].tolist()
+
+    # Same rows as load_dataset, but as (texts, labels) chunks so only one chunk is in memory at a time
+    def iter_dataset(self, file_path, chunksize=10000):
+        for df in pd.read_csv(file_path, usecols=DATASET_COLUMNS, dtype=str, keep_default_na=False, chunksize=chunksize):
+            yield self.combine_text(df), df['emotion'].tolist()
+
+    @staticmethod
+    def combine_text(df):
+        return (df['context'] + ' ' + df['prompt'] + ' ' + df['utterance']).tolist()
+
+    # Stable split by content hash: the same rows are held out on every pass and every run
+    @staticmethod
+    def is_holdout(text, test_size):
+        return zlib.crc32(text.encode('utf-8')) % 1000 < test_size * 1000
 
     # Train the model using the dataset
-    def train_model(self, file_path):
+    # progress(fraction_done), if given, is called once the model is fitted and evaluated, before it is published
+    def train_model(self, file_path, progress=None):
         # Load dataset
         X, y = self.load_dataset(file_path)
         
         # Split dataset into training and testing sets
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
         
-        # Vectorize the training data
-        X_train_vec = self.vectorizer.fit_transform(X_train)
+        # Vectorize the training data; fresh objects, so predictions keep using the old ones until the swap
+        vectorizer = TfidfVectorizer()
+        X_train_vec = vectorizer.fit_transform(X_train)
         
         # Train the model
-        self.model.fit(X_train_vec, y_train)
+        model = LogisticRegression()
+        model.fit(X_train_vec, y_train)
 
         # Evaluate model on test set
-        X_test_vec = self.vectorizer.transform(X_test)
-        y_pred = self.model.predict(X_test_vec)
+        X_test_vec = vectorizer.transform(X_test)
+        y_pred = model.predict(X_test_vec)
         accuracy = accuracy_score(y_test, y_pred)
-        print("Model accuracy:", accuracy)
+        logger.info("Model accuracy: %s", accuracy)
+        compiled = self.compile_fitted(vectorizer, model, X_test, y_pred)
+        if progress is not None:
+            progress(0.9)
+
+        version = None
+        if self.registry is not None:
+            version = self.registry.publish(vectorizer, model, {'accuracy': accuracy, 'samples': len(X)})
+        self.use_fitted(vectorizer, model, version, compiled)
+        return accuracy
+
+    # Out-of-core training for corpora that don't fit in memory: hashed features need no fitted vocabulary,
+    # and the SGD classifier learns from one chunk at a time, so memory is bounded by chunksize and n_features
+    # progress(fraction_done), if given, is called after every training chunk and once more before publishing
+    def train_model_streaming(self, file_path, chunksize=10000, n_features=2 ** 18, epochs=3, test_size=0.2,
+                              progress=None):
+        classes, total_rows = set(), 0
+        for df in pd.read_csv(file_path, usecols=['emotion'], dtype=str, keep_default_na=False, chunksize=chunksize * 10):
+            classes.update(df['emotion'].unique())
+            total_rows += len(df)
+        classes = np.array(sorted(classes))
+
+        vectorizer = HashingVectorizer(n_features=n_features, alternate_sign=False)
+        model = SGDClassifier(loss='log_loss', alpha=1e-5, random_state=42)
+        samples = 0
+        for epoch in range(epochs):
+            shuffle = random.Random(epoch)
+            rows_read = 0
+            for texts, labels in self.iter_dataset(file_path, chunksize):
+                train = [i for i, text in enumerate(texts) if not self.is_holdout(text, test_size)]
+                shuffle.shuffle(train)
+                if train:
+                    model.partial_fit(vectorizer.transform([texts[i] for i in train]), [labels[i] for i in train],
+                                      classes=classes)
+                if epoch == 0:
+                    samples += len(train)
+                rows_read += len(texts)
+                if progress is not None:
+                    progress((epoch * total_rows + rows_read) / max(epochs * total_rows, 1))
+
+        # Holdout predictions, kept as class indices rather than strings; the compiled path is checked chunk by chunk
+        class_ids = {label: index for index, label in enumerate(classes)}
+        y_test, y_pred = array('H'), array('H')
+        compiled = CompiledEmotionModel(vectorizer, model)
+        mismatches = 0
+        for texts, labels in self.iter_dataset(file_path, chunksize):
+            test = [i for i, text in enumerate(texts) if self.is_holdout(text, test_size)]
+            if test:
+                test_texts = [texts[i] for i in test]
+                predicted = model.predict(vectorizer.transform(test_texts))
+                y_test.extend(class_ids[labels[i]] for i in test)
+                y_pred.extend(class_ids[label] for label in predicted)
+                mismatches += len(compiled.verify(test_texts, predicted))
+        metrics = self.score(np.frombuffer(y_test, dtype=np.uint16), np.frombuffer(y_pred, dtype=np.uint16))
+        logger.info("Model accuracy: %s", metrics["Accuracy"])
+        if mismatches:
+            logger.warning("Compiled emotion model disagrees with sklearn on %d holdout texts; not using it", mismatches)
+            compiled = None
+        if progress is not None:
+            progress(1.0)
+
+        version = None
+        if self.registry is not None:
+            version = self.registry.publish(vectorizer, model, {'accuracy': metrics["Accuracy"], 'samples': samples,
+                                                                'streaming': True})
+        self.use_fitted(vectorizer, model, version, compiled)
+        return metrics
+
+    # Compiled single-message predictor for a fitted pair (see fast_inference.py), or None if it disagrees
+    # with sklearn on any of the given texts, in which case predictions stay on the sklearn path
+    def compile_fitted(self, vectorizer, model, texts=(), expected=()):
+        compiled = CompiledEmotionModel(vectorizer, model)
+        mismatches = compiled.verify(texts, expected)
+        if mismatches:
+            logger.warning("Compiled emotion model disagrees with sklearn on %d of %d texts; not using it",
+                           len(mismatches), len(texts))
+            return None
+        return compiled
+
+    def use_fitted(self, vectorizer, model, version=None, compiled=None):
+        # A single assignment, so a prediction never pairs one version's vocabulary with another's weights
+        self.fitted = (vectorizer, model, compiled)
+        self.vectorizer, self.model, self.version = vectorizer, model, version
+
+    @property
+    def compiled(self):
+        return self.fitted[2]
+
+    # Switch to the registry's current version if it is not the one in use
+    def load_current(self):
+        if self.registry is None:
+            return False
+        current = self.registry.current()
+        if current is None or current == self.version:
+            return False
+        start = time.perf_counter()
+        version, vectorizer, model = self.registry.load(current)
+        self.use_fitted(vectorizer, model, version, self.compile_fitted(vectorizer, model))
+        logger.info("Loaded emotion model %s in %.1f ms", version, (time.perf_counter() - start) * 1000)
+        return True
 
     # Predict emotion for a given text
     def predict_emotion(self, text):
-        text_vector = self.vectorizer.transform([text])
-        predicted_emotion = self.model.predict(text_vector)
+        vectorizer, model, compiled = self.fitted
+        if compiled is not None:
+            return compiled.predict(text)
+        text_vector = vectorizer.transform([text])
+        predicted_emotion = model.predict(text_vector)
         return predicted_emotion[0]  # Return the predicted emotion
 
-    def retrieve_exemplar(self, user_input):
-        tfidf_vector = self.vectorizer.transform([user_input])
-        cosine_similarities = cosine_similarity(tfidf_vector, self.tfidf_matrix)
-        most_similar_index = cosine_similarities.argmax()
-        return self.dataset[most_similar_index]
+    # Predict emotions for many texts at once. The compiled path is faster per text than vectorizing a small
+    # batch, so batches only go through the vectorizer from VECTORIZE_MIN_BATCH texts up
+    def predict_emotions(self, texts):
+        vectorizer, model, compiled = self.fitted
+        if compiled is None:
+            return model.predict(vectorizer.transform(texts)).tolist()
+        if len(texts) < VECTORIZE_MIN_BATCH:
+            return [compiled.predict(text) for text in texts]
+        return compiled.predict_matrix(vectorizer.transform(texts)).tolist()
+
+    # Predicted emotion together with the probability of every emotion, as {emotion: probability}
+    def predict_emotion_proba(self, text):
+        vectorizer, model, compiled = self.fitted
+        if compiled is not None:
+            return compiled.predict_proba(text)
+        probabilities = model.predict_proba(vectorizer.transform([text]))[0]
+        return model.classes_[int(np.argmax(probabilities))], dict(zip(model.classes_.tolist(), probabilities.tolist()))
+
+    # Load (situation, reply) exemplar pairs from the empathetic dialogues CSV
+    def load_exemplars(self, file_path):
+        try:
+            df = pd.read_csv(file_path)
+        except (FileNotFoundError, pd.errors.EmptyDataError):
+            logger.warning("No exemplars loaded from %s", file_path)
+            return [], []
+        if 'utterance' not in df.columns:
+            return [], []
+        df = df.dropna(subset=['utterance'])
+        texts = df['prompt'].astype(str) + ' ' + df['utterance'].astype(str) if 'prompt' in df.columns else df['utterance'].astype(str)
+        return texts.tolist(), df['utterance'].astype(str).tolist()
+
+    # Build the index that retrieve_exemplar searches; texts are matched, responses returned.
+    # mode='pruned' answers approximately from truncated postings, for very large corpora
+    def build_exemplar_index(self, texts, responses, mode='exact'):
+        self.exemplar_index = ExemplarIndex.build(texts, responses, mode=mode)
+
+    def save_exemplar_index(self, path):
+        self.exemplar_index.save(path)
+
+    def load_exemplar_index(self, path):
+        self.exemplar_index = ExemplarIndex.load(path)
+
+    def retrieve_exemplars(self, user_input, k=5, min_similarity=0.0):
+        # [(response, similarity, row)], most similar first
+        if self.exemplar_index is None:
+            return []
+        return self.exemplar_index.query(user_input, k, min_similarity)
+
+    def retrieve_exemplar(self, user_input, min_similarity=0.0):
+        matches = self.retrieve_exemplars(user_input, 1, min_similarity)
+        return matches[0][0] if matches else None
     
     # Evaluate the model using the test data
     def evaluate_model(self, X_test, y_test):
         # Ensure the vectorizer is fitted
-        X_test_vec = self.vectorizer.transform(X_test)
+        vectorizer, model, _ = self.fitted
+        X_test_vec = vectorizer.transform(X_test)
         
         # Predict the labels for the test data
-        y_pred = self.model.predict(X_test_vec)
+        y_pred = model.predict(X_test_vec)
         
+        return self.score(y_test, y_pred)
+
+    def score(self, y_test, y_pred):
         # Calculate evaluation metrics
         accuracy = accuracy_score(y_test, y_pred)
         precision = precision_score(y_test, y_pred, average='weighted')
@@ -0,0 +1,216 @@
+'''
+Versioned store for the trained EmotionModel.
+Every call to publish() writes a new directory under <root>/versions with the vectorizer settings (and
+vocabulary, for TF-IDF) as JSON and the IDF vector and classifier weights as .npy files, which are
+memory-mapped when loaded. Hashed features with an SGD classifier, from streaming training, are
+stored the same way. <root>/CURRENT names the version in use and is only ever replaced with
+os.replace, so readers always see either the old or the new version.
+Usage:
+    python model_registry.py list
+    python model_registry.py train annotated_empatheticdialogues.csv [--streaming]
+    python model_registry.py promote v3
+    python model_registry.py rollback
+'''
+import argparse
+import json
+import logging
+import os
+import time
+import uuid
+
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+
+# Vectorizer settings kept with each version, so the loaded vectorizer tokenizes the same way
+VECTORIZER_SETTINGS = ('lowercase', 'strip_accents', 'analyzer', 'token_pattern', 'ngram_range', 'stop_words',
+                       'binary', 'norm')
+TFIDF_SETTINGS = VECTORIZER_SETTINGS + ('use_idf', 'smooth_idf', 'sublinear_tf')
+HASHING_SETTINGS = VECTORIZER_SETTINGS + ('n_features', 'alternate_sign')
+
+
+class ModelRegistry:
+    def __init__(self, root='models'):
+        self.root = root
+        self.versions_path = os.path.join(root, 'versions')
+        self.current_path = os.path.join(root, 'CURRENT')
+        self.history_path = os.path.join(root, 'HISTORY')
+
+    def publish(self, vectorizer, classifier, metrics=None, promote=True):
+        os.makedirs(self.versions_path, exist_ok=True)
+        version, path = self.reserve_version()
+        staging = path + '.tmp'
+        if isinstance(vectorizer, HashingVectorizer):
+            vectorizer_type = 'hashing'
+            settings = {name: getattr(vectorizer, name) for name in HASHING_SETTINGS}
+        else:
+            vectorizer_type = 'tfidf'
+            settings = {name: getattr(vectorizer, name) for name in TFIDF_SETTINGS}
+            with open(os.path.join(staging, 'vocabulary.json'), 'w', encoding='utf-8') as file:
+                json.dump({term: int(column) for term, column in vectorizer.vocabulary_.items()}, file)
+            np.save(os.path.join(staging, 'idf.npy'), vectorizer.idf_)
+        classifier_type = 'sgd' if isinstance(classifier, SGDClassifier) else 'logistic_regression'
+        np.save(os.path.join(staging, 'coef.npy'), np.ascontiguousarray(classifier.coef_))
+        np.save(os.path.join(staging, 'intercept.npy'), classifier.intercept_)
+        meta = {
+            'version': version,
+            'created': time.time(),
+            'classes': [str(label) for label in classifier.classes_],
+            'vectorizer_type': vectorizer_type,
+            'vectorizer': settings,
+            'classifier_type': classifier_type,
+            'loss': getattr(classifier, 'loss', None),
+            'metrics': metrics or {},
+        }
+        with open(os.path.join(staging, 'meta.json'), 'w', encoding='utf-8') as file:
+            json.dump(meta, file)
+        # Only complete versions ever appear under their final name
+        os.replace(staging, path)
+        if promote:
+            self.promote(version)
+        return version
+
+    def reserve_version(self):
+        # The version's staging directory is the reservation: mkdir is atomic, so of two publishers only one
+        # creates vN.tmp and the other moves on to the next number. It is renamed to vN once complete
+        number = max((self.version_number(name) for name in self.list_versions()), default=0) + 1
+        while True:
+            version = f"v{number}"
+            path = os.path.join(self.versions_path, version)
+            if not os.path.exists(path):
+                try:
+                    os.mkdir(path + '.tmp')
+                    # Published by another publisher between the check and the mkdir
+                    if not os.path.exists(path):
+                        return version, path
+                    os.rmdir(path + '.tmp')
+                except FileExistsError:
+                    pass
+            number += 1
+
+    @staticmethod
+    def version_number(version):
+        return int(version.lstrip('v'))
+
+    def list_versions(self):
+        if not os.path.isdir(self.versions_path):
+            return []
+        names = [name for name in os.listdir(self.versions_path)
+                 if name.startswith('v') and name[1:].isdigit()]
+        return sorted(names, key=self.version_number)
+
+    def describe(self, version):
+        with open(os.path.join(self.versions_path, version, 'meta.json'), encoding='utf-8') as file:
+            return json.load(file)
+
+    def current(self):
+        try:
+            with open(self.current_path, encoding='utf-8') as file:
+                return file.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def promote(self, version, record=True):
+        if version not in self.list_versions():
+            raise ValueError(f"Unknown model version: {version}")
+        self.replace_file(self.current_path, version)
+        if record:
+            with open(self.history_path, 'a', encoding='utf-8') as file:
+                file.write(version + '\n')
+
+    def rollback(self):
+        # Back to the version promoted before the current one
+        history = self.history()
+        current = self.current()
+        while history and history[-1] == current:
+            history.pop()
+        if not history:
+            raise ValueError("No earlier model version to roll back to")
+        previous = history[-1]
+        self.promote(previous, record=False)
+        self.replace_file(self.history_path, ''.join(version + '\n' for version in history))
+        return previous
+
+    @staticmethod
+    def replace_file(path, text):
+        # Each writer has its own temporary file, so concurrent promotions cannot rename each other's away
+        temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        os.replace(temp_path, path)
+
+    def history(self):
+        try:
+            with open(self.history_path, encoding='utf-8') as file:
+                return [line.strip() for line in file if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def load(self, version=None):
+        # (version, vectorizer, classifier) for the given or current version, or None if there is none
+        version = version or self.current()
+        if version is None:
+            return None
+        path = os.path.join(self.versions_path, version)
+        meta = self.describe(version)
+        settings = dict(meta['vectorizer'])
+        settings['ngram_range'] = tuple(settings['ngram_range'])
+        if meta.get('vectorizer_type', 'tfidf') == 'hashing':
+            vectorizer = HashingVectorizer(**settings)
+        else:
+            with open(os.path.join(path, 'vocabulary.json'), encoding='utf-8') as file:
+                vocabulary = json.load(file)
+            vectorizer = TfidfVectorizer(vocabulary=vocabulary, **settings)
+            vectorizer.idf_ = np.load(os.path.join(path, 'idf.npy'), mmap_mode='r')
+
+        if meta.get('classifier_type') == 'sgd':
+            classifier = SGDClassifier(loss=meta['loss'])
+        else:
+            classifier = LogisticRegression()
+        classifier.classes_ = np.array(meta['classes'])
+        classifier.coef_ = np.load(os.path.join(path, 'coef.npy'), mmap_mode='r')
+        classifier.intercept_ = np.load(os.path.join(path, 'intercept.npy'))
+        classifier.n_features_in_ = classifier.coef_.shape[1]
+        return version, vectorizer, classifier
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage EmotionModel versions')
+    parser.add_argument('--root', default='models')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list')
+    train = commands.add_parser('train')
+    train.add_argument('dataset')
+    train.add_argument('--streaming', action='store_true', help='chunked out-of-core training')
+    promote = commands.add_parser('promote')
+    promote.add_argument('version')
+    commands.add_parser('rollback')
+    args = parser.parse_args()
+    # Shows the accuracy EmotionModel logs while training
+    logging.basicConfig(level=logging.INFO)
+
+    registry = ModelRegistry(args.root)
+    if args.command == 'list':
+        current = registry.current()
+        for version in registry.list_versions():
+            meta = registry.describe(version)
+            created = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(meta['created']))
+            marker = '*' if version == current else ' '
+            print(f"{marker} {version:<6} {created}  {len(meta['classes'])} classes  {meta['metrics']}")
+    elif args.command == 'train':
+        from model import EmotionModel
+        model = EmotionModel(None, registry=registry)
+        if args.streaming:
+            model.train_model_streaming(args.dataset)
+        else:
+            model.train_model(args.dataset)
+        print("Published", model.version)
+    elif args.command == 'promote':
+        registry.promote(args.version)
+        print("Current version:", args.version)
+    elif args.command == 'rollback':
+        print("Current version:", registry.rollback())
+
+
+if __name__ == '__main__':
+    main()
@@ -1,26 +1,57 @@
-from nltk.tokenize import word_tokenize
+import logging
+from functools import lru_cache
+from nltk.tokenize import word_tokenize, MWETokenizer
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
 from nltk.sentiment.vader import SentimentIntensityAnalyzer
 
+logger = logging.getLogger(__name__)
+
 class TextPreprocessor:
-    def __init__(self):
+    def __init__(self, cache_size=4096, lemma_cache_size=65536):
         self.stop_words = set(stopwords.words('english'))
         self.lemmatizer = WordNetLemmatizer()
         self.analyzer = SentimentIntensityAnalyzer()
         self.menu_keywords = {'menu', 'dessert', 'drinks', 'main course', 'pasta', 'salad', 'sides', 'baked lasagna', 'seafood sotanghon'}
+        # Multi-word keywords are merged into one token, so they are kept whole like the single-word ones
+        self.mwe_tokenizer = MWETokenizer([tuple(keyword.split()) for keyword in self.menu_keywords if ' ' in keyword],
+                                          separator=' ')
+        # Bounded LRU caches: one lemma per distinct word, one result per distinct text
+        self.lemmatize = lru_cache(maxsize=lemma_cache_size)(self.lemmatizer.lemmatize)
+        self.normalize_cache = lru_cache(maxsize=cache_size)(self.normalize_uncached)
 
     def preprocess(self, text):
-        print("Original text:", text)  # Debugging
-        tokens = word_tokenize(text)
-        lowercased = [w.lower() for w in tokens]
-        filtered = [w for w in lowercased if w not in self.stop_words or w in self.menu_keywords]
-        lemmatized = [w if w in self.menu_keywords else self.lemmatizer.lemmatize(w) for w in filtered]
-        preprocessed_text = ' '.join(lemmatized)
-        print("Preprocessed text:", preprocessed_text)  # Debugging
+        preprocessed_text = self.normalize(text)
+        logger.debug("Original text: %r, preprocessed text: %r", text, preprocessed_text)
         return preprocessed_text
 
+    # Preprocess many texts at once: each distinct text is normalized once
+    def preprocess_batch(self, texts):
+        distinct = {text: self.normalize(text) for text in dict.fromkeys(texts)}
+        logger.debug("Preprocessed %d texts (%d distinct)", len(texts), len(distinct))
+        return [distinct[text] for text in texts]
+
+    # Same pipeline as preprocess without the debug output, used for menu names at load time
+    def normalize(self, text):
+        return self.normalize_cache(text)
+
+    def normalize_uncached(self, text):
+        return self.normalize_tokens(self.tokenize(text))
+
+    # Stop-word filter and lemmatization of tokenize's output
+    def normalize_tokens(self, tokens):
+        filtered = [w for w in tokens if w not in self.stop_words or w in self.menu_keywords]
+        lemmatized = [w if w in self.menu_keywords else self.lemmatize(w) for w in filtered]
+        return ' '.join(lemmatized)
+
+    def tokenize(self, text):
+        lowercased = [w.lower() for w in word_tokenize(text)]
+        return self.mwe_tokenizer.tokenize(lowercased)
+
+    def cache_stats(self):
+        return {'texts': self.normalize_cache.cache_info()._asdict(), 'lemmas': self.lemmatize.cache_info()._asdict()}
+
     def get_sentiment(self, text):
         sentiment_scores = self.analyzer.polarity_scores(text)
-        print("Sentiment scores:", sentiment_scores)  # Debugging
+        logger.debug("Sentiment scores: %s", sentiment_scores)
         return sentiment_scores
\ No newline at end of file
@@ -0,0 +1,136 @@
+import re
+
+try:
+    import tiktoken
+except ImportError:  # optional, the local estimate below is used instead
+    tiktoken = None
+
+# Tokens the chat format adds around every message, and once per request
+MESSAGE_OVERHEAD_TOKENS = 4
+REQUEST_OVERHEAD_TOKENS = 2
+
+WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+SUMMARY_HEADER = "Summary of the earlier conversation:\n"
+
+
+class TokenCounter:
+    '''
+    Estimates token counts locally, with tiktoken when it is installed and otherwise
+    with a word/punctuation and character based approximation of the BPE tokenizer.
+    '''
+    def __init__(self, model=None):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding('cl100k_base')
+            except (KeyError, ValueError):
+                self.encoding = tiktoken.get_encoding('cl100k_base')
+
+    def count(self, text):
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        # Roughly one token per word or symbol, and never fewer than one per four characters
+        return max(len(WORD_PATTERN.findall(text)), (len(text) + 3) // 4)
+
+    def count_message(self, content):
+        return self.count(content) + MESSAGE_OVERHEAD_TOKENS
+
+
+class PromptState:
+    '''
+    Per-conversation cache kept on the ChatSession: token counts of the messages seen so far and the
+    rolling summary of the turns that no longer fit, so nothing is recounted or re-summarized per turn.
+    '''
+    __slots__ = ('message_tokens', 'summary_lines', 'summary_tokens', 'summarized_upto')
+
+    def __init__(self):
+        self.message_tokens = []
+        self.summary_lines = []
+        self.summary_tokens = 0
+        self.summarized_upto = 0
+
+
+class PromptBuilder:
+    '''
+    Assembles the messages sent to the completion API within a token budget.
+    The pre-prompt and the last keep_turns messages are sent verbatim; older messages are folded into
+    an incrementally updated summary that is itself capped at summary_budget tokens.
+    '''
+    def __init__(self, token_budget=3000, keep_turns=6, summary_budget=400, line_chars=160, model=None):
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.summary_budget = summary_budget
+        self.line_chars = line_chars
+        self.counter = TokenCounter(model)
+        self.requests = 0
+        self.tokens_sent = 0
+        self.tokens_saved = 0
+
+    def build(self, pre_prompt, session, extra_messages=()):
+        if session.prompt_state is None:
+            session.prompt_state = PromptState()
+        state = session.prompt_state
+        conversation = session.conversation
+
+        # Count only the messages added since the last request
+        for _, content in conversation[len(state.message_tokens):]:
+            state.message_tokens.append(self.counter.count_message(content))
+
+        fixed_tokens = REQUEST_OVERHEAD_TOKENS + self.counter.count_message(pre_prompt)
+        fixed_tokens += sum(self.counter.count_message(message['content']) for message in extra_messages)
+        full_tokens = fixed_tokens + sum(state.message_tokens)
+
+        # Fold everything older than the verbatim window into the summary, then keep folding while over budget
+        cut = max(state.summarized_upto, len(conversation) - self.keep_turns)
+        self.summarize(state, conversation, cut)
+        while cut < len(conversation) - 1 and self.prompt_tokens(state, fixed_tokens, cut) > self.token_budget:
+            cut += 1
+            self.summarize(state, conversation, cut)
+
+        messages = [{"role": "system", "content": pre_prompt}]
+        if state.summary_lines:
+            messages.append({"role": "system", "content": self.summary_text(state)})
+        messages.extend({"role": role, "content": content} for role, content in conversation[cut:])
+        messages.extend(extra_messages)
+
+        prompt_tokens = self.prompt_tokens(state, fixed_tokens, cut)
+        saved = max(full_tokens - prompt_tokens, 0)
+        self.requests += 1
+        self.tokens_sent += prompt_tokens
+        self.tokens_saved += saved
+        return messages, {'prompt_tokens': prompt_tokens, 'full_tokens': full_tokens, 'tokens_saved': saved}
+
+    def prompt_tokens(self, state, fixed_tokens, cut):
+        summary = self.counter.count_message(SUMMARY_HEADER) + state.summary_tokens if state.summary_lines else 0
+        return fixed_tokens + summary + sum(state.message_tokens[cut:])
+
+    def summarize(self, state, conversation, upto):
+        # Extractive summary: the first sentence of each folded message, trimmed to line_chars
+        for role, content in conversation[state.summarized_upto:upto]:
+            first_sentence = SENTENCE_END.split(content.strip(), maxsplit=1)[0]
+            if len(first_sentence) > self.line_chars:
+                first_sentence = first_sentence[:self.line_chars].rsplit(' ', 1)[0] + '...'
+            line = f"{role.capitalize()}: {first_sentence}"
+            state.summary_lines.append((line, self.counter.count(line) + 1))
+            state.summary_tokens += state.summary_lines[-1][1]
+        state.summarized_upto = max(state.summarized_upto, upto)
+
+        # Oldest summary lines are dropped first once the summary outgrows its own budget
+        dropped = 0
+        while state.summary_tokens > self.summary_budget and dropped < len(state.summary_lines) - 1:
+            state.summary_tokens -= state.summary_lines[dropped][1]
+            dropped += 1
+        if dropped:
+            del state.summary_lines[:dropped]
+
+    @staticmethod
+    def summary_text(state):
+        return SUMMARY_HEADER + "\n".join(line for line, _ in state.summary_lines)
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'tokens_sent': self.tokens_sent,
+            'tokens_saved': self.tokens_saved,
+        }
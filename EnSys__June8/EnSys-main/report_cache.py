@@ -0,0 +1,93 @@
+import hashlib
+import threading
+import uuid
+from collections import Counter, OrderedDict
+
+
+class ReportEntry:
+    __slots__ = ('version', 'etag', 'value')
+
+    def __init__(self, version, etag, value):
+        self.version = version
+        self.etag = etag
+        self.value = value
+
+
+class ReportCache:
+    '''
+    Materialized feedback reports: categorized feedback with its summary, rendered HTML pages and DOCX
+    bytes, each cached under a key (the report and its parameters) with the version of the feedback it
+    was built from. Reports of the live analysis (source 'analyzer') use the FeedbackAnalyzer version,
+    which goes up whenever this process ingests a new statement. Reports read from the FeedbackStore
+    (source 'store') use the store's newest statement id, so feedback written by another process sharing
+    the file counts too. The first request after new feedback rebuilds a report and drops what was built
+    from older feedback of the same source; until then the report is served from memory. etag() gives a
+    report's entity tag without building it, so a conditional GET from a client that already has the
+    current report costs a version check. Concurrent builds of the same report are coalesced; entries are
+    evicted LRU past max_entries.
+    '''
+    def __init__(self, analyzer, max_entries=64):
+        self.analyzer = analyzer
+        self.store = analyzer.store
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.versions = {}      # source -> latest version seen
+        self.building = {}      # key -> lock held while that report is built
+        self.lock = threading.Lock()
+        self.counters = Counter()
+        # Versions start over with the process, so tags also carry an id of this cache
+        self.instance = uuid.uuid4().hex[:8]
+
+    def current_version(self, source='analyzer'):
+        # Ingests messages added since the last call first, which bumps the version if any statement is new
+        self.analyzer.update()
+        if source == 'store' and self.store is not None:
+            # What was just ingested is committed first, so it is covered by the version
+            self.store.flush()
+            return f"s{self.store.version()}"
+        return f"a{self.analyzer.version}"
+
+    def etag(self, key, version=None, source='analyzer'):
+        if version is None:
+            version = self.current_version(source)
+        digest = hashlib.blake2b(repr(key).encode('utf-8'), digest_size=6).hexdigest()
+        return f"{self.instance}-{version}-{digest}"
+
+    def get_or_compute(self, key, compute, source='analyzer'):
+        # ReportEntry for key; compute() is only called when the feedback changed since the report was built
+        version = self.current_version(source)
+        with self.lock:
+            if version != self.versions.get(source):
+                self.versions[source] = version
+                for stale in [cached for cached, entry in self.entries.items()
+                              if entry.version[0] == version[0] and entry.version != version]:
+                    del self.entries[stale]
+            entry = self.entries.get(key)
+            if entry is not None and entry.version == version:
+                self.entries.move_to_end(key)
+                self.counters['hits'] += 1
+                return entry
+            building = self.building.setdefault(key, threading.Lock())
+
+        with building:
+            with self.lock:
+                # Built by a concurrent request while this one waited
+                entry = self.entries.get(key)
+                if entry is not None and entry.version == version:
+                    self.counters['coalesced'] += 1
+                    return entry
+            value = compute()
+            entry = ReportEntry(version, self.etag(key, version), value)
+            with self.lock:
+                self.counters['builds'] += 1
+                # Not kept if newer feedback arrived during the build
+                if self.versions.get(source) == version:
+                    self.entries[key] = entry
+                    while len(self.entries) > self.max_entries:
+                        self.entries.popitem(last=False)
+                self.building.pop(key, None)
+        return entry
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, entries=len(self.entries), versions=dict(self.versions))
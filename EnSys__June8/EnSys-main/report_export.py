@@ -0,0 +1,52 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+EXPORT_FIELDS = ('created', 'message', 'compound', 'polarity', 'category', 'kind')
+# Format -> (mimetype, file extension) of the feedback exports
+EXPORT_FORMATS = {'csv': ('text/csv', 'csv'), 'jsonl': ('application/x-ndjson', 'jsonl')}
+# Streamed responses are sent in pieces of about this many characters rather than one per row
+CHUNK_CHARS = 64 * 1024
+
+
+def buffered(chunks, size=CHUNK_CHARS):
+    parts, length = [], 0
+    for chunk in chunks:
+        parts.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(parts)
+            parts, length = [], 0
+    if parts:
+        yield ''.join(parts)
+
+
+def export_record(row):
+    # FeedbackStore.export_rows row -> dict with the time as ISO 8601 local time
+    record = dict(zip(EXPORT_FIELDS, row))
+    record['created'] = datetime.fromtimestamp(record['created']).isoformat(timespec='seconds')
+    return record
+
+
+def csv_lines(rows, batch_rows=256):
+    # Header, then the CSV lines of the rows as they are read, batch_rows lines per chunk
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(export_record(row).values())
+        if count % batch_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(export_record(row), ensure_ascii=False) + '\n'
+
+
+def export_lines(rows, format):
+    return csv_lines(rows) if format == 'csv' else jsonl_lines(rows)
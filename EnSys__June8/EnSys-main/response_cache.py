@@ -0,0 +1,219 @@
+import atexit
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+
+
+class CacheEntry:
+    __slots__ = ('prompt', 'context', 'response', 'created', 'latency', 'terms', 'size')
+
+    def __init__(self, prompt, context, response, created, latency):
+        self.prompt = prompt
+        self.context = context
+        self.response = response
+        self.created = created
+        self.latency = latency
+        self.terms = Counter(prompt.split())
+        self.size = sys.getsizeof(prompt) + sys.getsizeof(response) + 64 * len(self.terms) + 200
+
+
+class ResponseCache:
+    '''
+    Cache of completion responses keyed on the normalized prompt and the context.
+    Lookups try the exact key first, then the most similar cached prompt of the same context by
+    TF-IDF cosine similarity (above similarity_threshold). Entries are evicted LRU once max_entries or
+    max_bytes is exceeded and expire after ttl seconds. Concurrent misses for the same key are
+    coalesced into one upstream call.
+    '''
+    def __init__(self, max_entries=1000, max_bytes=8 * 1024 * 1024, ttl=3600, similarity_threshold=0.85,
+                 persist_path=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.persist_path = persist_path
+        self.entries = OrderedDict()
+        self.postings = {}          # term -> keys of the entries containing it
+        self.document_frequency = Counter()
+        self.total_bytes = 0
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.counters = Counter()
+        self.latency_saved = 0.0
+        if persist_path:
+            self.load()
+            atexit.register(self.save)
+
+    def get_or_compute(self, prompt, context, compute):
+        # compute() is only called on a miss; exceptions propagate, to coalesced callers too, and nothing is cached
+        key = (prompt, context)
+        response = self.lookup(prompt, context)
+        if response is not None:
+            return response
+
+        with self.lock:
+            waiter = self.inflight.get(key)
+            if waiter is None:
+                waiter = self.inflight[key] = {'event': threading.Event(), 'response': None, 'error': None}
+                leader = True
+            else:
+                leader = False
+                self.counters['coalesced'] += 1
+
+        if not leader:
+            waiter['event'].wait()
+            # The leading call failed or gave up; don't queue a second upstream call behind it
+            if waiter['error'] is not None:
+                raise waiter['error']
+            return waiter['response']
+
+        try:
+            start = time.perf_counter()
+            response = compute()
+            self.put(prompt, context, response, time.perf_counter() - start)
+            waiter['response'] = response
+            return response
+        except Exception as e:
+            waiter['error'] = e
+            raise
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+            waiter['event'].set()
+
+    def lookup(self, prompt, context):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get((prompt, context))
+            if entry is not None and now - entry.created < self.ttl:
+                self.entries.move_to_end((prompt, context))
+                self.record_hit('exact_hits', entry)
+                return entry.response
+
+            entry = self.nearest(prompt, context, now)
+            if entry is not None:
+                self.entries.move_to_end((entry.prompt, entry.context))
+                self.record_hit('similar_hits', entry)
+                return entry.response
+
+            self.counters['misses'] += 1
+            return None
+
+    def record_hit(self, kind, entry):
+        self.counters[kind] += 1
+        self.latency_saved += entry.latency
+
+    def nearest(self, prompt, context, now):
+        # Only entries sharing at least one term with the prompt can score above zero
+        query = Counter(prompt.split())
+        candidates = set()
+        for term in query:
+            candidates.update(self.postings.get(term, ()))
+        if not candidates:
+            return None
+
+        query_vector = self.weights(query)
+        query_norm = math.sqrt(sum(weight * weight for weight in query_vector.values()))
+        best, best_score = None, self.similarity_threshold
+        for key in candidates:
+            entry = self.entries[key]
+            if entry.context != context or now - entry.created >= self.ttl:
+                continue
+            vector = self.weights(entry.terms)
+            norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+            if not norm or not query_norm:
+                continue
+            score = sum(weight * vector.get(term, 0.0) for term, weight in query_vector.items()) / (norm * query_norm)
+            if score >= best_score:
+                best, best_score = entry, score
+        return best
+
+    def weights(self, terms):
+        # Smoothed IDF over the cached prompts, as in sklearn's TfidfVectorizer
+        documents = len(self.entries)
+        return {term: count * (math.log((1 + documents) / (1 + self.document_frequency[term])) + 1)
+                for term, count in terms.items()}
+
+    def put(self, prompt, context, response, latency, created=None):
+        entry = CacheEntry(prompt, context, response, created or time.time(), latency)
+        with self.lock:
+            key = (prompt, context)
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = entry
+            self.total_bytes += entry.size
+            for term in entry.terms:
+                self.postings.setdefault(term, set()).add(key)
+                self.document_frequency[term] += 1
+            self.evict(time.time())
+
+    def evict(self, now):
+        # Expired entries first, then least recently used until both limits hold
+        expired = [key for key, entry in self.entries.items() if now - entry.created >= self.ttl]
+        for key in expired:
+            self.remove(key)
+            self.counters['expired'] += 1
+        while self.entries and (len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes):
+            self.remove(next(iter(self.entries)))
+            self.counters['evicted'] += 1
+
+    def remove(self, key):
+        entry = self.entries.pop(key)
+        self.total_bytes -= entry.size
+        for term in entry.terms:
+            keys = self.postings.get(term)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.postings[term]
+            self.document_frequency[term] -= 1
+            if self.document_frequency[term] <= 0:
+                del self.document_frequency[term]
+
+    def save(self):
+        if not self.persist_path:
+            return
+        with self.lock:
+            records = [
+                {'prompt': entry.prompt, 'context': entry.context, 'response': entry.response,
+                 'created': entry.created, 'latency': entry.latency}
+                for entry in self.entries.values()
+            ]
+        temp_path = self.persist_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(records, file)
+        os.replace(temp_path, self.persist_path)
+
+    def load(self):
+        if not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, encoding='utf-8') as file:
+                records = json.load(file)
+        except (OSError, ValueError) as e:
+            print("Error loading response cache:", e)
+            return
+        for record in records:
+            if time.time() - record['created'] < self.ttl:
+                self.put(record['prompt'], record['context'], record['response'], record['latency'], record['created'])
+
+    def stats(self):
+        with self.lock:
+            hits = self.counters['exact_hits'] + self.counters['similar_hits']
+            lookups = hits + self.counters['misses']
+            return {
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'exact_hits': self.counters['exact_hits'],
+                'similar_hits': self.counters['similar_hits'],
+                'misses': self.counters['misses'],
+                'coalesced': self.counters['coalesced'],
+                'evicted': self.counters['evicted'],
+                'expired': self.counters['expired'],
+                'hit_rate': hits / lookups if lookups else 0.0,
+                'latency_saved': self.latency_saved,
+            }
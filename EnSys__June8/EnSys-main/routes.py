@@ -1,13 +1,32 @@
-import pandas as pd
-from flask import Flask, render_template, request, jsonify, redirect, send_file
-from feedback_analyzer import FeedbackAnalyzer
-from sklearn.model_selection import train_test_split
+import json
+import uuid
+from flask import Flask, render_template, stream_template, request, jsonify, redirect, g, Response, stream_with_context
+from sweep import parse_grid
+from report_export import EXPORT_FORMATS, buffered, export_lines
 from io import BytesIO
 from docx import Document
-from datetime import datetime
+from datetime import datetime, date, timedelta
+
+# Cookie that carries the chat session id between requests
+SESSION_COOKIE = 'ensys_session'
 
 def initialize_routes(app, chatbot):
 
+    def get_session_id():
+        # A session id posted with the form wins over the cookie; otherwise start a new session
+        session_id = request.form.get('session_id') or request.cookies.get(SESSION_COOKIE)
+        if not session_id:
+            session_id = uuid.uuid4().hex
+            g.new_session_id = session_id
+        return session_id
+
+    @app.after_request
+    def set_session_cookie(response):
+        session_id = g.pop('new_session_id', None)
+        if session_id:
+            response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite='Lax')
+        return response
+
     @app.route('/')
     def index():
         return render_template('index.html')
@@ -27,120 +46,250 @@ def initialize_routes(app, chatbot):
     @app.route('/rate', methods=['GET', 'POST'])
     def rate_page():
         if request.method == 'POST':
-            chatbot.end_chat()  # Trigger end_chat when user submits rating
+            chatbot.end_chat(get_session_id())  # Trigger end_chat when user submits rating
             return redirect('/')
         else:
             return render_template('rate.html')
 
+    def handle_command(prompt, session_id):
+        # Fixed commands sent by the chat page; None when the prompt is a regular message
+        if prompt.upper() == 'END CHAT':
+            chatbot.end_chat(session_id)  # Trigger end_chat when user explicitly ends chat
+            return 'END CHAT'
+        elif prompt.upper() == 'RESTAURANT NAME':
+            return chatbot.get_restaurant_name()
+        elif prompt.upper() == 'RESTAURANT PROFILE':
+            return chatbot.get_restaurant_profile()
+        elif prompt.upper() == 'MENU':
+            return chatbot.get_menu_text()
+        return None
+
     @app.route('/chat', methods=['POST'])
     def chat():
         try:
             prompt = request.form['prompt']
-            if prompt.upper() == 'END CHAT':
-                chatbot.end_chat()  # Trigger end_chat when user explicitly ends chat
-                return 'END CHAT'
-            elif prompt.upper() == 'RESTAURANT NAME':
-                response = chatbot.get_restaurant_name()
-            elif prompt.upper() == 'RESTAURANT PROFILE':
-                response = chatbot.get_restaurant_profile()
-            elif prompt.upper() == 'MENU':
-                menu = chatbot.get_menu()
-                formatted_menu = ""
-                for category, items in menu.items():
-                    formatted_menu += f"{category.capitalize()}:\n"
-                    for idx, item in enumerate(items, start=1):
-                        formatted_menu += f"{idx}. {item['name']}\n"
-                    formatted_menu += "\n"
-                response = formatted_menu
-            else:
-                response = chatbot.generate_response(prompt)
+            session_id = get_session_id()
+            response = handle_command(prompt, session_id)
+            if response is None:
+                response = chatbot.generate_response(prompt, session_id)
             return response
         except Exception as e:
             print(f"Error in chat: {e}")
             return jsonify({"error": str(e)})
 
+    @app.route('/chat_stream', methods=['POST'])
+    def chat_stream():
+        # Same as /chat, but completion text is sent as server-sent events while it is generated
+        try:
+            prompt = request.form['prompt']
+            session_id = get_session_id()
+            response = handle_command(prompt, session_id)
+            if response is None:
+                response = chatbot.generate_response(prompt, session_id, mode='stream')
+        except Exception as e:
+            print(f"Error in chat: {e}")
+            return jsonify({"error": str(e)})
+
+        def events():
+            chunks = [response] if isinstance(response, str) else response
+            try:
+                for chunk in chunks:
+                    yield f"data: {json.dumps({'delta': chunk})}\n\n"
+            except Exception as e:
+                print(f"Error in chat stream: {e}")
+                yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+            yield "event: done\ndata: {}\n\n"
+
+        return Response(stream_with_context(events()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
     @app.route('/evaluate_model', methods=['GET'])
     def evaluate_model():
         if chatbot is None:
             return jsonify({"error": "Chatbot initialization failed"})
         try:
-            hyperparameters = {'alpha': [0.1, 0.5, 1.0, 1.5, 2.0]}
-            df = pd.read_csv('annotated_empatheticdialogues.csv')
-            combined_text = df['context'].astype(str) + ' ' + df['prompt'].astype(str) + ' ' + df['utterance'].astype(str) + ' ' + df['emotion'].astype(str)
-            labels = df['emotion'].tolist()
-            X_train, X_test, y_train, y_test = train_test_split(combined_text, labels, test_size=0.2, random_state=42)
-            chatbot.model.train_model(file_path='annotated_empatheticdialogues.csv')  # Call train_model without additional arguments
-            results = chatbot.model.evaluate_model(X_test, y_test)
-            return jsonify({"results": results})
+            # Cross-validated sweep over the requested grid, run as a background job; poll /jobs/<job_id>
+            grid = parse_grid(request.args.get('hyperparameters'))
+            folds = int(request.args.get('folds', 5))
+            if folds < 2:
+                raise ValueError("folds must be at least 2")
+            priority = int(request.args.get('priority', 0))
+            job_id = chatbot.start_evaluation(grid, folds, priority=priority)
+            return jsonify({"job_id": job_id, "status_url": f"/jobs/{job_id}"}), 202
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         except Exception as e:
             print(f"Error evaluating model: {e}")
             return jsonify({"error": str(e)})
 
+    @app.route('/train_model', methods=['POST'])
+    def train_model():
+        if chatbot is None:
+            return jsonify({"error": "Chatbot initialization failed"})
+        try:
+            # Only the name of a dataset in the bot's data directory, never a path
+            dataset = chatbot.resolve_dataset(request.form.get('dataset', 'annotated_empatheticdialogues.csv'))
+            streaming = request.form.get('streaming', 'false').lower() in ('1', 'true', 'yes')
+            priority = int(request.form.get('priority', 0))
+            job_id = chatbot.start_training(dataset, streaming, priority)
+            return jsonify({"job_id": job_id, "status_url": f"/jobs/{job_id}"}), 202
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            print(f"Error starting training: {e}")
+            return jsonify({"error": str(e)})
+
+    @app.route('/predict_batch', methods=['POST'])
+    def predict_batch():
+        if chatbot is None:
+            return jsonify({"error": "Chatbot initialization failed"})
+        # {"texts": ["...", ...]} -> {"emotions": [...]}, in the same order
+        texts = (request.get_json(silent=True) or {}).get('texts')
+        if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+            return jsonify({"error": "Expected a JSON body with a list of strings under \"texts\""}), 400
+        try:
+            return jsonify({"emotions": chatbot.predict_emotions(texts)})
+        except Exception as e:
+            print(f"Error predicting emotions: {e}")
+            return jsonify({"error": str(e)})
+
+    @app.route('/jobs', methods=['GET'])
+    def list_jobs():
+        return jsonify({"jobs": chatbot.jobs.list(int(request.args.get('limit', 50)))})
+
+    @app.route('/jobs/<job_id>', methods=['GET'])
+    def job_status(job_id):
+        job = chatbot.jobs.get(job_id)
+        if job is None:
+            return jsonify({"error": "Unknown job"}), 404
+        return jsonify(job)
+
+    @app.route('/jobs/<job_id>/logs', methods=['GET'])
+    def job_logs(job_id):
+        # ?since=<seq> returns only the lines after the last one the client has seen
+        return jsonify({"logs": chatbot.jobs.logs(job_id, int(request.args.get('since', 0)))})
+
+    @app.route('/jobs/<job_id>/cancel', methods=['POST'])
+    def cancel_job(job_id):
+        if not chatbot.jobs.cancel(job_id):
+            return jsonify({"error": "Job is not queued or running"}), 409
+        return jsonify({"job_id": job_id, "cancelling": True})
+
+    # source is 'analyzer' for reports of the live analysis and 'store' for those read from the feedback store
+    def cached_report(key, build, mimetype='text/html', headers=None, source='analyzer'):
+        # The materialized report for key, or 304 Not Modified when the client's If-None-Match is still current
+        report_cache = chatbot.report_cache
+        etag = report_cache.etag(key, source=source)
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+        else:
+            entry = report_cache.get_or_compute(key, build, source)
+            response = Response(entry.value, mimetype=mimetype, headers=headers)
+            response.set_etag(entry.etag)
+        # Clients may keep a copy but must revalidate it
+        response.cache_control.no_cache = True
+        return response
+
+    def streamed_report(key, generate, mimetype='text/html', headers=None, source='analyzer'):
+        # Like cached_report, but the report is sent while generate()'s chunks are produced, never held whole
+        etag = chatbot.report_cache.etag(key, source=source)
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(stream_with_context(buffered(generate())), mimetype=mimetype, headers=headers)
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response
+
+    def interpreted_feedback():
+        # (categorized feedback, summary) of the live analysis, shared by the HTML and DOCX reports
+        return chatbot.report_cache.get_or_compute(('interpret',), chatbot.feedback_analyzer.interpret_feedback).value
+
     @app.route('/analyze_feedback', methods=['GET'])
     def analyze_feedback():
         if chatbot is None:
             return jsonify({"error": "Chatbot initialization failed"})
         try:
-            feedback_analyzer = FeedbackAnalyzer(chatbot.feedback)
-            categorized_feedback, summary = feedback_analyzer.interpret_feedback()
-            return render_template('report.html', feedback_data=categorized_feedback, summary=summary)
+            def build():
+                categorized_feedback, summary = interpreted_feedback()
+                return render_template('report.html', feedback_data=categorized_feedback, summary=summary)
+            return cached_report(('html', 'analyze_feedback'), build)
         except Exception as e:
             print(f"Error analyzing feedback: {e}")
             return jsonify({"error": str(e)})
 
+    @app.route('/analyze_feedback/stream', methods=['GET'])
+    def analyze_feedback_stream():
+        # The /analyze_feedback page rendered as it is sent, for feedback too large to build the page in memory
+        if chatbot is None:
+            return jsonify({"error": "Chatbot initialization failed"})
+
+        def generate():
+            categorized_feedback, summary = chatbot.feedback_analyzer.interpret_feedback_chunks()
+            return stream_template('report.html', feedback_data=categorized_feedback, summary=summary)
+        return streamed_report(('stream', 'analyze_feedback'), generate)
+
+    @app.route('/export_feedback', methods=['GET'])
+    def export_feedback():
+        # Stored feedback as ?format=csv or jsonl, one row per label, streamed as it is read from the store;
+        # ?start= and ?end= (YYYY-MM-DD, both included) limit the range, which is everything by default
+        if chatbot is None:
+            return jsonify({"error": "Chatbot initialization failed"})
+        export_format = request.args.get('format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({"error": f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+        try:
+            start_date = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else None
+            end_date = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else None
+        except ValueError:
+            return jsonify({"error": "start and end must be YYYY-MM-DD dates"}), 400
+        start = datetime.combine(start_date, datetime.min.time()).timestamp() if start_date else None
+        end = datetime.combine(end_date + timedelta(days=1), datetime.min.time()).timestamp() if end_date else None
+        mimetype, extension = EXPORT_FORMATS[export_format]
+
+        def generate():
+            # Feedback ingested so far is written to the store before the export reads it
+            chatbot.feedback_analyzer.update()
+            chatbot.feedback_store.flush()
+            return export_lines(chatbot.feedback_store.export_rows(start, end), export_format)
+        return streamed_report(('export', export_format, start, end), generate, mimetype,
+                               headers={'Content-Disposition': f'attachment; filename=feedback.{extension}'}, source='store')
+
     @app.route('/feedback_report')
     def feedback_report():
         if chatbot is None:
             return jsonify({"error": "Chatbot initialization failed"})
-        else:
-            feedback_analyzer = FeedbackAnalyzer(chatbot.feedback)
-            categorized_feedback, summary = feedback_analyzer.interpret_feedback()
-            return render_template('report.html', feedback_data=categorized_feedback, summary=summary)
+        # Stored feedback from start to end (YYYY-MM-DD, both included; the last 30 days by default), a page at a time
+        try:
+            end_date = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else date.today()
+            start_date = (datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start')
+                          else end_date - timedelta(days=29))
+            page = max(int(request.args.get('page', 1)), 1)
+            per_page = min(max(int(request.args.get('per_page', 20)), 1), 100)
+        except ValueError:
+            return jsonify({"error": "start and end must be YYYY-MM-DD dates, page and per_page numbers"}), 400
+        start = datetime.combine(start_date, datetime.min.time()).timestamp()
+        end = datetime.combine(end_date + timedelta(days=1), datetime.min.time()).timestamp()
+
+        def build():
+            categorized_feedback, summary, counts, pages = chatbot.feedback_analyzer.stored_report(start, end, page, per_page)
+            return render_template('report.html', feedback_data=categorized_feedback, summary=summary, counts=counts,
+                                   start=start_date.isoformat(), end=end_date.isoformat(), page=page, pages=pages,
+                                   per_page=per_page)
+        return cached_report(('html', 'feedback_report', start, end, page, per_page), build, source='store')
 
     @app.route('/download_report')
     def download_report():
         if chatbot is None:
             return jsonify({"error": "Chatbot initialization failed"})
         try:
-            feedback_analyzer = FeedbackAnalyzer(chatbot.feedback)
-            categorized_feedback, summary = feedback_analyzer.interpret_feedback()
-            
-            def create_docx_report(categorized_feedback, summary):  # Define the function within download_report
-                document = Document()
-                document.add_heading('Feedback Report', 0)
-                
-                # Add date and timestamp
-                current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                document.add_paragraph(f"Generated on: {current_datetime}")
-                
-                for category, feedbacks in categorized_feedback.items():
-                    category_title = category.replace('_', ' ').title()
-                    document.add_heading(f"{category_title} Feedback", level=1)
-                    
-                    for feedback in feedbacks:
-                        document.add_paragraph(f"- {feedback['message']}")
-                    document.add_paragraph('')
-                
-                # Add a section for suggestions
-                suggestions = categorized_feedback.get('suggestions', [])
-                if suggestions:
-                    document.add_heading('Suggestions', level=1)
-                    for suggestion in suggestions:
-                        document.add_paragraph(f"- {suggestion['message']}")
-                    document.add_paragraph('')
-
-                document.add_heading('Summary', level=1)
-                document.add_paragraph(summary)
-                
-                return document
-            
-            docx_report = create_docx_report(categorized_feedback, summary)
-            
-            buffer = BytesIO()
-            docx_report.save(buffer)
-            buffer.seek(0)
-            
-            return send_file(buffer, as_attachment=True, download_name='report.docx', mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
+            def build():
+                buffer = BytesIO()
+                create_docx_report(*interpreted_feedback()).save(buffer)
+                return buffer.getvalue()
+            return cached_report(('docx',), build, mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+                                 headers={'Content-Disposition': 'attachment; filename=report.docx'})
         except Exception as e:
             print(f"Error downloading report: {e}")
             return jsonify({"error": str(e)})
@@ -154,20 +303,16 @@ def initialize_routes(app, chatbot):
         current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         document.add_paragraph(f"Generated on: {current_datetime}")
         
+        # Each category holds its compliments, complaints and (for some categories) suggestions
         for category, feedbacks in categorized_feedback.items():
             category_title = category.replace('_', ' ').title()
             document.add_heading(f"{category_title} Feedback", level=1)
             
-            for feedback in feedbacks:
-                document.add_paragraph(f"- {feedback['message']}")
-            document.add_paragraph('')
-        
-        # Add a section for suggestions
-        suggestions = categorized_feedback.get('suggestions', [])
-        if suggestions:
-            document.add_heading('Suggestions', level=1)
-            for suggestion in suggestions:
-                document.add_paragraph(f"- {suggestion['message']}")
+            for kind, kind_feedbacks in feedbacks.items():
+                if kind_feedbacks:
+                    document.add_heading(kind.capitalize(), level=2)
+                    for feedback in kind_feedbacks:
+                        document.add_paragraph(f"- {feedback['message']}")
             document.add_paragraph('')
 
         document.add_heading('Summary', level=1)
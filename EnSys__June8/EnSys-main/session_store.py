@@ -0,0 +1,148 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Bookkeeping cost of one stored message on top of its text (tuple + list slot)
+MESSAGE_OVERHEAD = sys.getsizeof(('user', '')) + 8
+
+
+class ChatSession:
+    '''
+    Conversation state for one customer.
+    Messages are kept as (role, content) tuples; the OpenAI dict format is only built when needed.
+    '''
+    __slots__ = ('session_id', 'conversation', 'feedback', 'feedback_data', 'last_topic', 'last_seen', 'size',
+                 'prompt_state', 'journaled')
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.conversation = []
+        self.feedback = []
+        self.feedback_data = []
+        self.last_topic = None
+        self.last_seen = time.monotonic()
+        self.size = 0
+        # Token counts and rolling summary cached by PromptBuilder
+        self.prompt_state = None
+        # Number of messages already written to the chat journal
+        self.journaled = 0
+
+    def messages(self):
+        return [{"role": role, "content": content} for role, content in self.conversation]
+
+
+class SessionStore:
+    '''
+    Sessions keyed by session id, evicted least-recently-used first once the global byte budget
+    is exceeded, and after idle_ttl seconds without activity.
+    on_evict is called with each dropped session (outside the store lock) so its feedback can be flushed.
+    A request may still hold a session that was dropped meanwhile (e.g. while it waited on the completion
+    API); whatever it adds to the detached session afterwards is passed to on_evict again.
+    '''
+    def __init__(self, max_bytes=64 * 1024 * 1024, idle_ttl=30 * 60, on_evict=None):
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.on_evict = on_evict
+        self.sessions = OrderedDict()
+        self.total_bytes = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, session_id):
+        # Returns the session for session_id, creating it if needed, and marks it most recently used
+        now = time.monotonic()
+        with self.lock:
+            evicted = self._evict_expired(now)
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = ChatSession(session_id)
+                self.sessions[session_id] = session
+            else:
+                self.sessions.move_to_end(session_id)
+            session.last_seen = now
+        self._flush(evicted)
+        return session
+
+    def add_message(self, session, role, content):
+        session.conversation.append((role, content))
+        self._grow(session, sys.getsizeof(content) + MESSAGE_OVERHEAD)
+
+    def add_feedback(self, session, message):
+        # message is an AnnotatedMessage (see annotation.py)
+        session.feedback.append(message)
+        self._grow(session, message.size + 8)
+
+    def add_feedback_data(self, session, entry):
+        session.feedback_data.append(entry)
+        self._grow(session, sum(sys.getsizeof(value) for value in entry.values()) + sys.getsizeof(entry))
+
+    def clear_conversation(self, session):
+        freed = sum(sys.getsizeof(content) + MESSAGE_OVERHEAD for _, content in session.conversation)
+        session.conversation = []
+        session.prompt_state = None
+        session.journaled = 0
+        self._grow(session, -freed)
+
+    def pop(self, session_id):
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+            if session is not None:
+                self.total_bytes -= session.size
+        return session
+
+    def _grow(self, session, delta):
+        with self.lock:
+            session.size += delta
+            attached = self.sessions.get(session.session_id) is session
+            if attached:
+                self.total_bytes += delta
+            evicted = self._evict_over_budget(keep=session.session_id)
+        if not attached and delta > 0:
+            # Already evicted or ended: flush what was just added, or it would be lost with the session
+            evicted.append(session)
+        self._flush(evicted)
+
+    def _evict_expired(self, now):
+        # Sessions are ordered by last use, so idle ones are always at the front
+        evicted = []
+        while self.sessions:
+            session = next(iter(self.sessions.values()))
+            if now - session.last_seen < self.idle_ttl:
+                break
+            evicted.append(self._drop(session.session_id))
+        return evicted
+
+    def _evict_over_budget(self, keep):
+        evicted = []
+        while self.total_bytes > self.max_bytes and len(self.sessions) > 1:
+            session_id = next(iter(self.sessions))
+            if session_id == keep:
+                # Never evict the session being written to; it is the most recent anyway
+                self.sessions.move_to_end(session_id)
+                session_id = next(iter(self.sessions))
+            evicted.append(self._drop(session_id))
+        return evicted
+
+    def _drop(self, session_id):
+        session = self.sessions.pop(session_id)
+        self.total_bytes -= session.size
+        self.evictions += 1
+        return session
+
+    def _flush(self, evicted):
+        if self.on_evict is not None:
+            for session in evicted:
+                self.on_evict(session)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'sessions': len(self.sessions),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+            }
+
+    def __len__(self):
+        return len(self.sessions)
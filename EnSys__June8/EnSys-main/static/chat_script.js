@@ -44,6 +44,13 @@ $(document).ready(function() {
 
         // Send the user message and sentiment to the server
         var sentiment = $('input[name=sentiment]').val(); // Get the sentiment value
+
+        // Stream the reply token by token where the browser supports it
+        if (window.fetch && window.ReadableStream && window.TextDecoder) {
+            streamMessage(userMessage, sentiment);
+            return;
+        }
+
         $.post("/chat", {
             prompt: userMessage,
             sentiment: sentiment // Pass sentiment to the server
@@ -66,6 +73,68 @@ $(document).ready(function() {
         });
     }
 
+    // Function to send the user message to the streaming endpoint and render the reply as it arrives
+    function streamMessage(userMessage, sentiment) {
+        // Add an empty bot message that is filled in as chunks arrive
+        var container = $('<div class="message-container"><div class="chatbot-profile"><img src="static/logo.png" alt="EnSys Profile Image"></div><div class="message"></div></div>');
+        var messageElement = container.find('.message');
+        $('.chat-messages').append(container);
+
+        var text = '';
+        var buffer = '';
+        var decoder = new TextDecoder();
+
+        // Handle one server-sent event ("event: ...\ndata: ...")
+        function handleEvent(rawEvent) {
+            var eventType = 'message';
+            var data = '';
+            rawEvent.split('\n').forEach(function(line) {
+                if (line.indexOf('event:') === 0) {
+                    eventType = line.slice(6).trim();
+                } else if (line.indexOf('data:') === 0) {
+                    data += line.slice(5).trim();
+                }
+            });
+            if (eventType === 'message' && data) {
+                text += JSON.parse(data).delta;
+                messageElement.html(formatMenu(text));
+                $('.chat-messages').scrollTop($('.chat-messages')[0].scrollHeight);
+            } else if (eventType === 'error') {
+                messageElement.html(formatMenu(text + '\nSomething went wrong'));
+            }
+        }
+
+        fetch('/chat_stream', {
+            method: 'POST',
+            credentials: 'same-origin',
+            body: new URLSearchParams({ prompt: userMessage, sentiment: sentiment })
+        }).then(function(response) {
+            var reader = response.body.getReader();
+
+            function read() {
+                return reader.read().then(function(result) {
+                    if (result.done) {
+                        return;
+                    }
+                    buffer += decoder.decode(result.value, { stream: true });
+                    // Events are separated by a blank line; keep any incomplete event in the buffer
+                    var events = buffer.split('\n\n');
+                    buffer = events.pop();
+                    events.forEach(handleEvent);
+                    return read();
+                });
+            }
+            return read();
+        }).catch(function() {
+            // Handle request failure (e.g., server not responding)
+            messageElement.html('Something went wrong');
+        }).then(function() {
+            $('.chat-messages').scrollTop($('.chat-messages')[0].scrollHeight);
+            // Re-enable input elements after processing
+            toggleInputElements(false);
+        });
+    }
+
     // Function to format the menu response
     function formatMenu(response) {
         var formattedResponse = '';
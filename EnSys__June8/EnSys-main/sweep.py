@@ -0,0 +1,164 @@
+'''
+Hyperparameter sweep with k-fold cross-validation for the emotion model.
+The grid maps parameter names to lists of values. Names starting with "vectorizer__" go to the
+TfidfVectorizer and the rest to LogisticRegression; "alpha" is accepted as regularization strength
+and becomes C = 1 / alpha. Each fold's feature matrices are computed once per distinct vectorizer
+setting and shared by every configuration that uses it: they are written to a scratch directory
+as .npy arrays that the worker processes memory-map, so the pages are shared, not copied per
+process. The (configuration, fold) fits are spread over a pool of worker processes (see sweep_worker.py).
+Usage: python sweep.py annotated_empatheticdialogues.csv --grid '{"C": [0.5, 1, 2]}' --folds 5
+'''
+import argparse
+import ast
+import itertools
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.model_selection import KFold, StratifiedKFold
+from sweep_worker import fit_fold, init_worker, worker_context
+
+DEFAULT_GRID = {'C': [0.5, 1.0, 2.0]}
+VECTORIZER_PREFIX = 'vectorizer__'
+METRICS = ('Accuracy', 'Precision', 'Recall', 'F1')
+
+
+def parse_grid(text):
+    # JSON, or the str(dict) form the evaluate_model.py client used to send
+    if not text:
+        return dict(DEFAULT_GRID)
+    try:
+        grid = json.loads(text)
+    except ValueError:
+        grid = ast.literal_eval(text)
+    if not isinstance(grid, dict) or not grid:
+        raise ValueError("The parameter grid must be a non-empty mapping of names to lists of values")
+    return {name: values if isinstance(values, list) else [values] for name, values in grid.items()}
+
+
+def expand_grid(grid):
+    names = sorted(grid)
+    configs = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        configs.append(dict(zip(names, values)))
+    return configs
+
+
+def split_params(params):
+    vectorizer_params = {name[len(VECTORIZER_PREFIX):]: value for name, value in params.items()
+                         if name.startswith(VECTORIZER_PREFIX)}
+    classifier_params = {name: value for name, value in params.items() if not name.startswith(VECTORIZER_PREFIX)}
+    if 'alpha' in classifier_params:
+        classifier_params['C'] = 1.0 / classifier_params.pop('alpha')
+    if 'ngram_range' in vectorizer_params:
+        vectorizer_params['ngram_range'] = tuple(vectorizer_params['ngram_range'])
+    return vectorizer_params, classifier_params
+
+
+def make_folds(labels, folds, random_state):
+    # Stratified when every emotion has enough examples for it
+    _, counts = np.unique(labels, return_counts=True)
+    if counts.min() >= folds:
+        splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=random_state)
+    else:
+        splitter = KFold(n_splits=folds, shuffle=True, random_state=random_state)
+    return list(splitter.split(np.zeros(len(labels)), labels))
+
+
+def vectorize_folds(directory, texts, labels, splits, vectorizer_settings):
+    # One vectorizer per (setting, fold), fitted on the fold's training part only
+    for setting, vectorizer_params in enumerate(vectorizer_settings):
+        for fold, (train, test) in enumerate(splits):
+            vectorizer = TfidfVectorizer(**vectorizer_params)
+            prefix = os.path.join(directory, f"{setting}_{fold}_")
+            save_matrix(prefix + 'train', vectorizer.fit_transform([texts[i] for i in train]))
+            save_matrix(prefix + 'test', vectorizer.transform([texts[i] for i in test]))
+            np.save(prefix + 'train_labels.npy', labels[train])
+            np.save(prefix + 'test_labels.npy', labels[test])
+
+
+def save_matrix(prefix, matrix):
+    for part in ('data', 'indices', 'indptr'):
+        np.save(f"{prefix}_{part}.npy", getattr(matrix, part))
+    np.save(f"{prefix}_shape.npy", np.array(matrix.shape))
+
+
+def run_sweep(texts, labels, grid=None, folds=5, workers=None, random_state=42, progress=None):
+    configs = expand_grid(grid or DEFAULT_GRID)
+    labels = np.asarray(labels)
+    splits = make_folds(labels, folds, random_state)
+
+    # Configurations that only differ in classifier parameters share a vectorizer setting
+    setting_ids, vectorizer_settings, tasks = {}, [], []
+    for index, params in enumerate(configs):
+        vectorizer_params, classifier_params = split_params(params)
+        key = json.dumps(vectorizer_params, sort_keys=True, default=list)
+        if key not in setting_ids:
+            setting_ids[key] = len(vectorizer_settings)
+            vectorizer_settings.append(vectorizer_params)
+        tasks.extend((index, setting_ids[key], fold, classifier_params) for fold in range(folds))
+
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    fold_results = [[] for _ in configs]
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix='sweep-') as directory:
+        vectorize_folds(directory, texts, labels, splits, vectorizer_settings)
+        vectorize_time = time.perf_counter() - start
+        with ProcessPoolExecutor(max_workers=workers, mp_context=worker_context(), initializer=init_worker,
+                                 initargs=(directory,)) as pool:
+            futures = [pool.submit(fit_fold, *task) for task in tasks]
+            try:
+                for done, future in enumerate(futures, 1):
+                    index, metrics = future.result()
+                    fold_results[index].append(metrics)
+                    if progress is not None:
+                        progress(done, len(tasks))
+            except BaseException:
+                # e.g. the progress callback cancelling the sweep: drop the fits that haven't started
+                pool.shutdown(cancel_futures=True)
+                raise
+
+    results = []
+    for params, metrics in zip(configs, fold_results):
+        summary = {'params': params}
+        for name in METRICS + ('fit_time',):
+            values = [fold[name] for fold in metrics]
+            summary[name] = float(np.mean(values))
+            summary[name + '_std'] = float(np.std(values))
+        results.append(summary)
+    results.sort(key=lambda result: result['F1'], reverse=True)
+    return {
+        'folds': folds,
+        'workers': workers,
+        'samples': len(labels),
+        'vectorize_time': vectorize_time,
+        'wall_time': time.perf_counter() - start,
+        'configs': results,
+        'best': results[0]['params'] if results else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cross-validated hyperparameter sweep for the emotion model')
+    parser.add_argument('dataset')
+    parser.add_argument('--grid', default=json.dumps(DEFAULT_GRID))
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    from model import EmotionModel
+    texts, labels = EmotionModel(None).load_dataset(args.dataset)
+    sweep = run_sweep(texts, labels, parse_grid(args.grid), args.folds, args.workers)
+    print(f"{sweep['samples']} samples, {sweep['folds']} folds, {sweep['workers']} workers, "
+          f"{sweep['wall_time']:.1f} s ({sweep['vectorize_time']:.1f} s vectorizing)")
+    for result in sweep['configs']:
+        metrics = '  '.join(f"{name} {result[name]:.3f}" for name in METRICS)
+        print(f"{json.dumps(result['params']):<40} {metrics}  fit {result['fit_time']:.2f} s")
+
+
+if __name__ == '__main__':
+    main()
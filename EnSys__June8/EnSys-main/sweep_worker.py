@@ -0,0 +1,91 @@
+'''
+Worker side of the hyperparameter sweep in sweep.py: the processes the sweep starts import only this
+module, which needs nothing but numpy, scipy and sklearn and has no side effects on import.
+Workers are started from a fork server (spawned where there is none), not forked from the chat server,
+which has job, journal and LLM threads whose locks a forked child could inherit in a held state.
+Neither way re-runs the parent's main script in the workers: main.py builds a whole chatbot when it runs.
+'''
+import multiprocessing
+import multiprocessing.context
+import os
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+from scipy import sparse
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
+
+# Scratch directory of the current sweep's fold matrices, set once per worker process by init_worker
+fold_directory = None
+
+# Stands in for the parent's __main__ while a worker starts, see WorkerProcessMixin
+blank_main = types.ModuleType('__main__')
+start_lock = threading.Lock()
+
+
+def load_matrix(prefix):
+    arrays = [np.load(f"{prefix}_{part}.npy", mmap_mode='r') for part in ('data', 'indices', 'indptr')]
+    return sparse.csr_matrix(tuple(arrays), shape=tuple(np.load(f"{prefix}_shape.npy")), copy=False)
+
+
+def init_worker(directory):
+    global fold_directory
+    fold_directory = directory
+
+
+def fit_fold(config_index, setting, fold, classifier_params):
+    prefix = os.path.join(fold_directory, f"{setting}_{fold}_")
+    X_train, X_test = load_matrix(prefix + 'train'), load_matrix(prefix + 'test')
+    y_train = np.load(prefix + 'train_labels.npy', mmap_mode='r')
+    y_test = np.load(prefix + 'test_labels.npy', mmap_mode='r')
+    start = time.perf_counter()
+    model = LogisticRegression(**classifier_params)
+    model.fit(X_train, y_train)
+    fit_time = time.perf_counter() - start
+    y_pred = model.predict(X_test)
+    return config_index, {
+        'Accuracy': accuracy_score(y_test, y_pred),
+        'Precision': precision_score(y_test, y_pred, average='weighted', zero_division=0),
+        'Recall': recall_score(y_test, y_pred, average='weighted', zero_division=0),
+        'F1': f1_score(y_test, y_pred, average='weighted', zero_division=0),
+        'fit_time': fit_time,
+    }
+
+
+class WorkerProcessMixin:
+    # multiprocessing tells a new process to re-run the parent's __main__ (by path or module name) before it
+    # unpickles its target. The pool's target is in concurrent.futures and its tasks are in this module, so
+    # the worker is started while __main__ is a blank module and gets nothing to re-run
+    def start(self):
+        with start_lock:
+            main = sys.modules['__main__']
+            sys.modules['__main__'] = blank_main
+            try:
+                super().start()
+            finally:
+                sys.modules['__main__'] = main
+
+
+if 'forkserver' in multiprocessing.get_all_start_methods():
+    class WorkerProcess(WorkerProcessMixin, multiprocessing.context.ForkServerProcess):
+        pass
+
+    class WorkerContext(multiprocessing.context.ForkServerContext):
+        Process = WorkerProcess
+else:
+    class WorkerProcess(WorkerProcessMixin, multiprocessing.context.SpawnProcess):
+        pass
+
+    class WorkerContext(multiprocessing.context.SpawnContext):
+        Process = WorkerProcess
+
+
+def worker_context():
+    context = WorkerContext()
+    if context.get_start_method() == 'forkserver':
+        # numpy and sklearn are imported once by the fork server instead of by every worker
+        context.set_forkserver_preload([__name__])
+    return context
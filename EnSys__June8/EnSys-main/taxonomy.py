@@ -0,0 +1,185 @@
+import json
+import os
+import re
+import string
+
+import numpy as np
+from scipy import sparse
+
+from feedback_columns import COMPLIMENT, COMPLAINT, SUGGESTION
+
+TAXONOMY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'taxonomy.json')
+# Statements are matched this many at a time, which bounds the byte buffer and the hit matrix
+CHUNK_SIZE = 65536
+# Smaller batches are matched one statement at a time, which is quicker than setting up the NumPy passes
+VECTORIZE_MIN_BATCH = 128
+# Bytes that belong to a word for whole-word matching: ASCII letters, digits, '_' and any non-ASCII character
+WORD_BYTES = np.zeros(256, dtype=bool)
+WORD_BYTES[[ord(char) for char in string.ascii_letters + string.digits + '_']] = True
+WORD_BYTES[0x80:] = True
+WORD_CHAR = '[0-9A-Za-z_\\x80-\\U0010ffff]'
+
+
+class Taxonomy:
+    '''
+    Feedback categories with their keywords, highest priority first, and the cues that mark a statement
+    as a suggestion, compiled into a sparse term-by-category matrix with one column per category and a
+    last one for suggestions. A batch of statements is matched against every term with a few NumPy passes
+    over one byte buffer, which gives a sparse statement-by-term hit matrix; its product with the term
+    matrix counts the matched terms per statement and category, and the labels are read off that.
+    Terms match anywhere in the lower-cased statement, as FeedbackAnalyzer always did, unless whole_words
+    is set. categorize() gives either that single label (suggestions all go to the suggestion category,
+    otherwise the first matching category wins) or every matching category.
+    '''
+    def __init__(self, categories, suggestion_cues=(), suggestion_category=None, whole_words=False):
+        # categories is a sequence of (name, keywords) pairs
+        self.categories = tuple(name for name, _ in categories)
+        self.keywords = {name: tuple(keyword.lower() for keyword in keywords) for name, keywords in categories}
+        self.suggestion_cues = tuple(cue.lower() for cue in suggestion_cues)
+        self.suggestion_category = self.categories.index(suggestion_category) if suggestion_category else -1
+        self.whole_words = whole_words
+
+        self.terms, index, rows, columns = [], {}, [], []
+        for column, terms in enumerate(list(self.keywords.values()) + [self.suggestion_cues]):
+            for term in terms:
+                if term and term not in index:
+                    index[term] = len(self.terms)
+                    self.terms.append(term)
+                if term:
+                    rows.append(index[term])
+                    columns.append(column)
+        self.matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, columns)),
+                                        shape=(len(self.terms), len(self.categories) + 1))
+        self.matrix.data[:] = 1  # A term listed twice under one category counts once
+
+        # Terms are found through their first two bytes, then checked byte by byte
+        self.patterns = [np.frombuffer(term.encode('utf-8'), dtype=np.uint8) for term in self.terms]
+        self.bigrams = np.zeros(65536, dtype=bool)
+        for pattern in self.patterns:
+            if len(pattern) > 1:
+                self.bigrams[int(pattern[0]) << 8 | int(pattern[1])] = True
+        self.padding = max((len(pattern) for pattern in self.patterns), default=0) + 1
+        self.expressions = {term: re.compile(f'(?<!{WORD_CHAR}){re.escape(term)}(?!{WORD_CHAR})') for term in self.terms}
+
+    @classmethod
+    def load(cls, path=TAXONOMY_PATH):
+        with open(path, encoding='utf-8') as file:
+            config = json.load(file)
+        suggestions = config.get('suggestions', {})
+        return cls([(category['name'], category['keywords']) for category in config['categories']],
+                   suggestions.get('cues', ()), suggestions.get('category'), config.get('whole_words', False))
+
+    def category_kinds(self, multi_label=False):
+        # The kinds each category can hold; in single-label mode only the suggestion category has suggestions
+        return {category: ('compliments', 'complaints', 'suggestions')
+                if multi_label or index == self.suggestion_category else ('compliments', 'complaints')
+                for index, category in enumerate(self.categories)}
+
+    def contains(self, term, text):
+        if self.whole_words:
+            return self.expressions[term].search(text) is not None
+        return term in text
+
+    def classify(self, statement, compound):
+        # Single-label (category, kind) of one statement with plain string tests, or None if it names no
+        # category or is neutral; categorize() gives the same labels for a whole batch at once
+        message = statement.lower()
+        if self.suggestion_category >= 0 and any(self.contains(cue, message) for cue in self.suggestion_cues):
+            return self.categories[self.suggestion_category], 'suggestions'
+        for category in self.categories:
+            if any(self.contains(keyword, message) for keyword in self.keywords[category]):
+                break
+        else:
+            return None
+        if compound >= 0.05:
+            return category, 'compliments'
+        if compound <= -0.05:
+            return category, 'complaints'
+        return None
+
+    def hits(self, statements):
+        # Sparse statement-by-term matrix, 1 where the term occurs in the statement
+        if not statements:
+            return sparse.csr_matrix((0, len(self.terms)), dtype=np.int32)
+        # Statements are separated by a zero byte, which no term contains, so no match spans two of them.
+        # A zero byte inside a statement would shift the rows; as a separator it matches like a space does.
+        text = '\0'.join(statements)
+        if text.count('\0') != len(statements) - 1:
+            text = '\0'.join(statement.replace('\0', ' ') for statement in statements)
+        text = text.lower().encode('utf-8')
+        buffer = np.frombuffer(b'\0' + text + b'\0' * self.padding, dtype=np.uint8)
+        # Statement i starts after the i-th zero byte
+        offsets = np.flatnonzero(buffer[:len(text) + 2] == 0) + 1
+        codes = buffer[:-1].astype(np.uint16) << 8 | buffer[1:]
+        candidates = np.flatnonzero(self.bigrams[codes])
+        order = np.argsort(codes[candidates], kind='stable')
+        candidates, candidate_codes = candidates[order], codes[candidates][order]
+
+        positions, columns = [np.empty(0, dtype=np.intp)], [np.empty(0, dtype=np.intp)]
+        for term_id, pattern in enumerate(self.patterns):
+            if len(pattern) == 1:
+                found = np.flatnonzero(buffer[:-self.padding] == pattern[0])
+            else:
+                code = int(pattern[0]) << 8 | int(pattern[1])
+                found = candidates[np.searchsorted(candidate_codes, code):np.searchsorted(candidate_codes, code, 'right')]
+                for position in range(2, len(pattern)):
+                    found = found[buffer[found + position] == pattern[position]]
+            if self.whole_words:
+                found = found[~WORD_BYTES[buffer[found - 1]] & ~WORD_BYTES[buffer[found + len(pattern)]]]
+            positions.append(found)
+            columns.append(np.full(len(found), term_id))
+        rows = np.searchsorted(offsets, np.concatenate(positions), 'right') - 1
+        columns = np.concatenate(columns)
+        hits = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, columns)),
+                                 shape=(len(statements), len(self.terms)))
+        hits.data[:] = 1  # Repeated occurrences count once
+        return hits
+
+    def scores(self, statements):
+        # Matched terms per statement and category, the last column counting suggestion cues
+        return self.hits(statements) @ self.matrix
+
+    def matched(self, statements):
+        # Boolean statement-by-category matrix of the categories each statement names, and the statements with a cue
+        if len(statements) < VECTORIZE_MIN_BATCH:
+            columns = list(self.keywords.values()) + [self.suggestion_cues]
+            messages = [statement.lower() for statement in statements]
+            matched = np.array([[any(self.contains(term, message) for term in terms) for terms in columns]
+                                for message in messages], dtype=bool).reshape(len(statements), len(columns))
+        else:
+            matched = self.scores(statements).toarray() > 0
+        return matched[:, :-1], matched[:, -1]
+
+    def categorize(self, statements, compounds, multi_label=False):
+        # Single-label: (category, kind) code arrays with one entry per statement, -1 where classify() gives None.
+        # Multi-label: (rows, category, kind) arrays with one entry per label, ordered by statement. A statement
+        # is labelled with every category it names, as a suggestion if it has a cue and otherwise by its
+        # sentiment (neutral ones get no label); suggestions naming no category go to the suggestion category.
+        compounds = np.asarray(compounds, dtype=np.float64)
+        polarity = np.where(compounds >= 0.05, COMPLIMENT, np.where(compounds <= -0.05, COMPLAINT, -1)).astype(np.int8)
+        results = []
+        for start in range(0, len(statements), CHUNK_SIZE):
+            named, suggested = self.matched(statements[start:start + CHUNK_SIZE])
+            kind = polarity[start:start + len(named)]
+            if not multi_label:
+                first = np.where(named.any(axis=1), named.argmax(axis=1), -1).astype(np.int8)
+                category = np.where((first >= 0) & (kind >= 0), first, -1).astype(np.int8)
+                kind = np.where(category >= 0, kind, -1).astype(np.int8)
+                if self.suggestion_category >= 0:
+                    category[suggested] = self.suggestion_category
+                    kind[suggested] = SUGGESTION
+                results.append((category, kind))
+                continue
+            rows, category = np.nonzero(named)
+            if self.suggestion_category >= 0:
+                orphans = np.flatnonzero(suggested & ~named.any(axis=1))
+                rows = np.concatenate([rows, orphans])
+                category = np.concatenate([category, np.full(len(orphans), self.suggestion_category)])
+            labels = np.where(suggested[rows], SUGGESTION, kind[rows]).astype(np.int8)
+            order = np.argsort(rows, kind='stable')
+            keep = order[labels[order] >= 0]
+            results.append((rows[keep] + start, category[keep].astype(np.int8), labels[keep]))
+        if not results:
+            empty = np.empty(0, dtype=np.int8)
+            return (np.empty(0, dtype=np.int64), empty, empty) if multi_label else (empty, empty)
+        return tuple(np.concatenate(parts) for parts in zip(*results))